@@ -3,16 +3,40 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 from flask_cors import CORS
 from .config import Config
+from .cache import ResponseCache
+from .compression import ResponseCompressor
+from .events import EarthquakeBroadcaster
+from .metrics import RequestMetrics
+from .pool import PoolMonitor
+from .search import PlaceNameIndex
 
 db = SQLAlchemy()
 ma = Marshmallow()
+compressor = ResponseCompressor()
+cache = ResponseCache()
+broadcaster = EarthquakeBroadcaster()
+metrics = RequestMetrics()
+place_index = PlaceNameIndex()
+pool_monitor = PoolMonitor()
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.config.from_object(Config)
+    # 基准测试等场景可传入字典覆盖配置（如指向 SQLite 的 SQLALCHEMY_DATABASE_URI）
+    if config:
+        app.config.update(config)
 
+    # 连接池参数需在 db.init_app 创建引擎之前写入配置
+    pool_monitor.init_app(app)
     db.init_app(app)
+    with app.app_context():
+        pool_monitor.watch("sync", db.engine)
     ma.init_app(app)
+    compressor.init_app(app)
+    cache.init_app(app)
+    broadcaster.init_app(app)
+    metrics.init_app(app)
+    place_index.init_app(app)
 
     # 启用 CORS
     from flask_cors import CORS
@@ -25,6 +49,18 @@ def create_app():
     from .routes.instrument_routes import instrument_bp
     app.register_blueprint(instrument_bp, url_prefix="/instrument")
 
+    from .routes.cache_routes import cache_bp
+    app.register_blueprint(cache_bp, url_prefix="/cache")
+
+    from .routes.health_routes import health_bp
+    app.register_blueprint(health_bp, url_prefix="/health")
+
+    # 注册命令行工具
+    from .commands import assign_regions, create_indexes, dzml_new_cli
+    app.cli.add_command(dzml_new_cli)
+    app.cli.add_command(create_indexes)
+    app.cli.add_command(assign_regions)
+
     print("Registered routes:")
     for rule in app.url_map.iter_rules():
         print(rule)
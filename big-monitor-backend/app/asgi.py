@@ -0,0 +1,520 @@
+"""
+ASGI 服务模式：uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+
+    原生异步接口  地震 / 仪器的热点只读接口（全量、按省份、分页与游标分页、增量同步）和 /health，
+                 在事件循环中经 SQLAlchemy 异步引擎查询；等待数据库的请求只占一个协程，
+                 并发上限由连接池大小而不是线程数决定
+    SSE 推送     /dzml_new/stream 在事件循环中等待推送事件，长连接不占用线程，
+                 打开再多的大屏也不会挤占桥接线程池
+    WSGI 桥接    其余接口（统计、检索、缓存管理等）原样交给 Flask 应用，
+                 在 ASGI_WSGI_THREADS 个线程的线程池中执行，流式响应逐块转发
+
+原生接口的参数、状态码和响应体与 Flask 实现一致，缓存键、ETag 和压缩协商的方式相同，
+两部分共用同一个 ResponseCache（含压缩后的副本）和数据版本缓存；/metrics 只统计经 WSGI 桥接的请求
+uvicorn、greenlet 和数据库的异步驱动（MySQL 为 aiomysql，SQLite 为 aiosqlite）为可选依赖，
+只有使用 ASGI 模式时才需要安装
+"""
+import asyncio
+import io
+import queue
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qsl
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import parse_etags
+from werkzeug.wrappers import Response
+
+from app import broadcaster, cache, compressor, create_app, place_index, pool_monitor
+from app.models.dzml_new import DzmlNew, province_filter
+from app.models.instrument import Instrument
+from app.pool import async_url, engine_options
+from app.routes.dzml_new_routes import CHANGES_COLUMNS, KEYSET_COLUMNS, dzml_new_encoder, dzml_new_version
+from app.routes.instrument_routes import instrument_encoder, instrument_version
+from app.utils import (
+    MAX_PAGE_SIZE, changes_query, changes_result, keyset_query, keyset_result,
+)
+
+# 同步版本函数 -> 等价的版本查询语句，结果与同步实现相同，缓存键两边通用
+VERSION_STATEMENTS = {
+    dzml_new_version: select(func.max(DzmlNew.UpgradeTime), func.count()).select_from(DzmlNew),
+    instrument_version: select(func.max(Instrument.created_at), func.count()).select_from(Instrument),
+}
+INSTRUMENT_CHANGES_COLUMNS = [Instrument.created_at, Instrument.id]
+
+
+class AsgiRequest:
+    """原生接口用到的请求信息：路径、查询参数（与 Flask request.args 相同的 MultiDict）和请求头"""
+
+    def __init__(self, scope):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        query = scope.get("query_string", b"").decode("latin-1")
+        self.args = MultiDict(parse_qsl(query, keep_blank_values=True, encoding="utf-8", errors="replace"))
+        self.headers = Headers([(k.decode("latin-1"), v.decode("latin-1")) for k, v in scope["headers"]])
+        self.if_none_match = parse_etags(self.headers.get("If-None-Match"))
+        self.environ = {
+            "REQUEST_METHOD": self.method,
+            "SERVER_NAME": (scope.get("server") or ("localhost", 80))[0],
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+        }
+
+
+def build_environ(scope, body: bytes) -> dict:
+    """由 ASGI scope 构造 WSGI environ（PEP 3333）"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = "HTTP_" + name
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+class WsgiBridge:
+    """在有界线程池中执行 WSGI 应用，响应体每产生一块就发送一块（流式响应不会被缓冲）"""
+
+    def __init__(self, wsgi_app, threads: int):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="wsgi-bridge")
+
+    async def __call__(self, scope, receive, send):
+        environ = build_environ(scope, await read_body(receive))
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.run, environ, send, loop)
+
+    def run(self, environ, send, loop):
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+        def emit(message):
+            # 在事件循环中发送并等待完成；客户端断开时抛出异常，结束迭代并关闭响应
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            head_sent = False
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not head_sent:
+                    emit({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+                    head_sent = True
+                emit({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not head_sent:
+                emit({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+            emit({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsgiApp:
+    """
+    ASGI 入口：原生接口表中的 GET 请求在事件循环中处理，其余请求经 WsgiBridge 交给 Flask
+
+    配置项：
+        DATABASE_ASYNC_URL   异步引擎的连接地址，默认由 SQLALCHEMY_DATABASE_URI 替换为异步驱动得到
+        ASGI_WSGI_THREADS    WSGI 桥接线程池的线程数，也是经桥接的接口的并发上限（SSE 连接不计在内）
+        DB_POOL_*            连接池参数，与 Flask 引擎相同，见 app/pool.py
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        config = flask_app.config
+        config.setdefault("DATABASE_ASYNC_URL", None)
+        config.setdefault("ASGI_WSGI_THREADS", 32)
+        url = async_url(config)
+        self.engine = create_async_engine(url, **engine_options(config, url))
+        pool_monitor.watch("async", self.engine.sync_engine)
+        self.bridge = WsgiBridge(flask_app.wsgi_app, config["ASGI_WSGI_THREADS"])
+        # 路径 -> (处理函数, 缓存所用的版本函数)
+        self.routes = {
+            "/dzml_new/all": (self.list_earthquakes, dzml_new_version),
+            "/dzml_new/province": (self.earthquakes_by_province, dzml_new_version),
+            "/dzml_new/province/page": (self.earthquakes_by_province_paginated, dzml_new_version),
+            "/dzml_new/changes": (self.earthquake_changes, None),
+            "/instrument/all": (self.list_instruments, instrument_version),
+            "/instrument/page": (self.instruments_paginated, instrument_version),
+            "/instrument/changes": (self.instrument_changes, None),
+            "/health": (self.health, None),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+        if scope["method"] == "GET" and scope["path"] == "/dzml_new/stream":
+            return await self.stream_new_earthquakes(AsgiRequest(scope), receive, send)
+        route = self.routes.get(scope["path"]) if scope["method"] == "GET" else None
+        if route is None:
+            return await self.bridge(scope, receive, send)
+
+        request = AsgiRequest(scope)
+        if "stream" in request.args:
+            # 流式输出由 Flask 逐块生成，经桥接转发
+            return await self.bridge(scope, receive, send)
+        view, version = route
+        if version is not None:
+            response = await self.cached(request, version, view)
+        else:
+            response = await self.call(view, request)
+        await self.send_response(send, request, response)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # 与 python run.py 一样预先构建地名检索索引
+                try:
+                    elapsed = await asyncio.get_running_loop().run_in_executor(None, self.build_place_index)
+                    print(f"✅ 地名索引构建完成，耗时 {elapsed:.1f}s")
+                except Exception as e:
+                    print("❌ 地名索引构建失败：", e)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.bridge.shutdown()
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def build_place_index(self) -> float:
+        with self.flask_app.app_context():
+            return place_index.build()
+
+    # ---------- 响应与缓存 ----------
+
+    async def send_response(self, send, request, response):
+        # 未经缓存的原生接口（changes、health）与 Flask 的 after_request 一样按需压缩
+        if response.status_code == 200 and "Content-Encoding" not in response.headers:
+            await self.offload(compressor.compress_response, response, request.headers.get("Accept-Encoding"))
+        self.allow_origin(request, response)
+        headers = [
+            (k.lower().encode("latin-1"), v.encode("latin-1"))
+            for k, v in response.get_wsgi_headers(request.environ).items()
+        ]
+        body = b"" if response.status_code == 304 else response.get_data()
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    def allow_origin(request, response):
+        # 与 flask_cors（origins="*"）的行为一致：带 Origin 的请求回显来源并加 Vary
+        origin = request.headers.get("Origin")
+        response.headers["Access-Control-Allow-Origin"] = origin or "*"
+        if origin:
+            response.headers["Vary"] = "Origin"
+
+    def json(self, payload, status: int = 200):
+        """与 Flask jsonify 相同的编码（同一个 JSON provider），响应体逐字节一致"""
+        response = self.flask_app.json.response(payload)
+        response.status_code = status
+        return response
+
+    @staticmethod
+    async def offload(func, *args):
+        """
+        行序列化、JSON 编码、压缩和缓存读写放到默认线程池执行（与 build_place_index 相同），
+        全量目录这类大响应不会阻塞同一进程中其他连接的事件循环
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def call(self, view, request):
+        try:
+            return await view(request)
+        except Exception as e:
+            traceback.print_exc()
+            return self.json({"error": str(e)}, 500)
+
+    async def version(self, version_func) -> str:
+        ttl = self.flask_app.config["CACHE_VERSION_TTL"]
+        value = cache.recent_version(version_func, ttl)
+        if value is None:
+            async with self.connect() as conn:
+                row = (await conn.execute(VERSION_STATEMENTS[version_func])).one()
+            value = cache.store_version(version_func, tuple(row))
+        return value
+
+    async def cached(self, request, version_func, view):
+        """与 ResponseCache.cached 相同的流程：ETag 命中返回 304，缓存命中直接返回已压缩 / 编码的字节"""
+        encoding = cache.negotiate(request.headers.get("Accept-Encoding"))
+        key = cache.make_key(await self.version(version_func), request.path, request.args)
+        etag = cache.etag(key)
+        response = cache.not_modified_response(etag, request.if_none_match, encoding)
+        if response is not None:
+            return response
+
+        ttl = self.flask_app.config["CACHE_DEFAULT_TTL"]
+        cached = await self.offload(cache.lookup, key, encoding, ttl)
+        if cached is not None:
+            cache.count("hits")
+            return cache.finish(Response(mimetype="application/json"), *cached, etag, "HIT")
+
+        cache.count("misses")
+        response = await self.call(view, request)
+        if response.status_code == 200:
+            body, used = await self.offload(cache.store, key, response.get_data(), encoding, ttl)
+            return cache.finish(response, body, used, etag, "MISS")
+        response.headers["X-Cache"] = "MISS"
+        return response
+
+    # ---------- 数据库 ----------
+
+    @asynccontextmanager
+    async def connect(self):
+        """从异步连接池借出连接，借出耗时（含排队和探活）计入 /health 的 wait 统计"""
+        started = time.perf_counter()
+        async with self.engine.connect() as conn:
+            pool_monitor.observe_wait("async", time.perf_counter() - started)
+            yield conn
+
+    @staticmethod
+    async def fetch(conn, statement) -> list:
+        return (await conn.execute(statement)).all()
+
+    @staticmethod
+    async def count(conn, statement) -> int:
+        return (await conn.execute(select(func.count()).select_from(statement.subquery()))).scalar()
+
+    # ---------- 原生接口（与 app/routes 中的同名接口一致） ----------
+
+    async def health(self, request):
+        started = time.perf_counter()
+        try:
+            async with self.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            database = {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 3)}
+        except Exception as e:
+            database = {"ok": False, "error": str(e)}
+        return self.json({
+            "status": "ok" if database["ok"] else "error",
+            "mode": "asgi",
+            "database": database,
+            "pools": pool_monitor.stats(),
+        }, 200 if database["ok"] else 503)
+
+    async def list_earthquakes(self, request):
+        async with self.connect() as conn:
+            rows = await self.fetch(conn, dzml_new_encoder.select())
+        data = await self.offload(dzml_new_encoder.dump_many, rows)
+        return await self.offload(self.json, {"data": data, "total": len(data)})
+
+    async def earthquakes_by_province(self, request):
+        province_name = request.args.get("name", "").strip()
+        if not province_name:
+            return self.json({"error": "缺少参数 name（省份名称）"}, 400)
+        statement = dzml_new_encoder.select().filter(province_filter(province_name))
+        async with self.connect() as conn:
+            rows = await self.fetch(conn, statement)
+        data = await self.offload(dzml_new_encoder.dump_many, rows)
+        return await self.offload(self.json, {"province": province_name, "count": len(data), "data": data})
+
+    async def earthquakes_by_province_paginated(self, request):
+        province_name = request.args.get("name", "").strip()
+        page = int(request.args.get("page", 1))
+        size = int(request.args.get("size", 10))
+        if not province_name:
+            return self.json({"error": "缺少参数 name（省份名称）"}, 400)
+
+        query = dzml_new_encoder.select().filter(province_filter(province_name))
+        async with self.connect() as conn:
+            if "cursor" in request.args:
+                size = min(size, MAX_PAGE_SIZE)
+                timed = query.filter(DzmlNew.RiQi.isnot(None))
+                try:
+                    statement = keyset_query(timed, KEYSET_COLUMNS, request.args.get("cursor"), size, descending=True)
+                except ValueError as e:
+                    return self.json({"error": str(e)}, 400)
+                rows, next_cursor = keyset_result(await self.fetch(conn, statement), KEYSET_COLUMNS, size)
+                data = await self.offload(dzml_new_encoder.dump_many, rows)
+                result = {
+                    "province": province_name,
+                    "size": size,
+                    "count": len(data),
+                    "next_cursor": next_cursor,
+                    "data": data,
+                }
+                if request.args.get("with_total") == "1":
+                    result["total"] = await self.count(conn, timed)
+                return await self.offload(self.json, result)
+
+            total = await self.count(conn, query)
+            rows = await self.fetch(conn, query.offset((page - 1) * size).limit(size))
+        data = await self.offload(dzml_new_encoder.dump_many, rows)
+        return await self.offload(self.json, {
+            "province": province_name,
+            "page": page,
+            "size": size,
+            "total": total,
+            "pages": (total + size - 1) // size,
+            "count": len(data),
+            "data": data,
+        })
+
+    async def changes(self, request, encoder, columns):
+        limit = min(int(request.args.get("limit", 1000)), 10000)
+        try:
+            statement, watermark = changes_query(encoder.select(), columns, request.args.get("since", ""), limit)
+        except ValueError as e:
+            return self.json({"error": str(e)}, 400)
+        async with self.connect() as conn:
+            rows = await self.fetch(conn, statement)
+        rows, watermark, has_more = changes_result(rows, columns, watermark, limit)
+        data = await self.offload(encoder.dump_many, rows)
+        result = {"count": len(data), "has_more": has_more, "watermark": watermark, "data": data}
+        return await self.offload(self.json, result)
+
+    async def earthquake_changes(self, request):
+        return await self.changes(request, dzml_new_encoder, CHANGES_COLUMNS)
+
+    async def list_instruments(self, request):
+        async with self.connect() as conn:
+            rows = await self.fetch(conn, instrument_encoder.select())
+        data = await self.offload(instrument_encoder.dump_many, rows)
+        return await self.offload(self.json, {"data": data, "total": len(data)})
+
+    async def instruments_paginated(self, request):
+        page = int(request.args.get("page", 1))
+        size = int(request.args.get("size", 10))
+        query = instrument_encoder.select()
+        async with self.connect() as conn:
+            if "cursor" in request.args:
+                size = min(size, MAX_PAGE_SIZE)
+                try:
+                    statement = keyset_query(query, [Instrument.id], request.args.get("cursor"), size)
+                except ValueError as e:
+                    return self.json({"error": str(e)}, 400)
+                rows, next_cursor = keyset_result(await self.fetch(conn, statement), [Instrument.id], size)
+                data = await self.offload(instrument_encoder.dump_many, rows)
+                result = {"size": size, "count": len(data), "next_cursor": next_cursor, "data": data}
+                if request.args.get("with_total") == "1":
+                    result["total"] = await self.count(conn, query)
+                return await self.offload(self.json, result)
+
+            total = await self.count(conn, query)
+            rows = await self.fetch(conn, query.offset((page - 1) * size).limit(size))
+        data = await self.offload(instrument_encoder.dump_many, rows)
+        return await self.offload(self.json, {
+            "page": page,
+            "size": size,
+            "total": total,
+            "pages": (total + size - 1) // size,
+            "count": len(data),
+            "data": data,
+        })
+
+    async def instrument_changes(self, request):
+        return await self.changes(request, instrument_encoder, INSTRUMENT_CHANGES_COLUMNS)
+
+    # ---------- SSE 推送（与 /dzml_new/stream 一致） ----------
+
+    async def stream_new_earthquakes(self, request, receive, send):
+        """
+        订阅同一个 EarthquakeBroadcaster，事件入队时经 call_soon_threadsafe 唤醒本连接，
+        等待期间只占一个协程；无事件时按 SSE_HEARTBEAT 发送心跳，客户端断开时退订
+        """
+        try:
+            min_mc = float(request.args.get("min_mc", 0))
+        except ValueError:
+            return await self.send_response(send, request, self.json({"error": "min_mc 参数格式错误"}, 400))
+
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+
+        def notify():
+            try:
+                loop.call_soon_threadsafe(wakeup.set)
+            except RuntimeError:
+                # 事件循环已关闭（进程退出中），忽略
+                pass
+
+        response = Response(mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"  # 关闭 Nginx 缓冲，事件立即送达
+        self.allow_origin(request, response)
+        headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in response.headers.items()]
+        heartbeat = self.flask_app.config["SSE_HEARTBEAT"]
+
+        subscriber = broadcaster.subscribe(request.args.get("name", "").strip(), min_mc, notify)
+        disconnected = asyncio.ensure_future(self.wait_disconnect(receive))
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": b"retry: 5000\n\n", "more_body": True})
+            while not disconnected.done():
+                # 先清除再取队列：取完之后入队的事件会重新置位，不会漏掉唤醒
+                wakeup.clear()
+                chunks = []
+                while True:
+                    try:
+                        chunks.append(subscriber.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if chunks:
+                    body = "".join(chunks).encode("utf-8")
+                    await send({"type": "http.response.body", "body": body, "more_body": True})
+                    continue
+                waiter = asyncio.ensure_future(wakeup.wait())
+                done, _ = await asyncio.wait(
+                    {waiter, disconnected}, timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED
+                )
+                waiter.cancel()
+                if not done:
+                    await send({"type": "http.response.body", "body": b": keep-alive\n\n", "more_body": True})
+        finally:
+            broadcaster.unsubscribe(subscriber)
+            disconnected.cancel()
+
+    @staticmethod
+    async def wait_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+
+def create_asgi_app(config=None) -> AsgiApp:
+    return AsgiApp(create_app(config))
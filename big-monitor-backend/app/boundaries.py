@@ -0,0 +1,180 @@
+"""
+行政区划空间连接：用三维地图工程自带的省界 / 市界 GeoJSON，批量判断点落在哪个省、市
+
+    PolygonIndex  多边形按外包矩形登记到 1° 网格；点按网格排序后，每个多边形只取
+                  外包矩形覆盖的网格里的点，再做射线法点在多边形内判断
+    点在多边形内   按纬度排序候选点，每条边只与纬度区间内的点求交（searchsorted 定位），
+                  全部边和点的组合一次性向量化计算，按交点个数奇偶判断，孔洞和多部件多边形自然处理
+
+numpy 为可选依赖，只有执行 flask assign-regions 时才需要安装
+"""
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from app.utils import extract_province
+
+PROVINCE_FILE = "中国-省界.geojson"
+CITY_FILE = "中国-市界.geojson"
+# 坐标落在所有省界之外（海域、境外）时写入的 province_code
+OUTSIDE = 0
+MAX_PAIRS = 4_000_000  # 单次向量化计算的“边 × 点”组合上限，约 100MB 内存
+
+
+def ring_edges(ring):
+    points = np.asarray(ring, dtype=np.float64)[:, :2]
+    if not np.array_equal(points[0], points[-1]):
+        points = np.vstack([points, points[:1]])
+    return points[:-1], points[1:]
+
+
+def points_in_polygon(px, py, edges) -> np.ndarray:
+    """射线法：统计每个点向右的水平射线与多边形各边的交点数，奇数在内"""
+    x1, y1, x2, y2 = edges
+    order = np.argsort(py, kind="stable")
+    ys = py[order]
+    # 边与水平线 y 相交当且仅当 min(y1, y2) <= y < max(y1, y2)，对应已排序候选点中的一段
+    lo = np.searchsorted(ys, np.minimum(y1, y2), "left")
+    hi = np.searchsorted(ys, np.maximum(y1, y2), "left")
+    counts = hi - lo
+    active = np.nonzero(counts)[0]
+    crossings = np.zeros(px.size, dtype=np.int64)
+    if active.size == 0:
+        return crossings.astype(bool)
+
+    cumulative = np.cumsum(counts[active])
+    start = 0
+    while start < active.size:
+        # 按组合数分批，控制中间数组的内存
+        base = cumulative[start - 1] if start else 0
+        end = max(int(np.searchsorted(cumulative, base + MAX_PAIRS, "right")), start + 1)
+        edge_ids = active[start:end]
+        sizes = counts[edge_ids]
+        pair_edges = np.repeat(edge_ids, sizes)
+        offsets = np.repeat(np.cumsum(sizes) - sizes, sizes)
+        points = order[lo[pair_edges] + np.arange(pair_edges.size) - offsets]
+
+        ex1, ey1 = x1[pair_edges], y1[pair_edges]
+        x_cross = ex1 + (py[points] - ey1) * (x2[pair_edges] - ex1) / (y2[pair_edges] - ey1)
+        crossings += np.bincount(points[px[points] < x_cross], minlength=px.size)
+        start = end
+    return crossings % 2 == 1
+
+
+class PolygonIndex:
+    """一组带编码的多边形（GeoJSON Feature），支持批量定位点所在的多边形"""
+
+    def __init__(self, features, cell_size: float = 1.0):
+        self.codes, self.names, self.parents, self.levels = [], [], [], []
+        self.edges, bboxes = [], []
+        for feature in features:
+            props = feature.get("properties") or {}
+            geometry = feature.get("geometry") or {}
+            if not isinstance(props.get("adcode"), int) or not props.get("name"):
+                continue  # 九段线等没有行政区划编码的要素
+            polygons = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+            starts, ends = zip(*(ring_edges(ring) for polygon in polygons for ring in polygon))
+            start, end = np.concatenate(starts), np.concatenate(ends)
+            self.edges.append((start[:, 0], start[:, 1], end[:, 0], end[:, 1]))
+            bboxes.append((start[:, 0].min(), start[:, 1].min(), start[:, 0].max(), start[:, 1].max()))
+            self.codes.append(props["adcode"])
+            self.names.append(props["name"])
+            self.parents.append((props.get("parent") or {}).get("adcode"))
+            self.levels.append(props.get("level"))
+
+        self.codes = np.array(self.codes, dtype=np.int64)
+        self.bboxes = np.array(bboxes, dtype=np.float64)
+        self.cell_size = cell_size
+        self.origin = (np.floor(self.bboxes[:, 0].min()), np.floor(self.bboxes[:, 1].min()))
+        self.columns = int(np.ceil((self.bboxes[:, 2].max() - self.origin[0]) / cell_size)) + 1
+        self.rows = int(np.ceil((self.bboxes[:, 3].max() - self.origin[1]) / cell_size)) + 1
+        # 每个多边形的外包矩形覆盖的网格：每行一段连续的网格编号 (起, 止)
+        self.cell_ranges = []
+        for min_x, min_y, max_x, max_y in self.bboxes:
+            c0, c1 = self.column_of(min_x), self.column_of(max_x)
+            r0, r1 = self.row_of(min_y), self.row_of(max_y)
+            self.cell_ranges.append([(r * self.columns + c0, r * self.columns + c1) for r in range(r0, r1 + 1)])
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["features"], **kwargs)
+
+    def column_of(self, x):
+        return int((x - self.origin[0]) // self.cell_size)
+
+    def row_of(self, y):
+        return int((y - self.origin[1]) // self.cell_size)
+
+    def cells(self, lon, lat):
+        """点所在的网格编号，超出网格范围（不可能落在任何多边形内）的为 -1"""
+        col = np.floor((lon - self.origin[0]) / self.cell_size)
+        row = np.floor((lat - self.origin[1]) / self.cell_size)
+        inside = (col >= 0) & (col < self.columns) & (row >= 0) & (row < self.rows)
+        return np.where(inside, row * self.columns + col, -1).astype(np.int64)
+
+    def locate(self, lon, lat) -> np.ndarray:
+        """返回每个点所在多边形的下标，不在任何多边形内（或坐标缺失）的为 -1"""
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        result = np.full(lon.size, -1, dtype=np.int64)
+        cells = np.where(np.isfinite(lon) & np.isfinite(lat), self.cells(np.nan_to_num(lon), np.nan_to_num(lat)), -1)
+        order = np.argsort(cells, kind="stable")
+        sorted_cells = cells[order]
+
+        for index, ranges in enumerate(self.cell_ranges):
+            slices = [
+                order[np.searchsorted(sorted_cells, first, "left"):np.searchsorted(sorted_cells, last, "right")]
+                for first, last in ranges
+            ]
+            candidates = np.concatenate(slices)
+            if candidates.size == 0:
+                continue
+            min_x, min_y, max_x, max_y = self.bboxes[index]
+            px, py = lon[candidates], lat[candidates]
+            keep = (result[candidates] < 0) & (px >= min_x) & (px <= max_x) & (py >= min_y) & (py <= max_y)
+            candidates = candidates[keep]
+            if candidates.size == 0:
+                continue
+            inside = points_in_polygon(lon[candidates], lat[candidates], self.edges[index])
+            result[candidates[inside]] = index
+        return result
+
+
+class RegionAssigner:
+    """先按市界定位（同时得到所属省份），市界未覆盖的点再按省界定位"""
+
+    def __init__(self, directory: str):
+        self.provinces = PolygonIndex.from_file(os.path.join(directory, PROVINCE_FILE))
+        self.cities = PolygonIndex.from_file(os.path.join(directory, CITY_FILE))
+        # 市界文件中个别要素本身是省级（如台湾省），其省份编码就是自身
+        self.city_province = np.array([
+            code if level == "province" else (parent or -1)
+            for code, level, parent in zip(self.cities.codes, self.cities.levels, self.cities.parents)
+        ], dtype=np.int64)
+        # 省份编码 -> 路由中使用的省份简称（“四川省” -> “四川”）
+        self.province_names = {
+            int(code): extract_province(name) for code, name in zip(self.provinces.codes, self.provinces.names)
+        }
+
+    def assign(self, lon, lat):
+        """返回 (省份编码, 城市编码) 两个数组；不在省界内的省份编码为 OUTSIDE，不在市界内的城市编码为 -1"""
+        lon = np.asarray(lon, dtype=np.float64)
+        lat = np.asarray(lat, dtype=np.float64)
+        city = self.cities.locate(lon, lat)
+        found = city >= 0
+        city_codes = np.where(found, self.cities.codes[np.maximum(city, 0)], -1)
+        province_codes = np.where(found, self.city_province[np.maximum(city, 0)], OUTSIDE)
+
+        missing = np.nonzero(~found)[0]
+        if missing.size:
+            province = self.provinces.locate(lon[missing], lat[missing])
+            province_codes[missing] = np.where(province >= 0, self.provinces.codes[np.maximum(province, 0)], OUTSIDE)
+        return province_codes, city_codes
+
+
+@lru_cache(maxsize=4)
+def load_regions(directory: str) -> RegionAssigner:
+    return RegionAssigner(directory)
@@ -0,0 +1,286 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, current_app, request
+
+
+class MemoryBackend:
+    """进程内 LRU 缓存，按条目 TTL 和总字节数两个维度淘汰"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()  # key -> (过期时间, 字节串)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                self._pop(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value: bytes, ttl: int):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._pop(key)
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._pop(next(iter(self.entries)))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        _, value = self.entries.pop(key)
+        self.size -= len(value)
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "bytes": self.size, "max_bytes": self.max_bytes}
+
+
+class RedisBackend:
+    """多进程共享的 Redis 缓存，容量由 Redis 的 maxmemory 策略约束"""
+
+    def __init__(self, url: str, prefix: str = "big-monitor:"):
+        import redis  # 可选依赖，只有配置了 CACHE_BACKEND=redis 才需要安装
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value: bytes, ttl: int):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+
+class ResponseCache:
+    """
+    接口结果缓存：以“路由 + 规范化后的查询参数 + 数据版本”为键，保存已编码的响应字节
+    数据版本由各表的 max(UpgradeTime) / max(created_at) 和行数得到，有新数据入库后键随之变化，
+    旧条目不再命中，随后被 LRU / TTL 淘汰
+
+    配置项：
+        CACHE_BACKEND       memory（默认）/ redis / none，也可直接传入实现了 get/set/clear 的对象
+        CACHE_REDIS_URL     CACHE_BACKEND=redis 时的连接地址
+        CACHE_MAX_BYTES     进程内缓存的总字节上限
+        CACHE_DEFAULT_TTL   条目存活秒数
+        CACHE_VERSION_TTL   数据版本查询结果的复用秒数，期间命中缓存不访问数据库
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.versions = {}  # 版本函数 -> (查询时间, 版本号)
+        self.compressor = None
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("CACHE_BACKEND", "memory")
+        app.config.setdefault("CACHE_REDIS_URL", "redis://localhost:6379/0")
+        app.config.setdefault("CACHE_MAX_BYTES", 64 * 1024 * 1024)
+        app.config.setdefault("CACHE_DEFAULT_TTL", 300)
+        app.config.setdefault("CACHE_VERSION_TTL", 1)
+
+        backend = app.config["CACHE_BACKEND"]
+        if backend == "memory":
+            self.backend = MemoryBackend(app.config["CACHE_MAX_BYTES"])
+        elif backend == "redis":
+            self.backend = RedisBackend(app.config["CACHE_REDIS_URL"])
+        elif backend in (None, "none"):
+            self.backend = None
+        else:
+            self.backend = backend
+        self.versions = {}
+        # 压缩由 ResponseCompressor 负责，需先于本扩展初始化
+        self.compressor = app.extensions.get("response_compressor")
+        app.extensions["response_cache"] = self
+
+    def version(self, version_func) -> str:
+        """取数据版本号，CACHE_VERSION_TTL 秒内复用上一次的查询结果"""
+        value = self.recent_version(version_func, current_app.config["CACHE_VERSION_TTL"])
+        if value is None:
+            value = self.store_version(version_func, version_func())
+        return value
+
+    def recent_version(self, version_func, ttl: float):
+        """ttl 秒内查询过的版本号，没有时返回 None（ASGI 模式先查这里，再异步查询数据库）"""
+        cached = self.versions.get(version_func)
+        if cached and time.monotonic() - cached[0] < ttl:
+            return cached[1]
+        return None
+
+    def store_version(self, version_func, version) -> str:
+        value = str(version)
+        self.versions[version_func] = (time.monotonic(), value)
+        return value
+
+    def make_key(self, version: str, path: str = None, args=None) -> str:
+        """默认取当前 Flask 请求的路径和参数；ASGI 模式传入自己解析的 path / args"""
+        path = request.path if path is None else path
+        args = request.args if args is None else args
+        params = sorted((k, v.strip()) for k, v in args.items(multi=True))
+        query = "&".join(f"{k}={v}" for k, v in params)
+        return f"{path}?{query}#{version}"
+
+    @staticmethod
+    def etag(key: str) -> str:
+        return hashlib.md5(key.encode("utf-8")).hexdigest()
+
+    def count(self, name: str):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    @staticmethod
+    def variant_key(key: str, encoding: str) -> str:
+        """同一响应按编码分别缓存，None 为未压缩的原始字节"""
+        return key if encoding is None else f"{key}|{encoding}"
+
+    @staticmethod
+    def variant_etag(etag: str, encoding: str) -> str:
+        """强 ETag 要求不同编码的表示各不相同，压缩后的表示加上编码后缀"""
+        return etag if encoding is None else f"{etag}-{encoding}"
+
+    def negotiate(self, accept_encoding: str):
+        return self.compressor.negotiate(accept_encoding) if self.compressor is not None else None
+
+    def not_modified_response(self, etag: str, if_none_match, encoding: str):
+        """If-None-Match 与该数据版本任一编码的 ETag 相符时返回 304，否则返回 None"""
+        variants = [None] + (self.compressor.encodings if self.compressor is not None else [])
+        if not any(if_none_match.contains_weak(self.variant_etag(etag, e)) for e in variants):
+            return None
+        self.count("not_modified")
+        response = Response(status=304)
+        response.set_etag(self.variant_etag(etag, encoding))
+        if self.compressor is not None:
+            response.vary.add("Accept-Encoding")
+        return response
+
+    def lookup(self, key: str, encoding: str, ttl: int):
+        """
+        取缓存的响应体，返回 (字节串, 编码)，未命中时返回 None
+        请求的编码没有缓存、但有其他编码的副本时由副本转换并补存，不必重新查库
+        """
+        if self.backend is None:
+            return None
+        body = self.backend.get(self.variant_key(key, encoding))
+        if body is not None:
+            return body, encoding
+        if self.compressor is None:
+            return None
+        for source in [None] + self.compressor.encodings:
+            if source == encoding:
+                continue
+            stored = self.backend.get(self.variant_key(key, source))
+            if stored is None:
+                continue
+            if source is None and len(stored) < self.compressor.min_bytes:
+                return stored, None
+            body = self.compressor.transcode(stored, source, encoding)
+            self.backend.set(self.variant_key(key, encoding), body, ttl)
+            return body, encoding
+        return None
+
+    def store(self, key: str, body: bytes, encoding: str, ttl: int):
+        """保存新生成的响应体：达到压缩阈值且客户端接受压缩时只保存压缩后的副本，返回 (字节串, 编码)"""
+        if encoding is not None and len(body) >= self.compressor.min_bytes:
+            body = self.compressor.compress(body, encoding)
+        else:
+            encoding = None
+        if self.backend is not None:
+            self.backend.set(self.variant_key(key, encoding), body, ttl)
+        return body, encoding
+
+    def finish(self, response, body: bytes, encoding: str, etag: str, state: str):
+        response.set_data(body)
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+        if self.compressor is not None:
+            response.vary.add("Accept-Encoding")
+        response.set_etag(self.variant_etag(etag, encoding))
+        response.headers["X-Cache"] = state
+        return response
+
+    def cached(self, version, ttl: int = None, unless=None):
+        """
+        路由装饰器，只缓存 200 且非流式的响应
+        version 为返回数据版本号的函数；unless 返回 True 时本次请求绕过缓存
+        响应带上由缓存键得到的强 ETag，客户端携带相同的 If-None-Match 时直接返回 304，
+        轮询期间数据未变化只需一次版本查询
+        客户端接受压缩时按协商的编码保存和返回压缩后的字节，重复命中不再压缩
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if unless is not None and unless():
+                    return view(*args, **kwargs)
+
+                encoding = self.negotiate(request.headers.get("Accept-Encoding"))
+                key = self.make_key(self.version(version))
+                etag = self.etag(key)
+                response = self.not_modified_response(etag, request.if_none_match, encoding)
+                if response is not None:
+                    return response
+
+                entry_ttl = ttl or current_app.config["CACHE_DEFAULT_TTL"]
+                cached = self.lookup(key, encoding, entry_ttl)
+                if cached is not None:
+                    self.count("hits")
+                    return self.finish(Response(mimetype="application/json"), *cached, etag, "HIT")
+
+                self.count("misses")
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    body, used = self.store(key, response.get_data(), encoding, entry_ttl)
+                    return self.finish(response, body, used, etag, "MISS")
+                response.headers["X-Cache"] = "MISS"
+                return response
+
+            return wrapper
+
+        return decorator
+
+    def clear(self):
+        self.versions.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        result = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+        if hasattr(self.backend, "stats"):
+            result.update(self.backend.stats())
+        if self.compressor is not None:
+            result["compression"] = self.compressor.stats()
+        return result
@@ -0,0 +1,230 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import inspect, text
+
+from app import db
+from app.models.dzml_new import DzmlNew
+from app.models.instrument import Instrument
+from app.utils import GRID_COLUMNS, GRID_SIZE_DEG, UNKNOWN_PROVINCE, extract_province, sql_floor
+
+dzml_new_cli = AppGroup("dzml-new", help="dzml_new 表维护命令")
+
+
+def ensure_indexes(model):
+    """补建模型上声明、但库中还不存在的索引"""
+    existing = {i["name"] for i in inspect(db.engine).get_indexes(model.__tablename__)}
+    for index in model.__table__.indexes:
+        if index.name not in existing:
+            index.create(bind=db.engine)
+            click.echo(f"已创建索引 {index.name}")
+
+
+def ensure_column(name, ddl_type, model=DzmlNew):
+    """旧库中没有派生列时补建列和索引"""
+    columns = {c["name"] for c in inspect(db.engine).get_columns(model.__tablename__)}
+    if name not in columns:
+        db.session.execute(text(f"ALTER TABLE {model.__tablename__} ADD COLUMN {name} {ddl_type}"))
+        db.session.commit()
+        click.echo(f"已添加 {model.__tablename__}.{name} 列")
+    ensure_indexes(model)
+
+
+# 使用方式：flask --app run create-indexes
+@click.command("create-indexes")
+def create_indexes():
+    """为 dzml_new、instrument 补建模型中声明的索引"""
+    for model in (DzmlNew, Instrument):
+        ensure_indexes(model)
+    click.echo("✅ 索引检查完成")
+
+
+# 使用方式（部署时执行一次，之后库外导入的行由触发器填写）：
+#   flask --app run dzml-new backfill-province          安装 province 触发器，只回填 province 为空的行
+#   flask --app run dzml-new backfill-province --all    安装触发器并全量重算
+@dzml_new_cli.command("backfill-province")
+@click.option("--all", "recompute_all", is_flag=True, help="重算全部行，而不只是 province 为空的行")
+def backfill_province(recompute_all):
+    """安装 province 触发器，并根据 DiMing 回填已有行的 province 列"""
+    from app.migrations import install_province_triggers
+
+    ensure_column("province", "VARCHAR(20)")
+    # 先装触发器再回填，回填期间新导入的行也不会漏掉
+    db.session.remove()
+    install_province_triggers(db.engine)
+    click.echo("已安装 province 触发器")
+
+    # 地名重复率很高，按不同的 DiMing 分组更新，避免逐行读写
+    query = db.session.query(DzmlNew.DiMing).distinct()
+    if not recompute_all:
+        query = query.filter(DzmlNew.province.is_(None))
+    names = [row[0] for row in query.all()]
+
+    updated = 0
+    for diming in names:
+        condition = DzmlNew.DiMing.is_(None) if diming is None else DzmlNew.DiMing == diming
+        update = DzmlNew.query.filter(condition)
+        if not recompute_all:
+            update = update.filter(DzmlNew.province.is_(None))
+        updated += update.update(
+            {DzmlNew.province: extract_province(diming)}, synchronize_session=False
+        )
+    db.session.commit()
+    click.echo(f"✅ 回填完成：{len(names)} 个地名，{updated} 行")
+
+    # 只回填空值时结果与聚合表按 DiMing 的解析一致；全量重算会覆盖 assign-regions 补全的省份，需重建聚合表
+    if recompute_all and updated:
+        from app.rollups import rebuild_rollups, rollup_status
+
+        if rollup_status() is not None:
+            rebuild_rollups()
+            click.echo("   已重建预聚合表")
+
+
+# 使用方式：
+#   flask --app run dzml-new backfill-grid          只回填 grid_cell 为空的行
+#   flask --app run dzml-new backfill-grid --all    全量重算
+@dzml_new_cli.command("backfill-grid")
+@click.option("--all", "recompute_all", is_flag=True, help="重算全部行，而不只是 grid_cell 为空的行")
+def backfill_grid(recompute_all):
+    """根据 lon/lat 回填 grid_cell 列，与 app.utils.grid_cell 的算法一致，一条 UPDATE 在库内完成"""
+    ensure_column("grid_cell", "INTEGER")
+
+    # lon+180、lat+90 均非负，可直接向下取整
+    dialect = db.engine.dialect.name
+    expression = (
+        sql_floor((DzmlNew.lat + 90) / GRID_SIZE_DEG, dialect) * GRID_COLUMNS
+        + sql_floor((DzmlNew.lon + 180) / GRID_SIZE_DEG, dialect)
+    )
+
+    update = DzmlNew.query.filter(DzmlNew.lon.isnot(None), DzmlNew.lat.isnot(None))
+    if not recompute_all:
+        update = update.filter(DzmlNew.grid_cell.is_(None))
+    updated = update.update({DzmlNew.grid_cell: expression}, synchronize_session=False)
+    db.session.commit()
+    click.echo(f"✅ 回填完成：{updated} 行")
+
+
+# 使用方式：
+#   flask --app run dzml-new migrate-surrogate-key              联合主键 -> 自增 id + 唯一约束 + 覆盖索引
+#   flask --app run dzml-new migrate-surrogate-key --downgrade  恢复联合主键
+@dzml_new_cli.command("migrate-surrogate-key")
+@click.option("--downgrade", is_flag=True, help="回退到 10 列联合主键")
+def migrate_surrogate_key(downgrade):
+    """为 dzml_new 换用代理主键（可回退），迁移细节见 app.migrations"""
+    from app.migrations import downgrade_surrogate_key, upgrade_surrogate_key
+
+    # 迁移期间不能有会话持有表上的事务
+    db.session.remove()
+    if downgrade:
+        elapsed = downgrade_surrogate_key(db.engine)
+        done, skipped = "已恢复联合主键", "尚未迁移，无需回退"
+    else:
+        elapsed = upgrade_surrogate_key(db.engine)
+        done, skipped = "已迁移到代理主键", "已是代理主键，无需迁移"
+    if elapsed is None:
+        click.echo(skipped)
+        return
+    indexes = ", ".join(i["name"] for i in inspect(db.engine).get_indexes(DzmlNew.__tablename__))
+    click.echo(f"✅ {done}，耗时 {elapsed:.1f}s，当前索引：{indexes}")
+
+
+# 使用方式（可放入 cron 定时执行增量刷新）：
+#   flask --app run dzml-new refresh-rollups    只重算水位之后有变化的时间桶
+#   flask --app run dzml-new rebuild-rollups    清空后全量重建（删除过原始行后执行）
+@dzml_new_cli.command("refresh-rollups")
+def refresh_rollups_command():
+    """按 UpgradeTime 水位增量刷新小时 / 天 / 月预聚合表"""
+    from app.rollups import refresh_rollups
+
+    result = refresh_rollups()
+    if result["changed"] is None:
+        click.echo("✅ 聚合表尚未构建，已全量重建")
+    else:
+        click.echo(f"✅ 刷新完成：{result['changed']} 行有变化，重算 {result['hours']} 个小时桶")
+
+
+@dzml_new_cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """清空并全量重建小时 / 天 / 月预聚合表"""
+    from app.rollups import rebuild_rollups
+
+    result = rebuild_rollups()
+    click.echo("✅ 重建完成：" + "，".join(f"{name} {count} 行" for name, count in result.items()))
+
+
+REGION_BATCH_SIZE = 100000
+
+
+# 使用方式：
+#   flask --app run assign-regions                    只处理 province_code 为空的行（可放入 cron）
+#   flask --app run assign-regions --table instrument --all
+@click.command("assign-regions")
+@click.option("--table", type=click.Choice(["dzml_new", "instrument", "all"]), default="all")
+@click.option("--all", "recompute_all", is_flag=True, help="重算全部行，而不只是 province_code 为空的行")
+def assign_regions(table, recompute_all):
+    """按省界 / 市界多边形批量计算 province_code、city_code，dzml_new 的“未知”省份一并补上"""
+    import time
+
+    import numpy as np  # 可选依赖，只有该命令需要
+
+    from flask import current_app
+
+    from app.boundaries import load_regions
+
+    assigner = load_regions(current_app.config["BOUNDARY_DATA_DIR"])
+    models = {"dzml_new": [DzmlNew], "instrument": [Instrument], "all": [DzmlNew, Instrument]}[table]
+    for model in models:
+        ensure_column("province_code", "INTEGER", model)
+        ensure_column("city_code", "INTEGER", model)
+
+        started = time.perf_counter()
+        processed = last_id = 0
+        # 补全省份的地震的发震时刻，结束后重算所在的聚合桶
+        filled = []
+        while True:
+            # 按主键分批，每批一次向量化定位，再按（省, 市）分组批量 UPDATE
+            province_column = model.province if model is DzmlNew else db.null()
+            riqi_column = model.RiQi if model is DzmlNew else db.null()
+            query = db.session.query(model.id, model.lon, model.lat, province_column, riqi_column).filter(
+                model.id > last_id
+            )
+            if not recompute_all:
+                query = query.filter(model.province_code.is_(None))
+            rows = query.order_by(model.id).limit(REGION_BATCH_SIZE).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            lon = np.array([np.nan if row[1] is None else float(row[1]) for row in rows])
+            lat = np.array([np.nan if row[2] is None else float(row[2]) for row in rows])
+            province_codes, city_codes = assigner.assign(lon, lat)
+
+            groups, unknown = {}, {}
+            for row, province_code, city_code in zip(rows, province_codes.tolist(), city_codes.tolist()):
+                groups.setdefault((province_code, city_code), []).append(row[0])
+                if model is DzmlNew and row[3] in (None, UNKNOWN_PROVINCE):
+                    # 地名解析不出省份（海域地名、境外地名、地名缺失）时用震中所在的省份补上
+                    name = assigner.province_names.get(province_code, UNKNOWN_PROVINCE)
+                    if name != UNKNOWN_PROVINCE:
+                        unknown.setdefault(name, []).append(row[0])
+                        filled.append(row[4])
+
+            updates = [
+                ({model.province_code: p, model.city_code: c if c >= 0 else None}, group)
+                for (p, c), group in groups.items()
+            ]
+            updates += [({model.province: name}, group) for name, group in unknown.items()]
+            for values, group in updates:
+                for i in range(0, len(group), 1000):
+                    chunk = group[i:i + 1000]
+                    db.session.query(model).filter(model.id.in_(chunk)).update(values, synchronize_session=False)
+            db.session.commit()
+            processed += len(rows)
+
+        elapsed = time.perf_counter() - started
+        click.echo(f"✅ {model.__tablename__}：{processed} 行，耗时 {elapsed:.1f}s")
+        if filled:
+            # 补省份不更新 UpgradeTime，增量刷新不会感知，直接重算这些地震所在的时间桶
+            from app.rollups import recompute_rows
+
+            hours = recompute_rows(filled)
+            click.echo(f"   按震中补全 {len(filled)} 行的省份，重算 {hours} 个小时桶")
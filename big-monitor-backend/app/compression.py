@@ -0,0 +1,126 @@
+import gzip
+import threading
+import time
+from collections import defaultdict
+
+from flask import request
+from werkzeug.http import parse_accept_header
+
+
+def load_codecs() -> dict:
+    """
+    可用的压缩算法：gzip 来自标准库，br（brotli）和 zstd（zstandard）为可选依赖，
+    未安装时不参与协商，客户端退回 gzip
+    """
+    codecs = {"gzip": (lambda body, level: gzip.compress(body, level, mtime=0), gzip.decompress)}
+    try:
+        import brotli
+
+        codecs["br"] = (lambda body, level: brotli.compress(body, quality=level), brotli.decompress)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+
+        codecs["zstd"] = (
+            lambda body, level: zstandard.ZstdCompressor(level=level).compress(body),
+            lambda body: zstandard.ZstdDecompressor().decompress(body),
+        )
+    except ImportError:
+        pass
+    return codecs
+
+
+class ResponseCompressor:
+    """
+    响应压缩：按 Accept-Encoding 协商 zstd / br / gzip，只压缩不小于 COMPRESS_MIN_BYTES 的 200 响应
+    接口缓存（ResponseCache）保存压缩后的字节，重复命中既不查库也不再压缩；
+    未缓存的响应在 after_request 中压缩，流式响应（NDJSON、SSE）不压缩
+
+    配置项：
+        COMPRESS_ENCODINGS    服务端偏好顺序，逗号分隔，客户端权重相同时取靠前的
+        COMPRESS_MIN_BYTES    压缩的最小响应体字节数，更小的响应压缩收益抵不过开销
+        COMPRESS_LEVELS       各算法的压缩级别，如 {"gzip": 6, "br": 5, "zstd": 6}
+    """
+
+    def __init__(self, app=None):
+        self.codecs = load_codecs()
+        self.encodings = []
+        self.levels = {}
+        self.min_bytes = 1024
+        self.lock = threading.Lock()
+        self.counters = defaultdict(lambda: {"responses": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0})
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("COMPRESS_ENCODINGS", "zstd,br,gzip")
+        app.config.setdefault("COMPRESS_MIN_BYTES", 1024)
+        app.config.setdefault("COMPRESS_LEVELS", {"gzip": 6, "br": 5, "zstd": 6})
+        preferred = [e.strip() for e in app.config["COMPRESS_ENCODINGS"].split(",") if e.strip()]
+        self.encodings = [e for e in preferred if e in self.codecs]
+        self.levels = app.config["COMPRESS_LEVELS"]
+        self.min_bytes = app.config["COMPRESS_MIN_BYTES"]
+        app.after_request(self.after_request)
+        app.extensions["response_compressor"] = self
+
+    def negotiate(self, accept_encoding: str):
+        """按客户端权重（相同时按服务端偏好）选择编码，不接受任何可用编码时返回 None"""
+        if not accept_encoding or not self.encodings:
+            return None
+        return parse_accept_header(accept_encoding).best_match(self.encodings)
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        started = time.perf_counter()
+        compressed = self.codecs[encoding][0](body, self.levels.get(encoding, 6))
+        with self.lock:
+            counters = self.counters[encoding]
+            counters["responses"] += 1
+            counters["bytes_in"] += len(body)
+            counters["bytes_out"] += len(compressed)
+            counters["seconds"] += time.perf_counter() - started
+        return compressed
+
+    def decompress(self, body: bytes, encoding: str) -> bytes:
+        return self.codecs[encoding][1](body)
+
+    def transcode(self, body: bytes, source: str, target: str) -> bytes:
+        """缓存中只有另一种编码时由它转换，None 表示未压缩"""
+        if source is not None:
+            body = self.decompress(body, source)
+        return body if target is None else self.compress(body, target)
+
+    def compress_response(self, response, accept_encoding: str):
+        """压缩未经缓存的响应；已带 Content-Encoding（如缓存命中）、流式或非 200 的响应原样返回"""
+        if (
+            response.status_code != 200
+            or response.is_streamed
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+        ):
+            return response
+        body = response.get_data()
+        if len(body) < self.min_bytes:
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = self.negotiate(accept_encoding)
+        if encoding is None:
+            return response
+        response.set_data(self.compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(f"{etag}-{encoding}", weak)
+        return response
+
+    def after_request(self, response):
+        return self.compress_response(response, request.headers.get("Accept-Encoding"))
+
+    def stats(self) -> dict:
+        with self.lock:
+            result = {}
+            for encoding, counters in self.counters.items():
+                entry = dict(counters, seconds=round(counters["seconds"], 6))
+                entry["ratio"] = round(counters["bytes_out"] / counters["bytes_in"], 4) if counters["bytes_in"] else None
+                result[encoding] = entry
+        return {"encodings": self.encodings, "min_bytes": self.min_bytes, "compressed": result}
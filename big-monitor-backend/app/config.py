@@ -8,3 +8,47 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = os.getenv("SECRET_KEY", "secret_key_here")
+
+    # 接口结果缓存，见 app/cache.py
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", 300))
+    CACHE_VERSION_TTL = float(os.getenv("CACHE_VERSION_TTL", 1))
+    # POST /cache/clear 需在 X-Admin-Token 头中携带该令牌；未配置时该接口禁用
+    CACHE_ADMIN_TOKEN = os.getenv("CACHE_ADMIN_TOKEN", "")
+
+    # 响应压缩（br / zstd 需安装 brotli / zstandard），见 app/compression.py
+    COMPRESS_ENCODINGS = os.getenv("COMPRESS_ENCODINGS", "zstd,br,gzip")
+    COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+
+    # 预聚合表的后台增量刷新间隔（秒），0 表示不在进程内刷新、由 cron 执行 flask dzml-new refresh-rollups
+    ROLLUP_REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", 60))
+
+    # 新地震 SSE 推送，见 app/events.py
+    SSE_POLL_INTERVAL = float(os.getenv("SSE_POLL_INTERVAL", 5))
+    SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", 100))
+    SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))
+
+    # 请求级性能指标与 /metrics，见 app/metrics.py（默认关闭）
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+    METRICS_PROFILE_SAMPLE_RATE = float(os.getenv("METRICS_PROFILE_SAMPLE_RATE", 0))
+    METRICS_SLOW_THRESHOLD = float(os.getenv("METRICS_SLOW_THRESHOLD", 1.0))
+    METRICS_PROFILE_DIR = os.getenv("METRICS_PROFILE_DIR", "profiles")
+
+    # 省界 / 市界 GeoJSON 所在目录（三维地图工程的公共数据），见 app/boundaries.py
+    BOUNDARY_DATA_DIR = os.getenv(
+        "BOUNDARY_DATA_DIR",
+        os.path.join(os.path.dirname(__file__), "..", "..", "三维地图-地面", "data", "common"),
+    )
+
+    # 数据库连接池，同步（Flask）与异步（ASGI）引擎共用，见 app/pool.py
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+    # ASGI 服务模式，见 app/asgi.py
+    DATABASE_ASYNC_URL = os.getenv("DATABASE_ASYNC_URL")
+    ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", 32))
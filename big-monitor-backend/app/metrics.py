@@ -0,0 +1,223 @@
+import cProfile
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+
+class Histogram:
+    """Prometheus 风格的累计直方图，按标签分组"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = defaultdict(lambda: {"counts": [0] * len(buckets), "sum": 0.0, "count": 0})
+
+    def observe(self, labels: tuple, value: float):
+        series = self.series[labels]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][i] += 1
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self, label_names) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            base = format_labels(label_names, labels)
+            for bound, count in zip(self.buckets, series["counts"]):
+                lines.append(f'{self.name}_bucket{{{base},le="{bound:g}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {series["count"]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series['sum']:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {series['count']}")
+        return lines
+
+
+class Counter:
+    """Prometheus 风格的计数器，按标签分组"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.series = defaultdict(float)
+
+    def inc(self, labels: tuple, value: float = 1):
+        self.series[labels] += value
+
+    def render(self, label_names) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{{{format_labels(label_names, labels)}}} {value:g}")
+        return lines
+
+
+def format_labels(names, values) -> str:
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+class RequestMetrics:
+    """
+    按请求采集的性能指标（需开启 METRICS_ENABLED）：
+    路由耗时直方图、每个请求的 SQL 语句数和数据库耗时（SQLAlchemy 引擎事件）、
+    驱动报告的返回行数、响应字节数，通过 /metrics 以 Prometheus 文本格式暴露
+
+    配置项：
+        METRICS_ENABLED             是否开启，默认关闭
+        METRICS_PROFILE_SAMPLE_RATE 抽样做 cProfile 的请求比例（0~1），默认 0 不抽样
+        METRICS_SLOW_THRESHOLD      被抽样且耗时超过该秒数的请求才落盘 .prof 文件
+        METRICS_PROFILE_DIR         .prof 文件目录
+    """
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.requests = Counter("bigmonitor_http_requests_total", "处理的请求数")
+        self.latency = Histogram(
+            "bigmonitor_http_request_duration_seconds", "请求处理耗时（秒）", LATENCY_BUCKETS
+        )
+        self.statements = Histogram(
+            "bigmonitor_db_statements_per_request", "每个请求执行的 SQL 语句数", STATEMENT_BUCKETS
+        )
+        self.db_time = Histogram(
+            "bigmonitor_db_time_seconds", "每个请求的数据库耗时（秒）", LATENCY_BUCKETS
+        )
+        self.rows = Counter("bigmonitor_db_rows_fetched_total", "数据库驱动报告的返回行数")
+        self.response_bytes = Histogram(
+            "bigmonitor_http_response_bytes", "响应体字节数（流式响应不计）", BYTES_BUCKETS
+        )
+        self.profiles_written = 0
+        self.sample_counter = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("METRICS_ENABLED", False)
+        app.config.setdefault("METRICS_PROFILE_SAMPLE_RATE", 0.0)
+        app.config.setdefault("METRICS_SLOW_THRESHOLD", 1.0)
+        app.config.setdefault("METRICS_PROFILE_DIR", "profiles")
+        app.extensions["request_metrics"] = self
+        if not app.config["METRICS_ENABLED"]:
+            return
+
+        self.app = app
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule("/metrics", "metrics", self.metrics_view, methods=["GET"])
+
+        from app import db
+
+        with app.app_context():
+            event.listen(db.engine, "before_cursor_execute", self.before_cursor_execute)
+            event.listen(db.engine, "after_cursor_execute", self.after_cursor_execute)
+
+    # ---------- SQLAlchemy 引擎事件 ----------
+
+    # 开始时间记在本条语句的执行上下文上，而不是连接上：语句出错时上下文随之丢弃，
+    # 不会在连接池的连接上留下残余的开始时间，打乱之后语句的计时
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.metrics_query_start = time.perf_counter()
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "metrics_query_start", None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        if not has_request_context() or "metrics_start" not in g:
+            return
+        g.metrics_statements += 1
+        g.metrics_db_time += elapsed
+        # pymysql 等缓冲游标会报告 SELECT 行数，SQLite 等驱动为 -1 时不计
+        if cursor.rowcount and cursor.rowcount > 0:
+            g.metrics_rows += cursor.rowcount
+
+    # ---------- Flask 请求钩子 ----------
+
+    def should_profile(self) -> bool:
+        rate = self.app.config["METRICS_PROFILE_SAMPLE_RATE"]
+        if rate <= 0:
+            return False
+        with self.lock:
+            self.sample_counter += 1
+            # 按固定间隔抽样，结果可复现
+            return self.sample_counter % max(int(round(1 / rate)), 1) == 0
+
+    def before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_statements = 0
+        g.metrics_db_time = 0.0
+        g.metrics_rows = 0
+        g.metrics_profiler = None
+        if self.should_profile():
+            g.metrics_profiler = cProfile.Profile()
+            g.metrics_profiler.enable()
+
+    def after_request(self, response):
+        if "metrics_start" not in g:
+            return response
+        elapsed = time.perf_counter() - g.metrics_start
+        endpoint = request.endpoint or "unknown"
+        labels = (endpoint, request.method)
+
+        profiler = g.metrics_profiler
+        if profiler is not None:
+            profiler.disable()
+            if elapsed >= self.app.config["METRICS_SLOW_THRESHOLD"]:
+                self.dump_profile(profiler, endpoint, elapsed)
+
+        with self.lock:
+            self.requests.inc((endpoint, request.method, str(response.status_code)))
+            self.latency.observe(labels, elapsed)
+            self.statements.observe(labels, g.metrics_statements)
+            self.db_time.observe(labels, g.metrics_db_time)
+            self.rows.inc(labels, g.metrics_rows)
+            if not response.is_streamed:
+                self.response_bytes.observe(labels, response.calculate_content_length() or 0)
+        return response
+
+    def dump_profile(self, profiler, endpoint, elapsed):
+        directory = self.app.config["METRICS_PROFILE_DIR"]
+        os.makedirs(directory, exist_ok=True)
+        filename = f"{endpoint}-{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed * 1000)}ms.prof"
+        profiler.dump_stats(os.path.join(directory, filename))
+        with self.lock:
+            self.profiles_written += 1
+
+    # ---------- /metrics ----------
+
+    def render(self) -> str:
+        from app import cache
+
+        lines = []
+        with self.lock:
+            lines += self.requests.render(("endpoint", "method", "status"))
+            lines += self.latency.render(("endpoint", "method"))
+            lines += self.statements.render(("endpoint", "method"))
+            lines += self.db_time.render(("endpoint", "method"))
+            lines += self.rows.render(("endpoint", "method"))
+            lines += self.response_bytes.render(("endpoint", "method"))
+            lines += [
+                "# HELP bigmonitor_profiles_written_total 已写出的慢请求 cProfile 文件数",
+                "# TYPE bigmonitor_profiles_written_total counter",
+                f"bigmonitor_profiles_written_total {self.profiles_written}",
+            ]
+
+        stats = cache.stats()
+        for key in ("hits", "misses", "not_modified"):
+            lines += [
+                f"# TYPE bigmonitor_cache_{key}_total counter",
+                f"bigmonitor_cache_{key}_total {stats[key]}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def metrics_view(self):
+        return Response(self.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
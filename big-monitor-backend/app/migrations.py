@@ -0,0 +1,215 @@
+"""
+dzml_new 代理主键迁移：把 10 列联合主键换成自增 id，原联合主键保留为唯一约束
+
+InnoDB 的二级索引叶子节点都带一份主键，联合主键下每条索引项要多存 10 列（约 50 字节），
+换成 8 字节的 id 后索引更小、缓存命中更高，游标分页的排序键也只需 (RiQi, id)
+两个方向均可执行，降级后恢复原表结构和索引，数据不丢失；
+迁移只增删 SURROGATE_KEY_INDEXES 中列出的索引和唯一约束，其他索引（如之后新增的 province_code）原样保留：
+    MySQL   一条 ALTER TABLE 完成（InnoDB 只重建一次表）
+    SQLite  不支持修改主键，按目标结构建新表、整表复制后替换
+
+province 触发器：dzml_new 由库外程序导入，不经过 ORM 的 before_insert，
+由触发器在写入时按 DiMing 填写 province（规则与 extract_province 一致），按省份查询只需 province IN (...)：
+    插入时 province 为空则填写；更新时 DiMing 有改动则重算，不覆盖 assign-regions 补全的省份
+    MySQL   BEFORE INSERT / BEFORE UPDATE 直接改写 NEW.province（开启 binlog 时建触发器需相应权限）
+    SQLite  不能修改 NEW，由 AFTER 触发器按 rowid 回写；SQLite 重建表会丢失触发器，_rebuild 结束后重新安装
+"""
+import time
+
+from sqlalchemy import Column, Index, MetaData, Table, inspect, text
+
+from app.models.dzml_new import NATURAL_KEY, DzmlNew
+from app.utils import PROVINCE_CAPITALS, UNKNOWN_PROVINCE
+
+TABLE = DzmlNew.__tablename__
+NATURAL_KEY_CONSTRAINT = "uq_dzml_new_natural_key"
+# 迁移前库中的索引（不含主键）
+LEGACY_INDEXES = {
+    "ix_dzml_new_province_riqi": ("province", "RiQi"),
+    "ix_dzml_new_grid_cell": ("grid_cell",),
+    "ix_dzml_new_UpgradeTime": ("UpgradeTime",),
+}
+# 升级时新建、降级时删除的覆盖索引（需与模型 __table_args__ 中的定义一致）
+SURROGATE_KEY_INDEXES = {
+    "ix_dzml_new_riqi_mc": ("RiQi", "mc"),
+    "ix_dzml_new_mc_riqi": ("mc", "RiQi"),
+}
+
+
+def has_surrogate_key(bind) -> bool:
+    return "id" in {c["name"] for c in inspect(bind).get_columns(TABLE)}
+
+
+def legacy_table() -> Table:
+    """迁移前的表结构：同样的业务列，10 列联合主键，没有 id"""
+    columns = [
+        Column(c.name, c.type, primary_key=c.name in NATURAL_KEY)
+        for c in DzmlNew.__table__.columns
+        if c.name != "id"
+    ]
+    indexes = [Index(name, *columns_) for name, columns_ in LEGACY_INDEXES.items()]
+    return Table(TABLE, MetaData(), *columns, *indexes)
+
+
+def upgrade_surrogate_key(engine) -> float:
+    """迁移到代理主键，返回耗时（秒）；已迁移过时返回 None"""
+    if has_surrogate_key(engine):
+        return None
+    started = time.perf_counter()
+    if engine.dialect.name == "mysql":
+        _upgrade_mysql(engine)
+    else:
+        _rebuild(engine, DzmlNew.__table__)
+    _analyze(engine)
+    return time.perf_counter() - started
+
+
+def downgrade_surrogate_key(engine) -> float:
+    """恢复联合主键，返回耗时（秒）；尚未迁移时返回 None"""
+    if not has_surrogate_key(engine):
+        return None
+    started = time.perf_counter()
+    if engine.dialect.name == "mysql":
+        _downgrade_mysql(engine)
+    else:
+        _rebuild(engine, legacy_table(), drop=(*SURROGATE_KEY_INDEXES, NATURAL_KEY_CONSTRAINT))
+    _analyze(engine)
+    return time.perf_counter() - started
+
+
+def _quote_columns(engine, names) -> str:
+    quote = engine.dialect.identifier_preparer.quote
+    return ", ".join(quote(name) for name in names)
+
+
+def _upgrade_mysql(engine):
+    existing = {i["name"] for i in inspect(engine).get_indexes(TABLE)}
+    clauses = [
+        "DROP PRIMARY KEY",
+        "ADD COLUMN id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY FIRST",
+        f"ADD CONSTRAINT {NATURAL_KEY_CONSTRAINT} UNIQUE ({_quote_columns(engine, NATURAL_KEY)})",
+    ]
+    for name, columns in SURROGATE_KEY_INDEXES.items():
+        if name not in existing:
+            clauses.append(f"ADD INDEX {name} ({_quote_columns(engine, columns)})")
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {TABLE} " + ", ".join(clauses)))
+
+
+def _downgrade_mysql(engine):
+    existing = {i["name"] for i in inspect(engine).get_indexes(TABLE)}
+    existing |= {c["name"] for c in inspect(engine).get_unique_constraints(TABLE)}
+    clauses = [
+        # 删除自增列的同时去掉了它上面的主键
+        "DROP COLUMN id",
+        f"ADD PRIMARY KEY ({_quote_columns(engine, NATURAL_KEY)})",
+    ]
+    # 只删除升级时建立的索引，之后另外新增的索引不受影响
+    clauses += [
+        f"DROP INDEX {name}" for name in (*SURROGATE_KEY_INDEXES, NATURAL_KEY_CONSTRAINT) if name in existing
+    ]
+    for name, columns in LEGACY_INDEXES.items():
+        if name not in existing:
+            clauses.append(f"ADD INDEX {name} ({_quote_columns(engine, columns)})")
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {TABLE} " + ", ".join(clauses)))
+
+
+PROVINCE_INSERT_TRIGGER = "trg_dzml_new_province_insert"
+PROVINCE_UPDATE_TRIGGER = "trg_dzml_new_province_update"
+
+
+def province_case(column: str) -> str:
+    """extract_province 的 SQL 版本：按 PROVINCE_CAPITALS 的顺序取第一个出现在地名中的省份"""
+    whens = " ".join(f"WHEN {column} LIKE '%{name}%' THEN '{name}'" for name in PROVINCE_CAPITALS)
+    return f"CASE {whens} ELSE '{UNKNOWN_PROVINCE}' END"
+
+
+def province_trigger_statements(engine) -> list:
+    if engine.dialect.name == "mysql":
+        return [
+            f"CREATE TRIGGER {PROVINCE_INSERT_TRIGGER} BEFORE INSERT ON {TABLE} FOR EACH ROW "
+            f"SET NEW.province = COALESCE(NULLIF(NEW.province, ''), {province_case('NEW.DiMing')})",
+            f"CREATE TRIGGER {PROVINCE_UPDATE_TRIGGER} BEFORE UPDATE ON {TABLE} FOR EACH ROW "
+            f"SET NEW.province = IF(NEW.DiMing <=> OLD.DiMing, NEW.province, {province_case('NEW.DiMing')})",
+        ]
+    if engine.dialect.name == "sqlite":
+        return [
+            f"CREATE TRIGGER {PROVINCE_INSERT_TRIGGER} AFTER INSERT ON {TABLE} FOR EACH ROW "
+            f"WHEN NULLIF(NEW.province, '') IS NULL BEGIN "
+            f"UPDATE {TABLE} SET province = {province_case('NEW.DiMing')} WHERE rowid = NEW.rowid; END",
+            f"CREATE TRIGGER {PROVINCE_UPDATE_TRIGGER} AFTER UPDATE OF DiMing ON {TABLE} FOR EACH ROW "
+            f"WHEN NEW.DiMing IS NOT OLD.DiMing BEGIN "
+            f"UPDATE {TABLE} SET province = {province_case('NEW.DiMing')} WHERE rowid = NEW.rowid; END",
+        ]
+    raise ValueError(f"不支持在 {engine.dialect.name} 上安装 province 触发器")
+
+
+def has_province_triggers(bind) -> bool:
+    if bind.dialect.name == "mysql":
+        statement = (
+            "SELECT COUNT(*) FROM information_schema.TRIGGERS "
+            "WHERE TRIGGER_SCHEMA = DATABASE() AND EVENT_OBJECT_TABLE = :table AND TRIGGER_NAME IN (:insert, :update)"
+        )
+    else:
+        statement = (
+            "SELECT COUNT(*) FROM sqlite_master "
+            "WHERE type = 'trigger' AND tbl_name = :table AND name IN (:insert, :update)"
+        )
+    with bind.connect() as conn:
+        count = conn.execute(
+            text(statement), {"table": TABLE, "insert": PROVINCE_INSERT_TRIGGER, "update": PROVINCE_UPDATE_TRIGGER}
+        ).scalar()
+    return count == 2
+
+
+def install_province_triggers(engine):
+    """（重新）安装 province 触发器，省份字典变化后重新执行即可更新"""
+    statements = province_trigger_statements(engine)
+    with engine.begin() as conn:
+        for name in (PROVINCE_INSERT_TRIGGER, PROVINCE_UPDATE_TRIGGER):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        for statement in statements:
+            conn.execute(text(statement))
+
+
+def _rebuild(engine, target: Table, drop=()):
+    """
+    SQLite：旧表改名，按 target 建新表并整表复制，按发震时间顺序插入，
+    新分配的 id 与时间顺序一致；旧表上 target 未定义、也不在 drop 中的索引在新表上重建
+    """
+    backup = TABLE + "__old"
+    names = {c.name for c in target.columns}
+    triggers = has_province_triggers(engine)
+    columns = _quote_columns(engine, [c.name for c in target.columns if c.name != "id"])
+    with engine.begin() as conn:
+        # SQLite 的索引名全库唯一，先删掉旧表上的索引才能在新表上用同样的名字
+        indexes = inspect(conn).get_indexes(TABLE)
+        for index in indexes:
+            conn.execute(text(f"DROP INDEX {index['name']}"))
+        conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {backup}"))
+        target.create(conn)
+        conn.execute(text(
+            f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {backup} "
+            f"ORDER BY RiQi, {_quote_columns(engine, NATURAL_KEY)}"
+        ))
+        conn.execute(text(f"DROP TABLE {backup}"))
+
+        defined = {index.name for index in target.indexes} | set(drop)
+        for index in indexes:
+            if index["name"] in defined or not set(index["column_names"]) <= names:
+                continue
+            unique = "UNIQUE " if index["unique"] else ""
+            conn.execute(text(
+                f"CREATE {unique}INDEX {index['name']} ON {TABLE} ({_quote_columns(engine, index['column_names'])})"
+            ))
+    # 触发器随旧表一起删除
+    if triggers:
+        install_province_triggers(engine)
+
+
+def _analyze(engine):
+    """刷新统计信息，让优化器按新的索引选择执行计划"""
+    statement = f"ANALYZE TABLE {TABLE}" if engine.dialect.name == "mysql" else "ANALYZE"
+    with engine.begin() as conn:
+        conn.execute(text(statement))
@@ -1,21 +1,43 @@
 from flask_sqlalchemy import SQLAlchemy
 
+from sqlalchemy import event
+from sqlalchemy.orm import attributes
+
 from app import db
+from app.utils import UNKNOWN_PROVINCE, extract_province, grid_cell, match_provinces
+
+# 地震目录的自然键：发震时刻 + 震中 + 深度 + 震级（迁移前的联合主键）
+NATURAL_KEY = ("year", "month", "day", "hour", "min", "sec", "lon", "lat", "depth", "mc")
+
 
 class DzmlNew(db.Model):
     __tablename__ = "dzml_new"
+    __table_args__ = (
+        # 原联合主键保留为唯一约束，防止重复导入同一条目录
+        db.UniqueConstraint(*NATURAL_KEY, name="uq_dzml_new_natural_key"),
+        # 二级索引自带 8 字节的 id 而不是 10 列联合主键，以下索引都可直接覆盖 (..., id) 排序
+        # 按省份过滤并按时间排序 / 游标分页
+        db.Index("ix_dzml_new_province_riqi", "province", "RiQi"),
+        # 按时间排序的全量列表、统计窗口（含 mc，统计不回表）
+        db.Index("ix_dzml_new_riqi_mc", "RiQi", "mc"),
+        # 按震级下限过滤再按时间排序
+        db.Index("ix_dzml_new_mc_riqi", "mc", "RiQi"),
+    )
 
-    # 主键字段（联合主键）
-    year = db.Column(db.Integer, primary_key=True)
-    month = db.Column(db.Integer, primary_key=True)
-    day = db.Column(db.Integer, primary_key=True)
-    hour = db.Column(db.Integer, primary_key=True)
-    min = db.Column(db.Integer, primary_key=True)
-    sec = db.Column(db.Numeric(20, 3), primary_key=True)
-    lon = db.Column(db.Numeric(20, 3), primary_key=True)
-    lat = db.Column(db.Numeric(20, 3), primary_key=True)
-    depth = db.Column(db.Integer, primary_key=True)
-    mc = db.Column(db.Numeric(20, 1), primary_key=True)
+    # 代理主键，由 flask dzml-new migrate-surrogate-key 为旧库补建（SQLite 只有 INTEGER 主键才自增）
+    id = db.Column(db.BigInteger().with_variant(db.Integer, "sqlite"), primary_key=True, autoincrement=True)
+
+    # 原联合主键字段（现为唯一约束）
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Integer, nullable=False)
+    hour = db.Column(db.Integer, nullable=False)
+    min = db.Column(db.Integer, nullable=False)
+    sec = db.Column(db.Numeric(20, 3), nullable=False)
+    lon = db.Column(db.Numeric(20, 3), nullable=False)
+    lat = db.Column(db.Numeric(20, 3), nullable=False)
+    depth = db.Column(db.Integer, nullable=False)
+    mc = db.Column(db.Numeric(20, 1), nullable=False)
 
     # 其他字段
     JingDu = db.Column(db.String(20))
@@ -32,7 +54,17 @@ class DzmlNew(db.Model):
     tag = db.Column(db.Integer)
     Notes = db.Column(db.String(20))
     OldId = db.Column(db.String(100))
-    UpgradeTime = db.Column(db.DateTime)
+    UpgradeTime = db.Column(db.DateTime, index=True)  # 数据版本水位，缓存失效依据
+
+    # 由 DiMing 解析出的省份，建索引供按省份查询直接走 WHERE
+    # ORM 写入时由下方监听器填写，库外导入由 province 触发器填写（flask dzml-new backfill-province 安装）
+    province = db.Column(db.String(20))
+    # 震中所在的 0.5° 网格编号（见 app.utils.grid_cell），供范围 / 半径查询走 B-tree 索引
+    grid_cell = db.Column(db.Integer, index=True)
+    # 震中所在的省、市行政区划编码，由 flask assign-regions 按省界 / 市界多边形批量计算
+    # province_code 为 0 表示不在任何省界内（海域、境外）；城市编码缺失表示不在市界内
+    province_code = db.Column(db.Integer, index=True)
+    city_code = db.Column(db.Integer, index=True)
 
     def to_dict(self):
         return {
@@ -62,3 +94,28 @@ class DzmlNew(db.Model):
             "OldId": self.OldId,
             "UpgradeTime": self.UpgradeTime.isoformat() if self.UpgradeTime else None,
         }
+
+
+@event.listens_for(DzmlNew, "before_insert")
+@event.listens_for(DzmlNew, "before_update")
+def _fill_derived_columns(mapper, connection, target):
+    """
+    通过 ORM 写入时同步计算 province 和 grid_cell；
+    库外导入的数据由 province 触发器填写 province，grid_cell 由 flask dzml-new backfill-grid 回填
+    更新时只在 province 为空 / 未知，或 DiMing 有改动时重算 province，
+    不覆盖 assign-regions 按行政区边界补全的省份
+    """
+    if (
+        target.province in (None, "", UNKNOWN_PROVINCE)
+        or attributes.get_history(target, "DiMing").has_changes()
+    ):
+        target.province = extract_province(target.DiMing)
+    target.grid_cell = grid_cell(target.lon, target.lat)
+
+
+def province_filter(province_name: str):
+    """
+    按省份名称过滤 dzml_new 的 WHERE 条件，走 (province, RiQi) 索引
+    库外导入的行由 province 触发器在写入时填写（见 app.migrations），路由与基准测试共用此条件
+    """
+    return DzmlNew.province.in_(match_provinces(province_name))
@@ -0,0 +1,43 @@
+from sqlalchemy.orm import declared_attr
+
+from app import db
+
+
+class RollupMixin:
+    """
+    dzml_new 按时间桶的预聚合：每个（时间桶, 省份, 震级区间）一行
+    由 app.rollups 按 UpgradeTime 水位增量维护
+    """
+
+    bucket = db.Column(db.DateTime, primary_key=True)  # 时间桶起点
+    province = db.Column(db.String(20), primary_key=True)  # 未解析出省份的记为“未知”
+    band = db.Column(db.Integer, primary_key=True)  # 震级区间下限（MAGNITUDE_BINS），负震级为 -1
+    count = db.Column(db.Integer, nullable=False)
+    max_mc = db.Column(db.Numeric(20, 1))
+
+    @declared_attr.directive
+    def __table_args__(cls):
+        # 主键以时间桶开头，覆盖全国查询；按省份查询走这个索引
+        return (db.Index(f"ix_{cls.__tablename__}_province_bucket", "province", "bucket"),)
+
+
+class DzmlNewHourly(RollupMixin, db.Model):
+    __tablename__ = "dzml_new_rollup_hour"
+
+
+class DzmlNewDaily(RollupMixin, db.Model):
+    __tablename__ = "dzml_new_rollup_day"
+
+
+class DzmlNewMonthly(RollupMixin, db.Model):
+    __tablename__ = "dzml_new_rollup_month"
+
+
+class RollupState(db.Model):
+    """增量维护的进度：已聚合到的 dzml_new 同步水位（与 /dzml_new/changes 的 watermark 相同）"""
+
+    __tablename__ = "dzml_new_rollup_state"
+
+    name = db.Column(db.String(50), primary_key=True)
+    watermark = db.Column(db.String(500))
+    refreshed_at = db.Column(db.DateTime)
@@ -8,27 +8,31 @@ class Instrument(db.Model):
     # 主键字段
     id = db.Column(db.BigInteger, primary_key=True)
     
-    # 其他字段
-    stationId = db.Column(db.String(255))
-    region = db.Column(db.String(255))
+    # 其他字段（region、type、discipline、dcunitCode、registerFlag、status 为筛选和分面统计建索引，
+    # stationId、instrcode、startDate 等 /instrument/search 的排序字段建索引供游标分页做范围扫描）
+    stationId = db.Column(db.String(255), index=True)
+    region = db.Column(db.String(255), index=True)
     pointId = db.Column(db.Integer)
     lat = db.Column(db.Float)
     lon = db.Column(db.Float)
     instrId = db.Column(db.String(255))
     stackNo = db.Column(db.Integer)
-    instrcode = db.Column(db.String(255))
+    instrcode = db.Column(db.String(255), index=True)
     sampleRate = db.Column(db.String(255))
-    type = db.Column(db.String(255))
+    type = db.Column(db.String(255), index=True)
     style = db.Column(db.String(255))
-    discipline = db.Column(db.String(255))
-    startDate = db.Column(db.DateTime)
+    discipline = db.Column(db.String(255), index=True)
+    startDate = db.Column(db.DateTime, index=True)
     endDate = db.Column(db.DateTime)
     instrProject = db.Column(db.String(255))
-    dcunitCode = db.Column(db.String(255))
+    dcunitCode = db.Column(db.String(255), index=True)
     illeagle = db.Column(db.String(255))
-    registerFlag = db.Column(db.SmallInteger)  # tinyint映射为SmallInteger
-    status = db.Column(db.SmallInteger)  # tinyint映射为SmallInteger
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    registerFlag = db.Column(db.SmallInteger, index=True)  # tinyint映射为SmallInteger
+    status = db.Column(db.SmallInteger, index=True)  # tinyint映射为SmallInteger
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # 数据版本水位，缓存失效依据
+    # 台站所在的省、市行政区划编码，由 flask assign-regions 计算（0 表示不在任何省界内）
+    province_code = db.Column(db.Integer, index=True)
+    city_code = db.Column(db.Integer, index=True)
 
     def to_dict(self):
         return {
@@ -0,0 +1,151 @@
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# 同步驱动 -> 异步驱动，ASGI 模式按 SQLALCHEMY_DATABASE_URI 推导异步连接地址
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def engine_options(config, uri: str = None) -> dict:
+    """
+    由 DB_POOL_* 配置生成 create_engine 的连接池参数
+        pool_pre_ping  借出连接前先探活，MySQL 在 wait_timeout 后断开的空闲连接不会把错误抛给请求
+        pool_recycle   连接存活超过该秒数后重建，应小于 MySQL 的 wait_timeout
+        pool_size / max_overflow / pool_timeout
+                       常驻连接数、突发时额外允许的连接数、连接耗尽时的最长等待秒数
+    内存 SQLite 由 StaticPool 持有唯一连接，不接受池大小参数
+    """
+    options = {"pool_pre_ping": config["DB_POOL_PRE_PING"], "pool_recycle": config["DB_POOL_RECYCLE"]}
+    uri = uri or config.get("SQLALCHEMY_DATABASE_URI")
+    if not uri:
+        return options
+    url = make_url(uri)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return options
+    options.update(
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+    )
+    return options
+
+
+def async_url(config) -> str:
+    """ASGI 模式的异步连接地址：优先 DATABASE_ASYNC_URL，否则把同步驱动替换为对应的异步驱动"""
+    if config.get("DATABASE_ASYNC_URL"):
+        return config["DATABASE_ASYNC_URL"]
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"{backend} 没有对应的异步驱动，请配置 DATABASE_ASYNC_URL")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+class PoolMonitor:
+    """
+    连接池观测：按名称登记引擎（同步的 Flask 引擎、ASGI 模式的异步引擎），
+    通过连接池事件统计建连、借出、归还、失效次数和同时借出的峰值，
+    连同连接池的当前状态（占用 / 空闲 / 溢出）由 /health 返回
+    借出等待耗时由调用方在取连接前后计时上报（observe_wait），连接池本身不提供该事件
+
+    借出峰值接近 pool_size + max_overflow、或等待耗时上升时，说明连接池偏小
+    """
+
+    def __init__(self, app=None):
+        self.pools = {}  # 名称 -> (引擎, 计数)
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """需在 db.init_app 之前调用，连接池参数写入 SQLALCHEMY_ENGINE_OPTIONS 后才对引擎生效"""
+        app.config.setdefault("DB_POOL_SIZE", 10)
+        app.config.setdefault("DB_MAX_OVERFLOW", 20)
+        app.config.setdefault("DB_POOL_TIMEOUT", 10)
+        app.config.setdefault("DB_POOL_RECYCLE", 1800)
+        app.config.setdefault("DB_POOL_PRE_PING", True)
+        app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config))
+        app.extensions["pool_monitor"] = self
+
+    def watch(self, name: str, engine):
+        """登记一个引擎；异步引擎传入其 sync_engine"""
+        counters = {
+            "connects": 0,
+            "checkouts": 0,
+            "checkins": 0,
+            "invalidations": 0,
+            "max_checked_out": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0,
+        }
+
+        def on_connect(dbapi_connection, connection_record):
+            with self.lock:
+                counters["connects"] += 1
+
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            checked_out = checked_out_count(engine.pool)
+            with self.lock:
+                counters["checkouts"] += 1
+                if checked_out is not None and checked_out > counters["max_checked_out"]:
+                    counters["max_checked_out"] = checked_out
+
+        def on_checkin(dbapi_connection, connection_record):
+            with self.lock:
+                counters["checkins"] += 1
+
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            with self.lock:
+                counters["invalidations"] += 1
+
+        event.listen(engine, "connect", on_connect)
+        event.listen(engine, "checkout", on_checkout)
+        event.listen(engine, "checkin", on_checkin)
+        event.listen(engine, "invalidate", on_invalidate)
+        with self.lock:
+            self.pools[name] = (engine, counters)
+
+    def observe_wait(self, name: str, seconds: float):
+        with self.lock:
+            counters = self.pools[name][1]
+            counters["waits"] += 1
+            counters["wait_seconds"] += seconds
+            if seconds > counters["max_wait_seconds"]:
+                counters["max_wait_seconds"] = seconds
+
+    def stats(self) -> dict:
+        result = {}
+        with self.lock:
+            items = [(name, engine, dict(counters)) for name, (engine, counters) in self.pools.items()]
+        for name, engine, counters in items:
+            pool = engine.pool
+            entry = {"pool": type(pool).__name__}
+            # QueuePool 系列才有容量概念，StaticPool / NullPool 只返回计数
+            for key, method in (
+                ("size", "size"),
+                ("checked_out", "checkedout"),
+                ("checked_in", "checkedin"),
+                ("overflow", "overflow"),
+                ("timeout", "timeout"),
+            ):
+                if hasattr(pool, method):
+                    entry[key] = getattr(pool, method)()
+            if hasattr(pool, "_max_overflow"):
+                entry["max_overflow"] = pool._max_overflow
+            entry["recycle"] = pool._recycle
+            entry["pre_ping"] = pool._pre_ping
+            counters["wait_seconds"] = round(counters["wait_seconds"], 6)
+            counters["max_wait_seconds"] = round(counters["max_wait_seconds"], 6)
+            entry.update(counters)
+            result[name] = entry
+        return result
+
+
+def checked_out_count(pool):
+    return pool.checkedout() if hasattr(pool, "checkedout") else None
@@ -0,0 +1,302 @@
+"""
+dzml_new 按小时 / 天 / 月的预聚合表维护
+
+小时表由原始行聚合，天表由小时表、月表由天表汇总，查询只读聚合表，耗时与目录大小无关
+增量维护沿用 /dzml_new/changes 的同步水位：取水位之后新增或更新的行，
+只重算这些行所在的小时桶及其上级的天桶、月桶（先删后插，重算是幂等的）
+删除原始行、或修改 RiQi 使地震移到别的时间桶时，旧桶无法感知，需执行 flask dzml-new rebuild-rollups
+province 为空的行按 DiMing 解析省份；不更新 UpgradeTime 的省份改写由命令自行调用 recompute_rows
+
+刷新由 cron 执行 flask dzml-new refresh-rollups，或由进程内的后台线程每 ROLLUP_REFRESH_INTERVAL 秒执行一次；
+/dzml_new/rollups 只读聚合表，不在请求中写库
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect
+
+from app import db
+from app.models.dzml_new import DzmlNew
+from app.models.dzml_new_rollup import DzmlNewDaily, DzmlNewHourly, DzmlNewMonthly, RollupState
+from app.utils import changes_page, encode_cursor, extract_province, magnitude_band
+
+# 粒度 -> (聚合表, 由哪一级汇总而来)，按从细到粗的顺序维护
+ROLLUP_MODELS = {
+    "hour": (DzmlNewHourly, None),
+    "day": (DzmlNewDaily, "hour"),
+    "month": (DzmlNewMonthly, "day"),
+}
+STATE_NAME = "dzml_new"
+REFRESH_BATCH_SIZE = 5000
+INSERT_BATCH_SIZE = 5000
+
+# 同一进程内的刷新串行执行；多进程同时刷新时后提交的一方会因主键冲突回滚
+refresh_lock = threading.RLock()
+tables_ready = False
+# 后台刷新线程（第一次查询聚合表时启动）
+refresh_thread = None
+
+
+def truncate(moment: datetime, granularity: str) -> datetime:
+    """时间所在桶的起点"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == "hour":
+        return moment
+    moment = moment.replace(hour=0)
+    if granularity == "day":
+        return moment
+    return moment.replace(day=1)
+
+
+def next_bucket(bucket: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return bucket + timedelta(hours=1)
+    if granularity == "day":
+        return bucket + timedelta(days=1)
+    return (bucket.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def merge_ranges(buckets, granularity: str) -> list:
+    """把一组时间桶合并为若干连续的 [start, end) 区间，每个区间一次范围查询"""
+    ranges = []
+    for bucket in sorted(buckets):
+        end = next_bucket(bucket, granularity)
+        if ranges and ranges[-1][1] == bucket:
+            ranges[-1][1] = end
+        else:
+            ranges.append([bucket, end])
+    return ranges
+
+
+def accumulate(totals: dict, key: tuple, count: int, max_mc):
+    entry = totals.get(key)
+    if entry is None:
+        totals[key] = [count, max_mc]
+        return
+    entry[0] += count
+    if max_mc is not None and (entry[1] is None or max_mc > entry[1]):
+        entry[1] = max_mc
+
+
+def aggregate_raw(start: datetime = None, end: datetime = None) -> dict:
+    """由 dzml_new 原始行聚合小时桶，返回 {(桶, 省份, 震级区间): [次数, 最大震级]}"""
+    query = db.session.query(DzmlNew.RiQi, DzmlNew.province, DzmlNew.DiMing, DzmlNew.mc).filter(
+        DzmlNew.RiQi.isnot(None)
+    )
+    if start is not None:
+        query = query.filter(DzmlNew.RiQi >= start, DzmlNew.RiQi < end)
+    totals = {}
+    for riqi, province, diming, mc in query.yield_per(10000):
+        # 安装触发器之前导入、尚未回填的行按 DiMing 解析，与回填结果一致，回填后桶不变
+        key = (truncate(riqi, "hour"), province or extract_province(diming), magnitude_band(mc))
+        accumulate(totals, key, 1, mc)
+    return totals
+
+
+def aggregate_rollup(source, granularity: str, start: datetime = None, end: datetime = None) -> dict:
+    """由更细一级的聚合表汇总出 granularity 粒度的桶"""
+    query = db.session.query(source.bucket, source.province, source.band, source.count, source.max_mc)
+    if start is not None:
+        query = query.filter(source.bucket >= start, source.bucket < end)
+    totals = {}
+    for bucket, province, band, count, max_mc in query.yield_per(10000):
+        accumulate(totals, (truncate(bucket, granularity), province, band), count, max_mc)
+    return totals
+
+
+def insert_totals(model, totals: dict):
+    batch = []
+    for (bucket, province, band), (count, max_mc) in totals.items():
+        batch.append({"bucket": bucket, "province": province, "band": band, "count": count, "max_mc": max_mc})
+        if len(batch) >= INSERT_BATCH_SIZE:
+            db.session.execute(model.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(model.__table__.insert(), batch)
+
+
+def aggregate(granularity: str, start: datetime = None, end: datetime = None) -> dict:
+    source = ROLLUP_MODELS[granularity][1]
+    if source is None:
+        return aggregate_raw(start, end)
+    return aggregate_rollup(ROLLUP_MODELS[source][0], granularity, start, end)
+
+
+def recompute(hours: set):
+    """重算给定小时桶，以及它们所在的天桶、月桶"""
+    buckets = hours
+    for granularity, (model, _) in ROLLUP_MODELS.items():
+        buckets = {truncate(bucket, granularity) for bucket in buckets}
+        totals = {}
+        for start, end in merge_ranges(buckets, granularity):
+            db.session.query(model).filter(model.bucket >= start, model.bucket < end).delete(
+                synchronize_session=False
+            )
+            totals.update(aggregate(granularity, start, end))
+        insert_totals(model, totals)
+
+
+def ensure_tables():
+    """聚合表不存在时建表（只在本进程第一次刷新时检查）"""
+    global tables_ready
+    if tables_ready:
+        return
+    for model, _ in ROLLUP_MODELS.values():
+        model.__table__.create(bind=db.engine, checkfirst=True)
+    RollupState.__table__.create(bind=db.engine, checkfirst=True)
+    tables_ready = True
+
+
+def current_watermark() -> str:
+    """dzml_new 当前最新的同步水位，表为空时为空字符串"""
+    from app.routes.dzml_new_routes import CHANGES_COLUMNS
+
+    latest = (
+        db.session.query(*CHANGES_COLUMNS)
+        .filter(CHANGES_COLUMNS[0].isnot(None))
+        .order_by(*[c.desc() for c in CHANGES_COLUMNS])
+        .first()
+    )
+    return encode_cursor(list(latest)) if latest else ""
+
+
+def save_state(watermark: str):
+    state = db.session.get(RollupState, STATE_NAME) or RollupState(name=STATE_NAME)
+    state.watermark = watermark
+    state.refreshed_at = datetime.now()
+    db.session.add(state)
+
+
+def rebuild_rollups() -> dict:
+    """清空并全量重建三张聚合表，返回各表的行数"""
+    with refresh_lock:
+        ensure_tables()
+        try:
+            # 先取水位再聚合：聚合期间新写入的行会在下一次增量刷新时按小时重算
+            watermark = current_watermark()
+            result = {}
+            for granularity, (model, _) in ROLLUP_MODELS.items():
+                db.session.query(model).delete(synchronize_session=False)
+                totals = aggregate(granularity)
+                insert_totals(model, totals)
+                result[granularity] = len(totals)
+            save_state(watermark)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return result
+
+
+def refresh_rollups() -> dict:
+    """
+    增量刷新：拉取水位之后变化的行，重算受影响的时间桶
+    从未构建过时执行全量重建；返回本次处理的变化行数和重算的小时桶数
+    """
+    from app.routes.dzml_new_routes import CHANGES_COLUMNS
+
+    with refresh_lock:
+        ensure_tables()
+        state = db.session.get(RollupState, STATE_NAME)
+        if state is None:
+            rebuild_rollups()
+            return {"changed": None, "hours": None}
+
+        watermark = state.watermark
+        changed = 0
+        hours = set()
+        query = db.session.query(DzmlNew.RiQi, *CHANGES_COLUMNS)
+        try:
+            while True:
+                rows, watermark, has_more = changes_page(query, CHANGES_COLUMNS, watermark, REFRESH_BATCH_SIZE)
+                changed += len(rows)
+                hours.update(truncate(row.RiQi, "hour") for row in rows if row.RiQi is not None)
+                if not has_more:
+                    break
+
+            if changed:
+                recompute(hours)
+                save_state(watermark)
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return {"changed": changed, "hours": len(hours)}
+
+
+def recompute_rows(moments) -> int:
+    """
+    重算给定发震时刻所在的时间桶，供改写 province 但不更新 UpgradeTime 的命令
+    （assign-regions、backfill-province --all）使用；聚合表从未构建时跳过，返回重算的小时桶数
+    """
+    hours = {truncate(moment, "hour") for moment in moments if moment is not None}
+    if not hours:
+        return 0
+    with refresh_lock:
+        ensure_tables()
+        if db.session.get(RollupState, STATE_NAME) is None:
+            return 0
+        try:
+            recompute(hours)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return len(hours)
+
+
+def rollup_status():
+    """
+    只读：聚合表最近一次刷新的时间，以及 dzml_new 在刷新水位之后是否还有未汇总的变化
+    聚合表尚未建立或从未构建时返回 None
+    """
+    if not tables_ready and not inspect(db.engine).has_table(RollupState.__tablename__):
+        return None
+    state = db.session.get(RollupState, STATE_NAME)
+    if state is None:
+        return None
+    return {"refreshed_at": state.refreshed_at, "stale": state.watermark != current_watermark()}
+
+
+def rollup_version():
+    """聚合表最近一次刷新的 (水位, 时间)，聚合表尚未建立或从未构建时为 None"""
+    if not tables_ready and not inspect(db.engine).has_table(RollupState.__tablename__):
+        return None
+    state = (
+        db.session.query(RollupState.watermark, RollupState.refreshed_at)
+        .filter(RollupState.name == STATE_NAME)
+        .first()
+    )
+    return tuple(state) if state else None
+
+
+def start_background_refresh(app):
+    """
+    启动后台增量刷新线程，每 ROLLUP_REFRESH_INTERVAL 秒执行一次 refresh_rollups；
+    间隔为 0 时不启动，由 cron 执行 flask dzml-new refresh-rollups。重复调用无副作用
+    """
+    global refresh_thread
+    interval = app.config.get("ROLLUP_REFRESH_INTERVAL", 0)
+    if interval <= 0 or refresh_thread is not None:
+        return
+    with refresh_lock:
+        if refresh_thread is None:
+            refresh_thread = threading.Thread(
+                target=_refresh_loop, args=(app, interval), name="rollup-refresher", daemon=True
+            )
+            refresh_thread.start()
+
+
+def _refresh_loop(app, interval: float):
+    with app.app_context():
+        while True:
+            try:
+                refresh_rollups()
+            except Exception:
+                # 其他进程同时刷新时本轮回滚，下一轮重试
+                import traceback
+                traceback.print_exc()
+            finally:
+                db.session.remove()
+            time.sleep(interval)
@@ -0,0 +1,31 @@
+import hmac
+
+from flask import Blueprint, current_app, jsonify, request
+
+from app import cache
+
+cache_bp = Blueprint("cache", __name__)
+
+
+# 测试路径 http://127.0.0.1:5000/cache/stats
+@cache_bp.route("/stats", methods=["GET"])
+def cache_stats():
+    """返回接口缓存的命中 / 未命中次数和占用情况"""
+    return jsonify(cache.stats())
+
+
+@cache_bp.route("/clear", methods=["POST"])
+def cache_clear():
+    """
+    清空接口缓存（管理接口）
+    请求头 X-Admin-Token 须与配置 CACHE_ADMIN_TOKEN 一致；未配置令牌时接口禁用，
+    避免任意跨域页面反复清空缓存、造成冷缓存下的请求洪峰
+    """
+    token = current_app.config.get("CACHE_ADMIN_TOKEN")
+    if not token:
+        return jsonify({"error": "未配置 CACHE_ADMIN_TOKEN，接口已禁用"}), 403
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token):
+        return jsonify({"error": "X-Admin-Token 无效"}), 403
+
+    cache.clear()
+    return jsonify({"cleared": True})
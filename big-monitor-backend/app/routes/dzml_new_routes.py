@@ -1,23 +1,62 @@
-from flask import Blueprint, jsonify, request
-from app import db
-from app.models.dzml_new import DzmlNew
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, current_app, jsonify, request
+from sqlalchemy import and_, case, func, or_
+
+from app import broadcaster, cache, db, place_index
+from app.models.dzml_new import DzmlNew, province_filter
+from app.rollups import (
+    ROLLUP_MODELS, accumulate, rollup_status, rollup_version, start_background_refresh, truncate,
+)
 from app.schemas.dzml_new_schemas import DzmlNewSchema
+from app.serializers import RowEncoder
+from app.utils import (
+    CLUSTER_CACHE_MAX_ZOOM, MAGNITUDE_BINS, MAX_PAGE_SIZE, MAX_ZOOM, ClusterCache, changes_page, cluster_points,
+    clusters_in_bbox, grid_ranges, haversine_km, keyset_page, match_provinces, parse_bbox, radius_bbox,
+    stream_query,
+)
 
 dzml_new_bp = Blueprint("dzml_new", __name__)
-dzml_new_schema = DzmlNewSchema(many=True)
+# 按列元组查询 + 预编译编码，输出与 DzmlNewSchema(many=True).dump 一致
+# 额外查询 id 供游标分页取排序键，不出现在输出中
+dzml_new_encoder = RowEncoder(DzmlNew, DzmlNewSchema, extra=[DzmlNew.id])
+
+# 游标分页的排序键：发震时间 + 代理主键，保证顺序稳定且唯一
+KEYSET_COLUMNS = [DzmlNew.RiQi, DzmlNew.id]
+
+
+def dzml_new_version():
+    """数据版本：最新的 UpgradeTime 和总行数，有地震入库、更新或删除时变化"""
+    return tuple(db.session.query(func.max(DzmlNew.UpgradeTime), func.count()).one())
+
+
+def dzml_new_stats_version():
+    """统计接口默认以当前时间为窗口终点，版本中加入当前小时，窗口滑动后不再复用旧结果"""
+    return dzml_new_version(), datetime.now().strftime("%Y-%m-%d %H")
+
 
+# 测试路径 http://127.0.0.1:5000/dzml_new/all?stream=ndjson
 @dzml_new_bp.route("/all", methods=["GET"])
+@cache.cached(version=dzml_new_version, unless=lambda: "stream" in request.args)
 def list_earthquakes():
-    """返回所有地震信息"""
+    """
+    返回所有地震信息
+    stream=ndjson 时逐行输出 NDJSON，stream=json 时以分块方式输出与默认相同结构的 JSON
+    """
     try:
-        all_data = DzmlNew.query.all()
-        data = dzml_new_schema.dump(all_data)
+        fmt = request.args.get("stream")
+        if fmt in ("ndjson", "json"):
+            return stream_query(dzml_new_encoder.query(), dzml_new_encoder, fmt)
+
+        all_data = dzml_new_encoder.query().all()
+        data = dzml_new_encoder.dump_many(all_data)
         return jsonify({"data": data, "total": len(data)})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 # 测试路径 http://127.0.0.1:5000/dzml_new/province?name=辽宁省
 @dzml_new_bp.route("/province", methods=["GET"])
+@cache.cached(version=dzml_new_version)
 def get_earthquakes_by_province():
     """
     按省份（根据地名字段 DiMing 自动匹配）查询地震信息
@@ -30,18 +69,13 @@ def get_earthquakes_by_province():
         if not province_name:
             return jsonify({"error": "缺少参数 name（省份名称）"}), 400
 
-        # 读取数据库全部地震数据
-        all_data = DzmlNew.query.all()
-
-        # 按照地名字段 DiMing 匹配所属省份
-        filtered = []
-        for record in all_data:
-            province = extract_province(record.DiMing)
-            if province_name.replace("省", "").replace("市", "") in province:
-                filtered.append(record)
+        # 按 province 列过滤（走索引），库外导入的行由触发器填写
+        filtered = dzml_new_encoder.query().filter(
+            province_filter(province_name)
+        ).all()
 
         # 序列化
-        data = dzml_new_schema.dump(filtered)
+        data = dzml_new_encoder.dump_many(filtered)
         return jsonify({
             "province": province_name,
             "count": len(data),
@@ -54,66 +88,22 @@ def get_earthquakes_by_province():
         return jsonify({"error": str(e)}), 500
 
 
-# ----------------------------
-# 辅助函数和省份字典（与聚合代码共用）
-# ----------------------------
-
-PROVINCE_CAPITALS = {
-    "北京": [116.4074, 39.9042],
-    "天津": [117.2000, 39.1333],
-    "上海": [121.4737, 31.2304],
-    "重庆": [106.5516, 29.5630],
-    "四川": [104.0668, 30.5728],
-    "广东": [113.2644, 23.1291],
-    "新疆": [87.6168, 43.8256],
-    "云南": [102.8332, 24.8801],
-    "西藏": [91.1175, 29.6473],
-    "陕西": [108.9402, 34.3416],
-    "甘肃": [103.8343, 36.0611],
-    "青海": [101.7778, 36.6173],
-    "宁夏": [106.2325, 38.4864],
-    "内蒙古": [111.7656, 40.8174],
-    "广西": [108.3275, 22.8150],
-    "贵州": [106.7074, 26.5982],
-    "湖南": [112.9389, 28.2278],
-    "湖北": [114.3054, 30.5931],
-    "河南": [113.6654, 34.7570],
-    "山东": [117.1201, 36.6512],
-    "山西": [112.5624, 37.8735],
-    "河北": [114.5149, 38.0428],
-    "安徽": [117.2830, 31.8612],
-    "江苏": [118.7969, 32.0603],
-    "浙江": [120.1551, 30.2741],
-    "福建": [119.2965, 26.0745],
-    "江西": [115.9100, 28.6742],
-    "辽宁": [123.4291, 41.7968],
-    "吉林": [125.3245, 43.8868],
-    "黑龙江": [126.6425, 45.7560],
-    "海南": [110.3486, 20.0186],
-    "香港": [114.1694, 22.3193],
-    "澳门": [113.5491, 22.1987],
-    "台湾": [121.5091, 25.0443],
-}
-
-
-def extract_province(diming: str) -> str:
-    """根据地名字符串解析出所属省份"""
-    if not diming:
-        return "未知"
-    for province in PROVINCE_CAPITALS.keys():
-        if province in diming:
-            return province
-    return "未知"
-
 # 测试路径示例：
 # http://127.0.0.1:5000/dzml_new/province/page?name=辽宁&page=1&size=10
+# http://127.0.0.1:5000/dzml_new/province/page?name=辽宁&size=10&cursor=
 
 @dzml_new_bp.route("/province/page", methods=["GET"])
+@cache.cached(version=dzml_new_version)
 def get_earthquakes_by_province_paginated():
     """
     按省份分页查询地震信息（根据 DiMing 自动匹配省份）
     示例：
         GET /dzml_new/province/page?name=辽宁&page=1&size=10
+    游标分页（按发震时间倒序，翻到多深都只是一次索引范围扫描）：
+        GET /dzml_new/province/page?name=辽宁&size=10&cursor=
+        GET /dzml_new/province/page?name=辽宁&size=10&cursor=<上一页返回的 next_cursor>
+        追加 with_total=1 时额外返回 total（需要一次 COUNT）
+    发震时间 RiQi 为空的记录不参与游标分页
     """
     try:
         # 获取查询参数
@@ -125,29 +115,47 @@ def get_earthquakes_by_province_paginated():
             return jsonify({"error": "缺少参数 name（省份名称）"}), 400
 
         # ------------------------
-        # Step 1: 读取全部数据（后续可优化为数据库模糊匹配）
+        # Step 1: 按 province 列过滤（走索引），库外导入的行由触发器填写
         # ------------------------
-        all_data = DzmlNew.query.all()
+        query = dzml_new_encoder.query().filter(
+            province_filter(province_name)
+        )
 
-        # Step 2: 过滤出匹配指定省份的数据
-        filtered = []
-        for record in all_data:
-            province = extract_province(record.DiMing)
-            if province_name.replace("省", "").replace("市", "") in province:
-                filtered.append(record)
+        if "cursor" in request.args:
+            size = min(size, MAX_PAGE_SIZE)
+            try:
+                paged_data, next_cursor = keyset_page(
+                    query.filter(DzmlNew.RiQi.isnot(None)),
+                    KEYSET_COLUMNS,
+                    request.args.get("cursor"),
+                    size,
+                    descending=True,
+                )
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            data = dzml_new_encoder.dump_many(paged_data)
+            result = {
+                "province": province_name,
+                "size": size,
+                "count": len(data),
+                "next_cursor": next_cursor,
+                "data": data
+            }
+            if request.args.get("with_total") == "1":
+                result["total"] = query.filter(DzmlNew.RiQi.isnot(None)).count()
+            return jsonify(result)
 
         # ------------------------
-        # Step 3: 手动分页
+        # Step 2: 数据库分页
         # ------------------------
-        total = len(filtered)
-        start = (page - 1) * size
-        end = start + size
-        paged_data = filtered[start:end]
+        total = query.count()
+        paged_data = query.offset((page - 1) * size).limit(size).all()
 
-        # Step 4: 序列化
-        data = dzml_new_schema.dump(paged_data)
+        # Step 3: 序列化
+        data = dzml_new_encoder.dump_many(paged_data)
 
-        # Step 5: 返回分页结果
+        # Step 4: 返回分页结果
         return jsonify({
             "province": province_name,
             "page": page,
@@ -162,3 +170,635 @@ def get_earthquakes_by_province_paginated():
         import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
+
+
+# ----------------------------
+# 仪表盘统计（EarthquakeCharts：频度、震级分布、MT 图）
+# ----------------------------
+
+# 时间桶对应的分组列，直接用表里已拆好的年/月/日/时整型列，避免依赖各数据库的日期函数
+STATS_BUCKETS = {
+    "month": ["year", "month"],
+    "day": ["year", "month", "day"],
+    "hour": ["year", "month", "day", "hour"],
+}
+
+
+def bucket_label(bucket: str, parts) -> str:
+    """把分组键格式化为时间桶标签"""
+    if bucket == "month":
+        return "%04d-%02d" % tuple(parts)
+    if bucket == "day":
+        return "%04d-%02d-%02d" % tuple(parts)
+    return "%04d-%02d-%02d %02d:00" % tuple(parts)
+
+
+# 单次统计最多返回的时间桶数（hour 约一年、day 约二十七年），超出时返回 400，避免在内存中构建超大响应
+MAX_STATS_BUCKETS = 10000
+
+
+def count_buckets(bucket: str, start: datetime, end: datetime) -> int:
+    """窗口内的时间桶个数，与 iter_buckets 列出的一致，不必逐个生成"""
+    if bucket == "month":
+        count = (end.year - start.year) * 12 + end.month - start.month + 1
+    elif bucket == "day":
+        count = (end.date() - start.date()).days + 1
+    else:
+        count = int((end - start.replace(minute=0, second=0, microsecond=0)).total_seconds() // 3600) + 1
+    return max(count, 0)
+
+
+def iter_buckets(bucket: str, start: datetime, end: datetime):
+    """按时间顺序列出窗口内的全部时间桶，用于补齐没有地震的桶"""
+    if bucket == "month":
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            yield (year, month)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return
+
+    step = timedelta(days=1) if bucket == "day" else timedelta(hours=1)
+    current = start.replace(minute=0, second=0, microsecond=0)
+    if bucket == "day":
+        current = current.replace(hour=0)
+    while current <= end:
+        parts = (current.year, current.month, current.day, current.hour)
+        yield parts[:len(STATS_BUCKETS[bucket])]
+        current += step
+
+
+def downsample_mt(points: list, limit: int) -> list:
+    """
+    MT 图降采样：把时间窗口等分为 limit 段，每段保留震级最大的一次地震
+    大震不会被抽稀掉，曲线形状与原始序列一致
+    """
+    if len(points) <= limit:
+        return points
+    first, last = points[0][0], points[-1][0]
+    span = (last - first).total_seconds() or 1
+    kept = {}
+    for riqi, mc in points:
+        slot = min(int((riqi - first).total_seconds() / span * limit), limit - 1)
+        if slot not in kept or mc > kept[slot][1]:
+            kept[slot] = (riqi, mc)
+    return [kept[slot] for slot in sorted(kept)]
+
+
+# 测试路径示例：
+# http://127.0.0.1:5000/dzml_new/stats?name=辽宁&days=30
+@dzml_new_bp.route("/stats", methods=["GET"])
+@cache.cached(version=dzml_new_stats_version)
+def get_earthquake_stats():
+    """
+    在数据库中聚合仪表盘所需的统计数据，前端不再下载整省目录
+    参数：
+        name    省份名称，可选，不传则统计全部
+        start / end  时间窗口（ISO 格式），默认最近 days 天，days 默认 30
+        bucket  时间桶 month / day / hour，默认 day；窗口内的桶数不超过 MAX_STATS_BUCKETS
+        points  MT 序列最多返回的点数，默认 200
+    示例：
+        GET /dzml_new/stats?name=辽宁&days=30&bucket=day&points=200
+    """
+    try:
+        province_name = request.args.get("name", "").strip()
+        bucket = request.args.get("bucket", "day")
+        points = int(request.args.get("points", 200))
+        if bucket not in STATS_BUCKETS:
+            return jsonify({"error": "bucket 参数只能是 month / day / hour"}), 400
+        if points <= 0:
+            return jsonify({"error": "points 参数必须为正整数"}), 400
+
+        try:
+            end = datetime.fromisoformat(request.args["end"]) if "end" in request.args else datetime.now()
+            if "start" in request.args:
+                start = datetime.fromisoformat(request.args["start"])
+            else:
+                start = end - timedelta(days=int(request.args.get("days", 30)))
+        except (ValueError, OverflowError):
+            return jsonify({"error": "start / end / days 参数格式错误"}), 400
+        if count_buckets(bucket, start, end) > MAX_STATS_BUCKETS:
+            return jsonify({"error": f"时间桶超过 {MAX_STATS_BUCKETS} 个，请缩小时间窗口或改用更粗的 bucket"}), 400
+
+        conditions = [DzmlNew.RiQi >= start, DzmlNew.RiQi <= end]
+        if province_name:
+            conditions.append(province_filter(province_name))
+
+        # Step 1: 按时间桶统计次数和最大震级
+        group_columns = [getattr(DzmlNew, name) for name in STATS_BUCKETS[bucket]]
+        bucket_rows = (
+            db.session.query(*group_columns, func.count(), func.max(DzmlNew.mc))
+            .filter(*conditions)
+            .group_by(*group_columns)
+            .all()
+        )
+        per_bucket = {tuple(row[:-2]): (row[-2], row[-1]) for row in bucket_rows}
+        buckets = []
+        for parts in iter_buckets(bucket, start, end):
+            count, max_mc = per_bucket.get(tuple(parts), (0, None))
+            buckets.append({
+                "time": bucket_label(bucket, parts),
+                "count": count,
+                "max_mc": float(max_mc) if max_mc is not None else None,
+            })
+
+        # Step 2: 震级分布
+        magnitude_bin = case(
+            *[(DzmlNew.mc >= low, low) for low in reversed(MAGNITUDE_BINS)],
+            else_=None,
+        )
+        bin_rows = (
+            db.session.query(magnitude_bin, func.count())
+            .filter(*conditions)
+            .group_by(magnitude_bin)
+            .all()
+        )
+        bin_counts = {low: count for low, count in bin_rows if low is not None}
+        magnitude_bins = [
+            {
+                "label": f"{low}+" if i == len(MAGNITUDE_BINS) - 1 else f"{low}~{MAGNITUDE_BINS[i + 1]}",
+                "count": bin_counts.get(low, 0),
+            }
+            for i, low in enumerate(MAGNITUDE_BINS)
+        ]
+
+        # Step 3: MT 序列，只取时间和震级两列，再按点数上限降采样
+        mt_rows = (
+            db.session.query(DzmlNew.RiQi, DzmlNew.mc)
+            .filter(*conditions)
+            .order_by(DzmlNew.RiQi)
+            .all()
+        )
+        mt = [
+            {"time": riqi.isoformat(), "mc": float(mc)}
+            for riqi, mc in downsample_mt([tuple(row) for row in mt_rows], points)
+        ]
+
+        return jsonify({
+            "province": province_name,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "bucket": bucket,
+            "total": len(mt_rows),
+            "buckets": buckets,
+            "magnitude_bins": magnitude_bins,
+            "mt": mt
+        })
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# ----------------------------
+# 预聚合统计：只读小时 / 天 / 月聚合表（见 app/rollups.py）
+# ----------------------------
+
+def dzml_new_rollups_version():
+    """在统计接口的版本上加入聚合表的刷新水位，刷新完成后 refreshed_at / stale 不再沿用旧结果"""
+    return dzml_new_stats_version(), rollup_version()
+
+
+# 测试路径示例：
+# http://127.0.0.1:5000/dzml_new/rollups?granularity=month&name=四川&start=2020-01-01T00:00:00
+@dzml_new_bp.route("/rollups", methods=["GET"])
+@cache.cached(version=dzml_new_rollups_version)
+def get_earthquake_rollups():
+    """
+    按时间桶、省份、震级区间的地震次数，只读预聚合表，耗时与目录大小无关
+    聚合表由后台线程（ROLLUP_REFRESH_INTERVAL）或 cron 执行 flask dzml-new refresh-rollups 增量刷新，
+    响应中的 refreshed_at 为最近一次刷新时间，stale 表示之后 dzml_new 还有变化尚未汇总
+    参数：
+        granularity  hour / day / month，默认 day；窗口内的桶数不超过 MAX_STATS_BUCKETS
+        name         省份名称，可选
+        start / end  时间窗口（ISO 格式），默认最近 days 天，days 默认 30；按整桶统计
+        min_mc       只统计不低于该震级区间下限的地震，可选
+    示例：
+        GET /dzml_new/rollups?granularity=day&name=辽宁&days=30
+        GET /dzml_new/rollups?granularity=month&start=2015-01-01T00:00:00&min_mc=3
+    """
+    try:
+        granularity = request.args.get("granularity", "day")
+        if granularity not in ROLLUP_MODELS:
+            return jsonify({"error": "granularity 参数只能是 hour / day / month"}), 400
+        province_name = request.args.get("name", "").strip()
+        try:
+            end = datetime.fromisoformat(request.args["end"]) if "end" in request.args else datetime.now()
+            if "start" in request.args:
+                start = datetime.fromisoformat(request.args["start"])
+            else:
+                start = end - timedelta(days=int(request.args.get("days", 30)))
+            min_band = int(float(request.args["min_mc"])) if "min_mc" in request.args else None
+        except (ValueError, OverflowError):
+            return jsonify({"error": "start / end / days / min_mc 参数格式错误"}), 400
+        if count_buckets(granularity, start, end) > MAX_STATS_BUCKETS:
+            return jsonify({"error": f"时间桶超过 {MAX_STATS_BUCKETS} 个，请缩小时间窗口或改用更粗的 granularity"}), 400
+
+        start_background_refresh(current_app._get_current_object())
+        status = rollup_status()
+        if status is None:
+            return jsonify({"error": "聚合表尚未构建，请执行 flask dzml-new rebuild-rollups"}), 503
+
+        model = ROLLUP_MODELS[granularity][0]
+        query = db.session.query(model.bucket, model.province, model.band, model.count, model.max_mc).filter(
+            model.bucket >= truncate(start, granularity), model.bucket <= end
+        )
+        if province_name:
+            query = query.filter(model.province.in_(match_provinces(province_name)))
+        if min_band is not None:
+            query = query.filter(model.band >= min_band)
+
+        per_bucket, per_band, per_province = {}, {}, {}
+        total = 0
+        for bucket, province, band, count, max_mc in query.all():
+            total += count
+            for totals, key in ((per_bucket, bucket), (per_band, band), (per_province, province)):
+                accumulate(totals, key, count, max_mc)
+
+        buckets = []
+        for parts in iter_buckets(granularity, start, end):
+            # 月桶的分组键只有年、月，起点为当月 1 日
+            bucket_start = datetime(*parts) if len(parts) >= 3 else datetime(*parts, 1)
+            count, max_mc = per_bucket.get(bucket_start, (0, None))
+            buckets.append({
+                "time": bucket_label(granularity, parts),
+                "count": count,
+                "max_mc": float(max_mc) if max_mc is not None else None,
+            })
+        magnitude_bins = [
+            {
+                "label": f"{low}+" if i == len(MAGNITUDE_BINS) - 1 else f"{low}~{MAGNITUDE_BINS[i + 1]}",
+                "count": per_band.get(low, (0, None))[0],
+            }
+            for i, low in enumerate(MAGNITUDE_BINS)
+        ]
+        provinces = [
+            {"province": province, "count": count, "max_mc": float(max_mc) if max_mc is not None else None}
+            for province, (count, max_mc) in sorted(per_province.items(), key=lambda item: -item[1][0])
+        ]
+        refreshed = status["refreshed_at"]
+
+        return jsonify({
+            "granularity": granularity,
+            "province": province_name,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "total": total,
+            "refreshed_at": refreshed.isoformat() if refreshed else None,
+            "stale": status["stale"],
+            "buckets": buckets,
+            "magnitude_bins": magnitude_bins,
+            "provinces": provinces
+        })
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# ----------------------------
+# 地震活动性统计：b 值、Mc、发生率（NumPy，见 app/seismicity.py）
+# ----------------------------
+
+# 测试路径示例：
+# http://127.0.0.1:5000/dzml_new/seismicity-stats?province=四川&start=2015-01-01T00:00:00
+@dzml_new_bp.route("/seismicity-stats", methods=["GET"])
+@cache.cached(version=dzml_new_stats_version)
+def get_seismicity_stats():
+    """
+    在服务端计算 Gutenberg-Richter b 值（最大似然 + bootstrap 不确定度）、
+    最大曲率法 Mc 和发生率；结果按“省份 + 时间窗口 + 参数”缓存，重复刷新不再计算
+    参数：
+        province     省份名称，可选，不传则统计全部
+        start / end  时间窗口（ISO 格式），默认最近 days 天，days 默认 365
+        correction   最大曲率法的 Mc 修正量，默认 0.2
+        bootstrap    bootstrap 重抽样次数，默认 200，2~5000，0 表示不做
+        min_events   Mc 以上至少多少次地震才计算 b 值，默认 50
+    示例：
+        GET /dzml_new/seismicity-stats?province=四川&days=3650
+    """
+    try:
+        try:
+            from app import seismicity  # numpy 为可选依赖，只有该接口需要
+        except ImportError:
+            return jsonify({"error": "该接口需要安装 numpy"}), 501
+
+        province_name = request.args.get("province", "").strip()
+        try:
+            end = datetime.fromisoformat(request.args["end"]) if "end" in request.args else datetime.now()
+            if "start" in request.args:
+                start = datetime.fromisoformat(request.args["start"])
+            else:
+                start = end - timedelta(days=int(request.args.get("days", 365)))
+            correction = float(request.args.get("correction", 0.2))
+            bootstrap = min(int(request.args.get("bootstrap", 200)), 5000)
+            min_events = max(int(request.args.get("min_events", 50)), 2)
+        except ValueError:
+            return jsonify({"error": "start / end / days / correction / bootstrap / min_events 参数格式错误"}), 400
+        if start >= end:
+            return jsonify({"error": "start 必须早于 end"}), 400
+        if bootstrap == 1:
+            # 单个样本算不出标准差（ddof=1 时为 NaN，不是合法的 JSON）
+            return jsonify({"error": "bootstrap 为 0（不做）或不少于 2"}), 400
+
+        conditions = [DzmlNew.RiQi >= start, DzmlNew.RiQi <= end]
+        if province_name:
+            conditions.append(province_filter(province_name))
+
+        # 只取时间和震级两列，转成 NumPy 数组后全部向量化计算
+        rows = db.session.query(DzmlNew.RiQi, DzmlNew.mc).filter(*conditions).order_by(DzmlNew.RiQi).all()
+        times, magnitudes = seismicity.to_arrays(rows)
+        result = seismicity.seismicity_stats(
+            times, magnitudes, start, end,
+            correction=correction, bootstrap=max(bootstrap, 0), min_events=min_events,
+        )
+
+        result.update({
+            "province": province_name,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+        })
+        return jsonify(result)
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# ----------------------------
+# 空间查询：先按 grid_cell 索引取候选，再精确过滤
+# ----------------------------
+
+# 全图聚合结果，按缩放级别缓存
+dzml_new_clusters = ClusterCache()
+
+
+def bbox_query(min_lon, min_lat, max_lon, max_lat):
+    """网格编号区间（索引范围扫描）+ 经纬度精确比较"""
+    cells = or_(*[
+        DzmlNew.grid_cell.between(low, high)
+        for low, high in grid_ranges(min_lon, min_lat, max_lon, max_lat)
+    ])
+    return dzml_new_encoder.query().filter(
+        cells,
+        and_(DzmlNew.lon >= min_lon, DzmlNew.lon <= max_lon),
+        and_(DzmlNew.lat >= min_lat, DzmlNew.lat <= max_lat),
+    )
+
+
+# 测试路径示例：
+# http://127.0.0.1:5000/dzml_new/bbox?bbox=120,38,126,43
+@dzml_new_bp.route("/bbox", methods=["GET"])
+@cache.cached(version=dzml_new_version)
+def get_earthquakes_in_bbox():
+    """
+    查询矩形范围内的地震（地图平移时只取可视范围）
+    示例：
+        GET /dzml_new/bbox?bbox=120,38,126,43
+    """
+    try:
+        try:
+            bbox = parse_bbox(request.args.get("bbox", ""))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        data = dzml_new_encoder.dump_many(bbox_query(*bbox).all())
+        return jsonify({
+            "bbox": list(bbox),
+            "count": len(data),
+            "data": data
+        })
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# 测试路径示例：
+# http://127.0.0.1:5000/dzml_new/clusters?zoom=5&bbox=100,20,130,45
+@dzml_new_bp.route("/clusters", methods=["GET"])
+@cache.cached(version=dzml_new_version)
+def get_earthquake_clusters():
+    """
+    地图点聚合：按缩放级别的网格在库内 GROUP BY，返回每格的地震数、质心和最大震级
+    zoom 不超过 CLUSTER_CACHE_MAX_ZOOM 时按全图聚合并按级别缓存，数据变化或过期后重新计算；
+    更高级别只聚合 bbox 范围内的地震
+    示例：
+        GET /dzml_new/clusters?zoom=5
+        GET /dzml_new/clusters?zoom=8&bbox=120,38,126,43
+    """
+    try:
+        try:
+            zoom = int(request.args.get("zoom", 5))
+        except ValueError:
+            return jsonify({"error": "zoom 参数格式错误"}), 400
+        try:
+            bbox = parse_bbox(request.args["bbox"]) if request.args.get("bbox") else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if not 0 <= zoom <= MAX_ZOOM:
+            return jsonify({"error": f"zoom 取值范围为 0~{MAX_ZOOM}"}), 400
+        if zoom > CLUSTER_CACHE_MAX_ZOOM and bbox is None:
+            return jsonify({"error": f"zoom 大于 {CLUSTER_CACHE_MAX_ZOOM} 时必须指定 bbox"}), 400
+
+        dialect = db.engine.dialect.name
+        extra = {"max_mc": func.max(DzmlNew.mc)}
+        if zoom <= CLUSTER_CACHE_MAX_ZOOM:
+            clusters = dzml_new_clusters.get(
+                zoom,
+                cache.version(dzml_new_version),
+                lambda: cluster_points(
+                    db.session.query(DzmlNew), DzmlNew.lon, DzmlNew.lat, zoom, dialect, extra
+                ),
+            )
+            clusters = clusters_in_bbox(clusters, bbox)
+        else:
+            clusters = cluster_points(bbox_query(*bbox), DzmlNew.lon, DzmlNew.lat, zoom, dialect, extra)
+
+        return jsonify({
+            "zoom": zoom,
+            "bbox": list(bbox) if bbox else None,
+            "count": len(clusters),
+            "total": sum(c["count"] for c in clusters),
+            "data": clusters
+        })
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# 测试路径示例：
+# http://127.0.0.1:5000/dzml_new/near?lon=122.0&lat=40.5&km=100
+@dzml_new_bp.route("/near", methods=["GET"])
+@cache.cached(version=dzml_new_version)
+def get_earthquakes_near():
+    """
+    查询距某点 km 公里以内的地震，按距离由近到远排序，每条记录附带 distance_km
+    示例：
+        GET /dzml_new/near?lon=122.0&lat=40.5&km=100
+    """
+    try:
+        try:
+            lon = float(request.args["lon"])
+            lat = float(request.args["lat"])
+            km = float(request.args["km"])
+        except (KeyError, ValueError):
+            return jsonify({"error": "缺少参数或格式错误：lon、lat、km"}), 400
+        if not (-180 <= lon <= 180 and -90 <= lat <= 90 and km > 0):
+            return jsonify({"error": "lon、lat 超出范围或 km 不是正数"}), 400
+
+        # 外接矩形取候选，再按大圆距离精确过滤
+        data = []
+        for record in dzml_new_encoder.dump_many(bbox_query(*radius_bbox(lon, lat, km)).all()):
+            distance = haversine_km(lon, lat, record["lon"], record["lat"])
+            if distance <= km:
+                record["distance_km"] = round(distance, 3)
+                data.append(record)
+        data.sort(key=lambda r: r["distance_km"])
+
+        return jsonify({
+            "lon": lon,
+            "lat": lat,
+            "km": km,
+            "count": len(data),
+            "data": data
+        })
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# ----------------------------
+# 地名检索：内存中的 n-gram 倒排索引（见 app/search.py）
+# ----------------------------
+
+# 测试路径示例：
+# http://127.0.0.1:5000/dzml_new/search?q=汶川&page=1&size=20
+@dzml_new_bp.route("/search", methods=["GET"])
+@cache.cached(version=dzml_new_version)
+def search_earthquakes():
+    """
+    按地名模糊检索地震：完整包含查询串的地名排在前面，其余按字符二元组的命中比例排序，
+    得分相同的地名下的地震按发震时间倒序归并后分页
+    参数：
+        q       查询串，必填
+        page    页码，默认 1
+        size    每页条数，默认 20，最多 200
+    返回的 places 为得分最高的前 20 个地名及各自的地震数，可用于输入联想
+    """
+    try:
+        q = request.args.get("q", "").strip()
+        if not q:
+            return jsonify({"error": "缺少 q 参数"}), 400
+        try:
+            page = int(request.args.get("page", 1))
+            size = min(int(request.args.get("size", 20)), 200)
+        except ValueError:
+            return jsonify({"error": "page / size 参数格式错误"}), 400
+        if page < 1 or size < 1:
+            return jsonify({"error": "page / size 必须为正整数"}), 400
+
+        ids, total, places = place_index.search(q, (page - 1) * size, size)
+
+        # 按 id 取本页记录，再按索引给出的顺序排列；索引更新前已删除的记录不会出现
+        rows = dzml_new_encoder.query().filter(DzmlNew.id.in_(ids)).all() if ids else []
+        by_id = {row.id: row for row in rows}
+        data = dzml_new_encoder.dump_many(by_id[i] for i in ids if i in by_id)
+
+        return jsonify({
+            "q": q,
+            "page": page,
+            "size": size,
+            "total": total,
+            "pages": (total + size - 1) // size,
+            "count": len(data),
+            "places": places[:20],
+            "data": data
+        })
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# ----------------------------
+# 增量同步
+# ----------------------------
+
+# 同步水位的排序键：更新时间 + 代理主键，相同 UpgradeTime 的记录也不会漏取
+CHANGES_COLUMNS = [DzmlNew.UpgradeTime, DzmlNew.id]
+
+
+# 测试路径示例：
+# http://127.0.0.1:5000/dzml_new/changes?since=2025-01-01T00:00:00
+@dzml_new_bp.route("/changes", methods=["GET"])
+def get_earthquake_changes():
+    """
+    返回 since 之后新增或更新的地震记录（按 UpgradeTime 升序）以及新的同步水位
+    since 可以是 ISO 时间（首次同步），也可以是上一次返回的 watermark；
+    has_more 为 true 时用新的 watermark 继续拉取
+    示例：
+        GET /dzml_new/changes?since=2025-01-01T00:00:00&limit=1000
+        GET /dzml_new/changes?since=<上一次返回的 watermark>
+    """
+    try:
+        limit = min(int(request.args.get("limit", 1000)), 10000)
+        try:
+            rows, watermark, has_more = changes_page(
+                dzml_new_encoder.query(), CHANGES_COLUMNS, request.args.get("since", ""), limit
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        data = dzml_new_encoder.dump_many(rows)
+        return jsonify({
+            "count": len(data),
+            "has_more": has_more,
+            "watermark": watermark,
+            "data": data
+        })
+
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# ----------------------------
+# 新地震实时推送（Server-Sent Events）
+# ----------------------------
+
+# 测试路径示例：
+# http://127.0.0.1:5000/dzml_new/stream?name=辽宁&min_mc=3
+@dzml_new_bp.route("/stream", methods=["GET"])
+def stream_new_earthquakes():
+    """
+    订阅新入库的地震，按省份和最小震级过滤
+    所有连接共用一个后台轮询线程，前端用 EventSource 监听 earthquake 事件：
+        const es = new EventSource("/dzml_new/stream?name=辽宁&min_mc=3")
+        es.addEventListener("earthquake", e => console.log(JSON.parse(e.data)))
+    """
+    try:
+        min_mc = float(request.args.get("min_mc", 0))
+    except ValueError:
+        return jsonify({"error": "min_mc 参数格式错误"}), 400
+
+    subscriber = broadcaster.subscribe(request.args.get("name", "").strip(), min_mc)
+    response = Response(broadcaster.stream(subscriber), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # 关闭 Nginx 缓冲，事件立即送达
+    return response
+
+
+@dzml_new_bp.route("/stream/stats", methods=["GET"])
+def stream_stats():
+    """返回推送通道的订阅数、轮询次数和当前水位"""
+    return jsonify(broadcaster.stats())
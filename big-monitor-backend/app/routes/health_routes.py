@@ -0,0 +1,29 @@
+import time
+
+from flask import Blueprint, jsonify
+from sqlalchemy import text
+
+from app import db, pool_monitor
+
+health_bp = Blueprint("health", __name__)
+
+
+# 测试路径 http://127.0.0.1:5000/health
+@health_bp.route("", methods=["GET"])
+def health():
+    """
+    健康检查：执行一次 SELECT 1，并返回各连接池的状态和借出统计
+    数据库不可用时返回 503，便于负载均衡摘除实例
+    """
+    started = time.perf_counter()
+    try:
+        db.session.execute(text("SELECT 1"))
+        database = {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 3)}
+    except Exception as e:
+        database = {"ok": False, "error": str(e)}
+    status = 200 if database["ok"] else 503
+    return jsonify({
+        "status": "ok" if database["ok"] else "error",
+        "database": database,
+        "pools": pool_monitor.stats()
+    }), status
@@ -1,19 +1,46 @@
 from flask import Blueprint, jsonify, request
-from app import db
+
+from sqlalchemy import func, or_
+
+from app import cache, db
 from app.models.instrument import Instrument
 from app.schemas.instrument_schemas import InstrumentSchema
+from app.serializers import RowEncoder
+from app.utils import (
+    MAX_PAGE_SIZE, MAX_ZOOM, ClusterCache, changes_page, cluster_points, clusters_in_bbox, keyset_page,
+    nullable_keyset_page, parse_bbox, stream_query,
+)
 
 instrument_bp = Blueprint("instrument", __name__)
-instrument_schema = InstrumentSchema(many=True)
+# 按列元组查询 + 预编译编码，输出与 InstrumentSchema(many=True).dump 一致
+instrument_encoder = RowEncoder(Instrument, InstrumentSchema)
+
+
+# 全图聚合结果，按缩放级别缓存（仪器数量有限，所有级别都按全图聚合）
+instrument_clusters = ClusterCache()
+
+
+def instrument_version():
+    """数据版本：最新的 created_at 和总行数，有仪器登记或删除时变化"""
+    return tuple(db.session.query(func.max(Instrument.created_at), func.count()).one())
 
 
 # 测试路径 http://127.0.0.1:5000/instrument/all
+# 流式输出 http://127.0.0.1:5000/instrument/all?stream=ndjson
 @instrument_bp.route("/all", methods=["GET"])
+@cache.cached(version=instrument_version, unless=lambda: "stream" in request.args)
 def list_instruments():
-    """获取全部仪器信息"""
+    """
+    获取全部仪器信息
+    stream=ndjson 时逐行输出 NDJSON，stream=json 时以分块方式输出与默认相同结构的 JSON
+    """
     try:
-        all_data = Instrument.query.all()
-        data = instrument_schema.dump(all_data)
+        fmt = request.args.get("stream")
+        if fmt in ("ndjson", "json"):
+            return stream_query(instrument_encoder.query(), instrument_encoder, fmt)
+
+        all_data = instrument_encoder.query().all()
+        data = instrument_encoder.dump_many(all_data)
         return jsonify({"data": data, "total": len(data)})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -21,21 +48,48 @@ def list_instruments():
     
 # 测试路径示例：
 # http://127.0.0.1:5000/instrument/page?page=1&size=10
+# http://127.0.0.1:5000/instrument/page?size=10&cursor=
 @instrument_bp.route("/page", methods=["GET"])
+@cache.cached(version=instrument_version)
 def get_instruments_paginated():
     """
     分页获取仪器信息
     示例：
         GET /instrument/page?page=1&size=10
+    游标分页（按 id 升序，走主键范围扫描）：
+        GET /instrument/page?size=10&cursor=
+        GET /instrument/page?size=10&cursor=<上一页返回的 next_cursor>
+        追加 with_total=1 时额外返回 total（需要一次 COUNT）
     """
     try:
         page = int(request.args.get("page", 1))
         size = int(request.args.get("size", 10))
 
-        query = Instrument.query
+        query = instrument_encoder.query()
+
+        if "cursor" in request.args:
+            size = min(size, MAX_PAGE_SIZE)
+            try:
+                paged_data, next_cursor = keyset_page(
+                    query, [Instrument.id], request.args.get("cursor"), size
+                )
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            data = instrument_encoder.dump_many(paged_data)
+            result = {
+                "size": size,
+                "count": len(data),
+                "next_cursor": next_cursor,
+                "data": data
+            }
+            if request.args.get("with_total") == "1":
+                result["total"] = query.count()
+            return jsonify(result)
+
         total = query.count()
         paged_data = query.offset((page - 1) * size).limit(size).all()
-        data = instrument_schema.dump(paged_data)
+        data = instrument_encoder.dump_many(paged_data)
 
         return jsonify({
             "page": page,
@@ -48,4 +102,204 @@ def get_instruments_paginated():
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+
+# 测试路径示例：
+# http://127.0.0.1:5000/instrument/changes?since=2025-01-01T00:00:00
+@instrument_bp.route("/changes", methods=["GET"])
+def get_instrument_changes():
+    """
+    返回 since 之后新登记的仪器（按 created_at 升序）以及新的同步水位
+    since 可以是 ISO 时间（首次同步），也可以是上一次返回的 watermark；
+    has_more 为 true 时用新的 watermark 继续拉取
+    示例：
+        GET /instrument/changes?since=2025-01-01T00:00:00&limit=1000
+    """
+    try:
+        limit = min(int(request.args.get("limit", 1000)), 10000)
+        try:
+            rows, watermark, has_more = changes_page(
+                instrument_encoder.query(),
+                [Instrument.created_at, Instrument.id],
+                request.args.get("since", ""),
+                limit,
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        data = instrument_encoder.dump_many(rows)
+        return jsonify({
+            "count": len(data),
+            "has_more": has_more,
+            "watermark": watermark,
+            "data": data
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# 测试路径示例：
+# http://127.0.0.1:5000/instrument/clusters?zoom=5
+@instrument_bp.route("/clusters", methods=["GET"])
+@cache.cached(version=instrument_version)
+def get_instrument_clusters():
+    """
+    仪器地图点聚合：按缩放级别的网格在库内 GROUP BY，返回每格的仪器数和质心
+    每个级别的全图结果缓存到数据变化或超过 CACHE_DEFAULT_TTL 秒为止，bbox 只用于筛选
+    示例：
+        GET /instrument/clusters?zoom=5
+        GET /instrument/clusters?zoom=8&bbox=120,38,126,43
+    """
+    try:
+        try:
+            zoom = int(request.args.get("zoom", 5))
+        except ValueError:
+            return jsonify({"error": "zoom 参数格式错误"}), 400
+        try:
+            bbox = parse_bbox(request.args["bbox"]) if request.args.get("bbox") else None
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if not 0 <= zoom <= MAX_ZOOM:
+            return jsonify({"error": f"zoom 取值范围为 0~{MAX_ZOOM}"}), 400
+
+        dialect = db.engine.dialect.name
+        clusters = instrument_clusters.get(
+            zoom,
+            cache.version(instrument_version),
+            lambda: cluster_points(
+                db.session.query(Instrument), Instrument.lon, Instrument.lat, zoom, dialect
+            ),
+        )
+        clusters = clusters_in_bbox(clusters, bbox)
+
+        return jsonify({
+            "zoom": zoom,
+            "bbox": list(bbox) if bbox else None,
+            "count": len(clusters),
+            "total": sum(c["count"] for c in clusters),
+            "data": clusters
+        })
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+# ----------------------------
+# 仪器检索：多字段筛选 + 分面统计 + 游标分页
+# ----------------------------
+
+# 可筛选并返回分面统计的分类字段
+FACET_FIELDS = ["discipline", "region", "type", "status", "registerFlag", "dcunitCode"]
+
+# 可排序字段，均在模型中建有索引（flask create-indexes 补建）；空值升序时在前、倒序时在后
+SORT_FIELDS = ["id", "stationId", "instrcode", "region", "discipline", "startDate", "created_at"]
+
+
+def facet_filters() -> dict:
+    """读取分类筛选条件：同一字段可重复传参或用逗号分隔，多个取值之间为“或”"""
+    filters = {}
+    for field in FACET_FIELDS:
+        values = [v.strip() for raw in request.args.getlist(field) for v in raw.split(",") if v.strip()]
+        if not values:
+            continue
+        column = getattr(Instrument, field)
+        if column.type.python_type is int:
+            values = [int(v) for v in values]
+        filters[field] = column.in_(values)
+    return filters
+
+
+# 测试路径示例：
+# http://127.0.0.1:5000/instrument/search?discipline=测震&status=1&q=15&sort=-startDate&size=20&cursor=
+@instrument_bp.route("/search", methods=["GET"])
+@cache.cached(version=instrument_version)
+def search_instruments():
+    """
+    仪器检索，一次请求返回一页数据和各分类字段的分面计数
+    参数：
+        discipline / region / type / status / registerFlag / dcunitCode
+                    分类筛选，可多值（discipline=测震,强震 或重复传参）
+        q           在 stationId、instrcode 中模糊匹配
+        sort        排序字段，前缀 - 表示倒序，默认 id
+        size        每页条数，默认 20，最多 MAX_PAGE_SIZE
+        cursor      上一页返回的 next_cursor，首页不传或传空
+        with_total=1 时额外返回符合条件的总数
+    分面计数不包含该字段自身的筛选条件，前端可以直接展示“切换到其他取值后有多少条”
+    """
+    try:
+        try:
+            size = int(request.args.get("size", 20))
+        except ValueError:
+            return jsonify({"error": "size 参数必须为整数"}), 400
+        if size < 1:
+            return jsonify({"error": "size 必须为正整数"}), 400
+        size = min(size, MAX_PAGE_SIZE)
+        sort = request.args.get("sort", "id")
+        descending = sort.startswith("-")
+        sort_field = sort.lstrip("-")
+        if sort_field not in SORT_FIELDS:
+            return jsonify({"error": f"sort 只能是 {'、'.join(SORT_FIELDS)}"}), 400
+        try:
+            filters = facet_filters()
+        except ValueError:
+            return jsonify({"error": "status、registerFlag 参数必须为整数"}), 400
+
+        conditions = list(filters.values())
+        keyword = request.args.get("q", "").strip()
+        if keyword:
+            conditions.append(or_(
+                Instrument.stationId.contains(keyword, autoescape=True),
+                Instrument.instrcode.contains(keyword, autoescape=True),
+            ))
+
+        # Step 1: 当前页（排序列 + id 组成游标，直接比较原始列以走索引）
+        query = instrument_encoder.query().filter(*conditions)
+        try:
+            if sort_field == "id":
+                rows, next_cursor = keyset_page(
+                    query, [Instrument.id], request.args.get("cursor"), size, descending=descending
+                )
+            else:
+                rows, next_cursor = nullable_keyset_page(
+                    query, getattr(Instrument, sort_field), Instrument.id,
+                    request.args.get("cursor"), size, descending=descending
+                )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Step 2: 分面计数，每个字段排除自身的筛选条件
+        facets = {}
+        for field in FACET_FIELDS:
+            column = getattr(Instrument, field)
+            others = [c for f, c in filters.items() if f != field]
+            if keyword:
+                others.append(conditions[-1])
+            counts = (
+                db.session.query(column, func.count())
+                .filter(*others)
+                .group_by(column)
+                .order_by(func.count().desc())
+                .all()
+            )
+            facets[field] = [{"value": value, "count": count} for value, count in counts]
+
+        data = instrument_encoder.dump_many(rows)
+        result = {
+            "size": size,
+            "sort": sort,
+            "count": len(data),
+            "next_cursor": next_cursor,
+            "facets": facets,
+            "data": data
+        }
+        if request.args.get("with_total") == "1":
+            result["total"] = db.session.query(func.count(Instrument.id)).filter(*conditions).scalar()
+        return jsonify(result)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
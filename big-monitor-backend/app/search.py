@@ -0,0 +1,224 @@
+import heapq
+import threading
+import time
+from array import array
+from collections import defaultdict
+from itertools import islice
+
+NO_TIME = float("-inf")
+
+
+def ngrams(text: str) -> set:
+    """地名的一元和二元字符 n-gram；中文地名短，二元足以区分，一元支持单字查询"""
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def normalize(text: str) -> str:
+    return "".join(text.split())
+
+
+class PlaceNameIndex:
+    """
+    DiMing 地名模糊检索：字符 n-gram 倒排索引，全部在内存中
+        grams     n-gram -> 包含它的地名编号集合
+        postings  地名编号 -> 该地名下的地震 id（按发震时间倒序，array 紧凑存储）
+        name_of / time_of  按地震 id 下标的地名编号和发震时间戳，用于增量更新时定位旧记录
+    地名重复率很高，索引规模取决于不同地名的数量；每条地震只占约 24 字节
+    首次检索时全量构建（python run.py 启动时预先构建），之后沿用 /dzml_new/changes 的
+    同步水位增量更新新增或修改的记录；删除的记录在取数时自然被过滤掉
+
+    配置项：
+        SEARCH_REFRESH_INTERVAL  两次增量更新的最小间隔（秒）
+        SEARCH_MIN_SCORE         模糊匹配的最低得分（命中的查询二元组比例）
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.lock = threading.RLock()
+        self.reset()
+        if app is not None:
+            self.init_app(app)
+
+    def reset(self):
+        self.ready = False
+        self.watermark = ""
+        self.refreshed = 0.0
+        self.names = []
+        self.name_ids = {}
+        self.grams = defaultdict(set)
+        self.postings = []
+        self.name_of = array("l")
+        self.time_of = array("d")
+
+    def init_app(self, app):
+        app.config.setdefault("SEARCH_REFRESH_INTERVAL", 5)
+        app.config.setdefault("SEARCH_MIN_SCORE", 0.5)
+        self.app = app
+        app.extensions["place_name_index"] = self
+
+    # ---------- 构建与增量更新 ----------
+
+    def name_id(self, name: str) -> int:
+        nid = self.name_ids.get(name)
+        if nid is None:
+            nid = len(self.names)
+            self.names.append(name)
+            self.name_ids[name] = nid
+            self.postings.append(array("q"))
+            for gram in ngrams(normalize(name)):
+                self.grams[gram].add(nid)
+        return nid
+
+    def ensure_capacity(self, quake_id: int):
+        if quake_id >= len(self.name_of):
+            grow = quake_id + 1 - len(self.name_of)
+            self.name_of.extend([-1] * grow)
+            self.time_of.extend([NO_TIME] * grow)
+
+    def build(self):
+        """全量构建：按发震时间倒序流式读取 (id, DiMing, RiQi)，每个地名的 id 列表天然有序"""
+        from app import db
+        from app.models.dzml_new import DzmlNew
+        from app.rollups import current_watermark
+
+        with self.lock:
+            started = time.perf_counter()
+            self.reset()
+            # 先取水位再扫描：扫描期间写入的记录会在下一次增量更新时再处理一遍，处理是幂等的
+            self.watermark = current_watermark()
+            query = (
+                db.session.query(DzmlNew.id, DzmlNew.DiMing, DzmlNew.RiQi)
+                .filter(DzmlNew.DiMing.isnot(None))
+                .order_by(DzmlNew.RiQi.desc(), DzmlNew.id.desc())
+            )
+            for quake_id, diming, riqi in query.yield_per(10000):
+                nid = self.name_id(diming)
+                self.postings[nid].append(quake_id)
+                self.ensure_capacity(quake_id)
+                self.name_of[quake_id] = nid
+                self.time_of[quake_id] = riqi.timestamp() if riqi else NO_TIME
+            self.ready = True
+            self.refreshed = time.monotonic()
+            return time.perf_counter() - started
+
+    def refresh(self) -> int:
+        """拉取水位之后新增或修改的记录并更新索引，返回处理的记录数"""
+        from app import db
+        from app.models.dzml_new import DzmlNew
+        from app.routes.dzml_new_routes import CHANGES_COLUMNS
+        from app.utils import changes_page
+
+        with self.lock:
+            query = db.session.query(DzmlNew.DiMing, DzmlNew.RiQi, *CHANGES_COLUMNS)
+            changed = 0
+            while True:
+                rows, self.watermark, has_more = changes_page(query, CHANGES_COLUMNS, self.watermark, 5000)
+                for row in rows:
+                    self.update(row.id, row.DiMing, row.RiQi)
+                changed += len(rows)
+                if not has_more:
+                    break
+            self.refreshed = time.monotonic()
+            return changed
+
+    def update(self, quake_id: int, diming: str, riqi):
+        timestamp = riqi.timestamp() if riqi else NO_TIME
+        self.ensure_capacity(quake_id)
+        old = self.name_of[quake_id]
+        new = self.name_id(diming) if diming else -1
+        if old == new and self.time_of[quake_id] == timestamp:
+            return
+        if old >= 0:
+            self.postings[old].remove(quake_id)
+        self.name_of[quake_id] = new
+        self.time_of[quake_id] = timestamp
+        if new >= 0:
+            # 保持按发震时间倒序；新地震通常最新，插在最前面
+            ids = self.postings[new]
+            key = (-timestamp, -quake_id)
+            lo, hi = 0, len(ids)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if (-self.time_of[ids[mid]], -ids[mid]) < key:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            ids.insert(lo, quake_id)
+
+    def ensure_fresh(self):
+        if not self.ready:
+            self.build()
+        elif time.monotonic() - self.refreshed >= self.app.config["SEARCH_REFRESH_INTERVAL"]:
+            self.refresh()
+
+    # ---------- 检索 ----------
+
+    def match(self, query: str) -> list:
+        """
+        返回匹配的地名及排序键，按 (是否包含完整查询串, 命中二元组比例) 降序：
+        完整包含的地名排在最前，其余按命中比例模糊匹配，低于 SEARCH_MIN_SCORE 的丢弃
+        """
+        query = normalize(query)
+        if len(query) == 1:
+            return [(nid, (True, 1.0)) for nid in self.grams.get(query, ())]
+
+        grams = {query[i:i + 2] for i in range(len(query) - 1)}
+        hits = defaultdict(int)
+        for gram in grams:
+            for nid in self.grams.get(gram, ()):
+                hits[nid] += 1
+        min_score = self.app.config["SEARCH_MIN_SCORE"]
+        matches = []
+        for nid, count in hits.items():
+            score = count / len(grams)
+            if score >= min_score:
+                matches.append((nid, (query in normalize(self.names[nid]), round(score, 3))))
+        return matches
+
+    def search(self, query: str, offset: int, limit: int):
+        """
+        返回 (本页地震 id, 匹配总数, 匹配到的地名列表)
+        同一排序键的多个地名按发震时间归并，不同排序键之间按得分先后排列
+        """
+        with self.lock:
+            self.ensure_fresh()
+            matches = self.match(query)
+            groups = defaultdict(list)
+            for nid, rank in matches:
+                groups[rank].append(nid)
+
+            places = sorted(
+                (
+                    {"DiMing": self.names[nid], "exact": rank[0], "score": rank[1], "count": len(self.postings[nid])}
+                    for nid, rank in matches
+                ),
+                key=lambda p: (not p["exact"], -p["score"], -p["count"]),
+            )
+            total = sum(p["count"] for p in places)
+
+            ids = []
+            skip = offset
+            time_of = self.time_of
+            for rank in sorted(groups, reverse=True):
+                if len(ids) >= limit:
+                    break
+                lists = [self.postings[nid] for nid in groups[rank]]
+                size = sum(len(l) for l in lists)
+                if skip >= size:
+                    skip -= size
+                    continue
+                merged = heapq.merge(*lists, key=lambda i: (-time_of[i], -i))
+                page = list(islice(merged, skip, skip + limit - len(ids)))
+                skip = 0
+                ids.extend(page)
+            return ids, total, places
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "ready": self.ready,
+                "names": len(self.names),
+                "grams": len(self.grams),
+                "earthquakes": sum(len(p) for p in self.postings),
+                "watermark": self.watermark,
+            }
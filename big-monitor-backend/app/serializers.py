@@ -0,0 +1,72 @@
+from marshmallow import fields
+from sqlalchemy import select
+
+from app import db
+
+
+class RowEncoder:
+    """
+    按 marshmallow Schema 的字段定义预编译一个行编码函数
+    查询时只 SELECT 需要的列（返回元组，不构造 ORM 对象），
+    再用生成好的函数把元组直接转成字典，输出与 Schema.dump 完全一致
+    extra 为额外查询、但不输出的列（如游标分页用到的代理主键），排在 Schema 列之后
+    """
+
+    def __init__(self, model, schema_class, extra=()):
+        self.model = model
+        self.schema_fields = schema_class().fields
+        self.names = list(self.schema_fields.keys())
+        self.columns = [getattr(model, name) for name in self.names]
+        self.extra = list(extra)
+        self.dump = self._compile()
+
+    def _compile(self):
+        items = []
+        for index, (name, field) in enumerate(zip(self.names, self.field_types())):
+            value = f"row[{index}]"
+            if field is float:
+                value = f"(None if {value} is None else float({value}))"
+            elif field is int:
+                value = f"(None if {value} is None else int({value}))"
+            elif field is str:
+                value = f"(None if {value} is None else str({value}))"
+            elif field == "isoformat":
+                value = f"(None if {value} is None else {value}.isoformat())"
+            items.append(f"{name!r}: {value}")
+
+        source = "def dump(row):\n    return {" + ", ".join(items) + "}\n"
+        namespace = {}
+        exec(compile(source, f"<RowEncoder {self.model.__name__}>", "exec"), namespace)
+        return namespace["dump"]
+
+    def field_types(self):
+        """
+        每一列需要的转换：与 Schema 字段的 _serialize 行为对应，
+        数据库驱动已经返回目标类型的列（如 Integer -> int）不再转换，返回 None
+        """
+        result = []
+        for name, column in zip(self.names, self.columns):
+            field = self.schema_fields[name]
+            python_type = column.type.python_type
+            if isinstance(field, fields.DateTime):
+                result.append("isoformat")
+            elif isinstance(field, fields.Float):
+                result.append(None if python_type is float else float)
+            elif isinstance(field, fields.Integer):
+                result.append(None if python_type is int else int)
+            elif isinstance(field, fields.String):
+                result.append(None if python_type is str else str)
+            else:
+                raise TypeError(f"RowEncoder 不支持的字段类型：{name} {type(field).__name__}")
+        return result
+
+    def query(self):
+        """只查询 Schema 中出现的列（以及 extra 列），返回元组"""
+        return db.session.query(*self.columns, *self.extra)
+
+    def select(self):
+        """与 query() 相同列的 select() 语句，供 ASGI 模式用异步连接执行"""
+        return select(*self.columns, *self.extra)
+
+    def dump_many(self, rows) -> list:
+        return list(map(self.dump, rows))
@@ -0,0 +1,455 @@
+import base64
+import json
+import math
+import threading
+import time
+from datetime import datetime
+
+from flask import Response, current_app, stream_with_context
+from sqlalchemy import Integer, cast, func, tuple_
+
+# ----------------------------
+# 省份字典和地名解析（路由、入库与回填命令共用）
+# ----------------------------
+
+UNKNOWN_PROVINCE = "未知"
+
+PROVINCE_CAPITALS = {
+    "北京": [116.4074, 39.9042],
+    "天津": [117.2000, 39.1333],
+    "上海": [121.4737, 31.2304],
+    "重庆": [106.5516, 29.5630],
+    "四川": [104.0668, 30.5728],
+    "广东": [113.2644, 23.1291],
+    "新疆": [87.6168, 43.8256],
+    "云南": [102.8332, 24.8801],
+    "西藏": [91.1175, 29.6473],
+    "陕西": [108.9402, 34.3416],
+    "甘肃": [103.8343, 36.0611],
+    "青海": [101.7778, 36.6173],
+    "宁夏": [106.2325, 38.4864],
+    "内蒙古": [111.7656, 40.8174],
+    "广西": [108.3275, 22.8150],
+    "贵州": [106.7074, 26.5982],
+    "湖南": [112.9389, 28.2278],
+    "湖北": [114.3054, 30.5931],
+    "河南": [113.6654, 34.7570],
+    "山东": [117.1201, 36.6512],
+    "山西": [112.5624, 37.8735],
+    "河北": [114.5149, 38.0428],
+    "安徽": [117.2830, 31.8612],
+    "江苏": [118.7969, 32.0603],
+    "浙江": [120.1551, 30.2741],
+    "福建": [119.2965, 26.0745],
+    "江西": [115.9100, 28.6742],
+    "辽宁": [123.4291, 41.7968],
+    "吉林": [125.3245, 43.8868],
+    "黑龙江": [126.6425, 45.7560],
+    "海南": [110.3486, 20.0186],
+    "香港": [114.1694, 22.3193],
+    "澳门": [113.5491, 22.1987],
+    "台湾": [121.5091, 25.0443],
+}
+
+
+def extract_province(diming: str) -> str:
+    """根据地名字符串解析出所属省份"""
+    if not diming:
+        return UNKNOWN_PROVINCE
+    for province in PROVINCE_CAPITALS.keys():
+        if province in diming:
+            return province
+    return UNKNOWN_PROVINCE
+
+
+def match_provinces(province_name: str) -> list:
+    """
+    把查询参数中的省份名称展开为 province 列的候选取值
+    规则与原先逐行匹配一致：去掉“省”“市”后，只要是解析结果的子串即视为命中，
+    例如 name=蒙古 命中“内蒙古”。返回列表用于 WHERE province IN (...)
+    """
+    key = province_name.replace("省", "").replace("市", "")
+    candidates = list(PROVINCE_CAPITALS.keys()) + [UNKNOWN_PROVINCE]
+    return [p for p in candidates if key in p]
+
+
+# ----------------------------
+# 震级区间（统计接口与预聚合表共用）
+# ----------------------------
+
+# 与前端一致的震级区间：0~1, 1~2, ..., 6~7, 7+
+MAGNITUDE_BINS = [0, 1, 2, 3, 4, 5, 6, 7]
+
+
+def magnitude_band(mc) -> int:
+    """震级所在区间的下限，负震级（及缺失）归为 -1"""
+    if mc is None:
+        return -1
+    for low in reversed(MAGNITUDE_BINS):
+        if mc >= low:
+            return low
+    return -1
+
+
+# ----------------------------
+# 游标分页（keyset pagination）
+# ----------------------------
+
+
+def encode_cursor(values: list) -> str:
+    """把排序键的取值编码为不透明的游标字符串"""
+    raw = json.dumps(
+        [
+            v.isoformat() if isinstance(v, datetime) else v if v is None or isinstance(v, int) else str(v)
+            for v in values
+        ],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: list) -> list:
+    """按排序列的类型还原游标中的取值，格式不合法时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise ValueError("cursor 参数无效")
+    if not isinstance(raw, list) or len(raw) != len(columns):
+        raise ValueError("cursor 参数无效")
+
+    values = []
+    for column, value in zip(columns, raw):
+        if value is None:
+            values.append(None)
+            continue
+        python_type = column.type.python_type
+        try:
+            if python_type is datetime:
+                values.append(datetime.fromisoformat(value))
+            else:
+                values.append(python_type(value))
+        except Exception:
+            raise ValueError("cursor 参数无效")
+    return values
+
+
+# 游标分页每页的最大条数（超出时按上限返回，与 /search 的处理方式一致）
+MAX_PAGE_SIZE = 1000
+
+
+def keyset_query(query, columns: list, cursor: str, size: int, descending: bool = False):
+    """
+    为查询加上游标条件、排序和行数限制（多取一行用来判断是否还有下一页）
+    query 可以是 ORM Query，也可以是 select() 语句（ASGI 模式用异步连接执行）
+    size 小于 1 时抛出 ValueError
+    """
+    if size < 1:
+        raise ValueError("size 必须为正整数")
+    if cursor:
+        # 绑定参数需带上列类型，否则日期等值不会按列的方式转换（如 SQLite 的日期字符串格式）
+        values = tuple_(*decode_cursor(cursor, columns), types=[c.type for c in columns])
+        if descending:
+            query = query.filter(tuple_(*columns) < values)
+        else:
+            query = query.filter(tuple_(*columns) > values)
+
+    order = [c.desc() if descending else c.asc() for c in columns]
+    return query.order_by(*order).limit(size + 1)
+
+
+def keyset_result(rows: list, columns: list, size: int):
+    """截掉多取的一行，返回 (本页数据, 下一页游标)"""
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor([getattr(rows[-1], c.key) for c in columns])
+    return rows, next_cursor
+
+
+def keyset_page(query, columns: list, cursor: str, size: int, descending: bool = False):
+    """
+    按 columns 的组合顺序做游标分页：每页只是一次索引范围扫描，不再 OFFSET 跳过前面的行
+    返回 (本页数据, 下一页游标)，没有下一页时游标为 None
+    """
+    rows = keyset_query(query, columns, cursor, size, descending).all()
+    return keyset_result(rows, columns, size)
+
+
+def nullable_keyset_page(query, column, tiebreaker, cursor: str, size: int, descending: bool = False):
+    """
+    按可为空的 column 排序、tiebreaker（唯一列，如主键）定序的游标分页，返回 (本页数据, 下一页游标)
+    直接比较原始列，可以走 column 上的索引（COALESCE 之类的表达式用不上索引，每页都要全表扫描再排序）；
+    空值组排在升序的最前、倒序的最后（与 MySQL / SQLite 的默认位置一致），
+    空值组和非空值组分别查询，各自只是一段有序的索引范围扫描，前一段不够一页时再查下一段
+    """
+    if size < 1:
+        raise ValueError("size 必须为正整数")
+    columns = [column, tiebreaker]
+    nulls = query.filter(column.is_(None))
+    values = query.filter(column.isnot(None))
+    if cursor:
+        value, last = decode_cursor(cursor, columns)
+        if value is None:
+            # 上一页停在空值组内：升序时取完空值组再接全部非空值，倒序时只剩空值组
+            nulls = nulls.filter(tiebreaker < last if descending else tiebreaker > last)
+            values = None if descending else values
+        else:
+            bound = tuple_(value, last, types=[c.type for c in columns])
+            values = values.filter(tuple_(*columns) < bound if descending else tuple_(*columns) > bound)
+            nulls = nulls if descending else None
+
+    segments = [
+        (values, [c.desc() if descending else c.asc() for c in columns]),
+        (nulls, [tiebreaker.desc() if descending else tiebreaker.asc()]),
+    ]
+    if not descending:
+        segments.reverse()
+
+    rows = []
+    for segment, order in segments:
+        if segment is None:
+            continue
+        rows += segment.order_by(*order).limit(size + 1 - len(rows)).all()
+        if len(rows) > size:
+            break
+    return keyset_result(rows, columns, size)
+
+
+def changes_query(query, columns: list, since: str, limit: int):
+    """
+    增量同步的查询：取排序键位于 since 之后的记录，columns 第一列为更新时间
+    since 为 ISO 时间时按“更新时间 > since”起步，否则视为上一次返回的水位游标
+    返回 (查询, 没有新数据时沿用的水位)
+    """
+    query = query.filter(columns[0].isnot(None))
+    watermark = since or None
+    try:
+        start = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        start = None
+    if start is not None:
+        query = query.filter(columns[0] > start)
+        since = None
+    return keyset_query(query, columns, since, limit), watermark
+
+
+def changes_result(rows: list, columns: list, watermark: str, limit: int):
+    rows, next_cursor = keyset_result(rows, columns, limit)
+    if rows:
+        watermark = encode_cursor([getattr(rows[-1], c.key) for c in columns])
+    return rows, watermark, next_cursor is not None
+
+
+def changes_page(query, columns: list, since: str, limit: int):
+    """
+    增量同步：返回 (本批数据, 新水位, 是否还有更多)；没有新数据时水位保持不变
+    """
+    query, watermark = changes_query(query, columns, since, limit)
+    return changes_result(query.all(), columns, watermark, limit)
+
+
+# ----------------------------
+# 流式输出（NDJSON / 分块 JSON）
+# ----------------------------
+
+STREAM_BATCH_SIZE = 1000
+
+
+def stream_query(query, schema, fmt: str = "ndjson", batch_size: int = STREAM_BATCH_SIZE) -> Response:
+    """
+    用服务端游标（yield_per）逐批读取并逐批输出，内存占用与表大小无关
+    schema 只需提供单行的 dump 方法（marshmallow Schema 或 RowEncoder 均可）
+    fmt=ndjson：每行一个 JSON 对象
+    fmt=json：  与 jsonify 相同的 {"data": [...], "total": N} 结构，边读边写
+    """
+    dumps = current_app.json.dumps
+
+    def generate_ndjson():
+        chunk = []
+        for record in query.yield_per(batch_size):
+            chunk.append(dumps(schema.dump(record)))
+            if len(chunk) >= batch_size:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+    def generate_json():
+        yield '{"data":['
+        total = 0
+        chunk = []
+        for record in query.yield_per(batch_size):
+            chunk.append(dumps(schema.dump(record)))
+            if len(chunk) >= batch_size:
+                yield ("," if total else "") + ",".join(chunk)
+                total += len(chunk)
+                chunk = []
+        if chunk:
+            yield ("," if total else "") + ",".join(chunk)
+            total += len(chunk)
+        yield '],"total":%d}' % total
+
+    if fmt == "ndjson":
+        return Response(stream_with_context(generate_ndjson()), mimetype="application/x-ndjson")
+    return Response(stream_with_context(generate_json()), mimetype="application/json")
+
+
+# ----------------------------
+# 空间网格索引与距离计算
+# ----------------------------
+
+# 经纬度按 0.5° 划分网格，网格编号 = 纬度行号 * 每行列数 + 经度列号
+GRID_SIZE_DEG = 0.5
+GRID_COLUMNS = int(360 / GRID_SIZE_DEG)
+EARTH_RADIUS_KM = 6371.0088
+
+
+def grid_cell(lon, lat):
+    """计算经纬度所在的网格编号，坐标缺失时返回 None"""
+    if lon is None or lat is None:
+        return None
+    row = min(int((float(lat) + 90) / GRID_SIZE_DEG), int(180 / GRID_SIZE_DEG) - 1)
+    col = min(int((float(lon) + 180) / GRID_SIZE_DEG), GRID_COLUMNS - 1)
+    return row * GRID_COLUMNS + col
+
+
+def parse_bbox(value: str):
+    """解析 bbox=最小经度,最小纬度,最大经度,最大纬度，格式错误时抛出 ValueError"""
+    try:
+        parts = [float(v) for v in value.split(",")]
+    except ValueError:
+        parts = []
+    if len(parts) != 4:
+        raise ValueError("bbox 参数格式应为 最小经度,最小纬度,最大经度,最大纬度")
+    min_lon, min_lat, max_lon, max_lat = parts
+    if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError("bbox 参数超出经纬度范围或最小值大于最大值")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def grid_ranges(min_lon, min_lat, max_lon, max_lat) -> list:
+    """
+    把矩形范围转换为网格编号区间列表，每个纬度行一段连续区间，
+    用于 WHERE grid_cell BETWEEN ... OR ...，每段都是一次 B-tree 范围扫描
+    """
+    first, last = grid_cell(min_lon, min_lat), grid_cell(max_lon, max_lat)
+    first_row, first_col = divmod(first, GRID_COLUMNS)
+    last_row, last_col = divmod(last, GRID_COLUMNS)
+    return [
+        (row * GRID_COLUMNS + first_col, row * GRID_COLUMNS + last_col)
+        for row in range(first_row, last_row + 1)
+    ]
+
+
+def haversine_km(lon1, lat1, lon2, lat2) -> float:
+    """两点间的大圆距离（公里）"""
+    lon1, lat1, lon2, lat2 = map(math.radians, (lon1, lat1, lon2, lat2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def radius_bbox(lon, lat, km):
+    """包含以 (lon, lat) 为圆心、km 为半径的圆的经纬度矩形"""
+    dlat = math.degrees(km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(lat))
+    dlon = 180.0 if cos_lat < 1e-6 else min(math.degrees(km / EARTH_RADIUS_KM / cos_lat), 180.0)
+    return (
+        max(lon - dlon, -180.0),
+        max(lat - dlat, -90.0),
+        min(lon + dlon, 180.0),
+        min(lat + dlat, 90.0),
+    )
+
+
+def sql_floor(expression, dialect_name: str):
+    """
+    非负数值表达式的向下取整：SQLite 的 CAST 截断即向下取整，
+    MySQL 的 CAST 会四舍五入，需用 FLOOR
+    """
+    if dialect_name == "sqlite":
+        return cast(expression, Integer)
+    return func.floor(expression)
+
+
+# ----------------------------
+# 地图点聚合
+# ----------------------------
+
+# 每个 256px 瓦片切成 4×4 个聚合格，约 64px 一格
+CLUSTER_CELLS_PER_TILE = 4
+# 不超过该级别时按全图聚合并按级别缓存，更高级别只聚合可视范围
+CLUSTER_CACHE_MAX_ZOOM = 10
+MAX_ZOOM = 20
+
+
+def cluster_cell_size(zoom: int) -> float:
+    """某缩放级别下聚合格的边长（度）"""
+    return 360.0 / (2 ** zoom) / CLUSTER_CELLS_PER_TILE
+
+
+class ClusterCache:
+    """
+    按 (数据集, 缩放级别) 缓存全图聚合结果，数据版本变化或超过 CACHE_DEFAULT_TTL 秒后重新计算
+    数据版本只反映新增和删除，原地更新（如仪器移位）靠过期兜底，时效与接口结果缓存一致
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, version, compute):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry[0] == version and entry[1] > now:
+            return entry[2]
+        # 聚合查询在锁外执行，并发的重复计算只是多算一次
+        clusters = compute()
+        with self.lock:
+            self.entries[key] = (version, now + current_app.config["CACHE_DEFAULT_TTL"], clusters)
+        return clusters
+
+
+def cluster_points(query, lon_column, lat_column, zoom: int, dialect_name: str, extra: dict = None):
+    """
+    在库内按网格 GROUP BY 聚合点：返回每格的点数、质心，以及 extra（名称 -> 聚合表达式）中的列
+    query 为 db.session.query，本函数负责补上 SELECT 列与分组
+    """
+    extra = extra or {}
+    size = cluster_cell_size(zoom)
+    gx = sql_floor((lon_column + 180) / size, dialect_name)
+    gy = sql_floor((lat_column + 90) / size, dialect_name)
+    rows = (
+        query.with_entities(
+            gx, gy, func.count(), func.avg(lon_column), func.avg(lat_column), *extra.values()
+        )
+        .filter(lon_column.isnot(None), lat_column.isnot(None))
+        .group_by(gx, gy)
+        .all()
+    )
+    clusters = []
+    for row in rows:
+        cluster = {
+            "count": row[2],
+            "lon": round(float(row[3]), 5),
+            "lat": round(float(row[4]), 5),
+        }
+        for name, value in zip(extra, row[5:]):
+            cluster[name] = float(value) if value is not None else None
+        clusters.append(cluster)
+    return clusters
+
+
+def clusters_in_bbox(clusters: list, bbox) -> list:
+    """按质心筛选落在可视范围内的聚合点"""
+    if bbox is None:
+        return clusters
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return [
+        c for c in clusters
+        if min_lon <= c["lon"] <= max_lon and min_lat <= c["lat"] <= max_lat
+    ]
@@ -0,0 +1,5 @@
+from app.asgi import create_asgi_app
+
+# ASGI 服务模式（需安装 uvicorn 和异步数据库驱动）：
+#     uvicorn asgi:app --host 0.0.0.0 --port 5000 --workers 4
+app = create_asgi_app()
@@ -0,0 +1,65 @@
+"""
+省界 / 市界空间连接基准测试：随机点批量定位省、市，统计吞吐量，
+并抽样与逐点逐多边形的朴素射线法对比结果
+
+运行方式（在 big-monitor-backend 目录下）：
+    python -m benchmarks.bench_regions --points 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.boundaries import RegionAssigner
+from app.config import Config
+
+
+def naive_locate(index, x, y) -> int:
+    """逐个多边形、逐条边的射线法，作为正确性参照"""
+    for i, (x1, y1, x2, y2) in enumerate(index.edges):
+        inside = False
+        for a, b, c, d in zip(x1, y1, x2, y2):
+            if (b > y) != (d > y) and x < a + (y - b) * (c - a) / (d - b):
+                inside = not inside
+        if inside:
+            return i
+    return -1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="省界 / 市界空间连接基准测试")
+    parser.add_argument("--points", type=int, default=1_000_000)
+    parser.add_argument("--check", type=int, default=200, help="抽样与朴素实现对比的点数")
+    parser.add_argument("--data-dir", default=Config.BOUNDARY_DATA_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    assigner = RegionAssigner(args.data_dir)
+    print(f"加载边界：{time.perf_counter() - start:.2f}s，"
+          f"{len(assigner.provinces.codes)} 个省级、{len(assigner.cities.codes)} 个市级多边形")
+
+    rng = np.random.default_rng(2025)
+    scenarios = {
+        # 全国范围均匀分布（含大量海域、境外点）
+        "uniform": (rng.uniform(73, 135, args.points), rng.uniform(18, 54, args.points)),
+        # 集中在四川盆地，模拟单个活跃区的目录
+        "clustered": (104.07 + rng.normal(0, 2, args.points), 30.57 + rng.normal(0, 1.5, args.points)),
+    }
+    for name, (lon, lat) in scenarios.items():
+        start = time.perf_counter()
+        province_codes, city_codes = assigner.assign(lon, lat)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<10} {elapsed:6.2f}s  {args.points / elapsed:12,.0f} points/s  "
+              f"在省界内 {np.mean(province_codes > 0):.1%}  在市界内 {np.mean(city_codes > 0):.1%}")
+
+        sample = rng.choice(args.points, size=min(args.check, args.points), replace=False)
+        mismatches = 0
+        for i in sample:
+            expected = naive_locate(assigner.cities, lon[i], lat[i])
+            code = assigner.cities.codes[expected] if expected >= 0 else -1
+            mismatches += code != city_codes[i]
+        print(f"{'':<10} 抽样 {sample.size} 点与朴素实现不一致：{mismatches}")
+
+
+if __name__ == "__main__":
+    main()
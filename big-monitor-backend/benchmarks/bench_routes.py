@@ -0,0 +1,190 @@
+"""
+big-monitor-backend 路由基准测试：用合成数据的 SQLite 库代替 MySQL，
+通过 Flask test client 逐个请求各路由，统计延迟分位数、每秒行数、SQL 语句数和内存峰值
+
+运行方式（在 big-monitor-backend 目录下）：
+    python -m benchmarks.bench_routes --rows 10000 --rows 100000
+    python -m benchmarks.bench_routes --rows 100000 --output result.json
+    python -m benchmarks.bench_routes --rows 100000 --baseline result.json --max-regression 1.2
+
+造好的库保存在 bench_<行数>.sqlite3，再次运行时直接复用
+与 --baseline 对比时，任一路由 p50 超过基线的 max-regression 倍则以非零状态退出，可用于 CI 卡点
+"""
+import argparse
+import json
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+from sqlalchemy import event
+
+from benchmarks.seed import sqlite_app
+
+# 压测的路由：名称 -> URL，覆盖全部对外接口和各自的分页 / 流式模式
+ROUTES = {
+    "dzml_new.all": "/dzml_new/all",
+    "dzml_new.all.ndjson": "/dzml_new/all?stream=ndjson",
+    "dzml_new.province": "/dzml_new/province?name=四川",
+    "dzml_new.province.page": "/dzml_new/province/page?name=四川&page=20&size=20",
+    "dzml_new.province.cursor": "/dzml_new/province/page?name=四川&size=20&cursor=",
+    "dzml_new.stats": "/dzml_new/stats?name=四川&start=2024-12-01T00:00:00&end=2025-01-01T00:00:00",
+    "dzml_new.rollups": "/dzml_new/rollups?granularity=month&name=四川&start=2015-01-01T00:00:00&end=2025-01-01T00:00:00",
+    "dzml_new.seismicity": "/dzml_new/seismicity-stats?province=四川&start=2015-01-01T00:00:00&end=2025-01-01T00:00:00",
+    "dzml_new.search": "/dzml_new/search?q=汶川&page=2&size=20",
+    "dzml_new.bbox": "/dzml_new/bbox?bbox=102,29,106,32",
+    "dzml_new.near": "/dzml_new/near?lon=104.07&lat=30.57&km=100",
+    "dzml_new.clusters": "/dzml_new/clusters?zoom=5",
+    "dzml_new.changes": "/dzml_new/changes?since=2024-12-01T00:00:00&limit=1000",
+    "instrument.all": "/instrument/all",
+    "instrument.page": "/instrument/page?page=50&size=20",
+    "instrument.cursor": "/instrument/page?size=20&cursor=",
+    "instrument.search": "/instrument/search?discipline=测震,强震&status=1&sort=-startDate&size=20&cursor=",
+    "instrument.clusters": "/instrument/clusters?zoom=5",
+    "instrument.changes": "/instrument/changes?since=2024-01-01T00:00:00&limit=1000",
+}
+
+
+class StatementCounter:
+    """通过 SQLAlchemy 引擎事件统计执行的 SQL 语句数"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def count_rows(response) -> int:
+    """从响应中取返回的行数：JSON 取 data 长度（统计接口取参与统计的 total），NDJSON 取行数"""
+    if response.mimetype == "application/x-ndjson":
+        return response.data.count(b"\n")
+    body = response.get_json(silent=True) or {}
+    data = body.get("data")
+    return len(data) if isinstance(data, list) else body.get("total", 0)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(int(round(q / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def bench_route(client, counter, url, repeat, max_seconds):
+    """重复请求同一路由，至少一次，累计耗时超过 max_seconds 后提前结束"""
+    latencies = []
+    statements = []
+    rows = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        before = counter.count
+        start = time.perf_counter()
+        response = client.get(url)
+        body = response.data  # 流式响应在这里才真正执行完
+        latencies.append(time.perf_counter() - start)
+        statements.append(counter.count - before)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} 返回 {response.status_code}：{body[:200]!r}")
+        rows = count_rows(response)
+        if time.perf_counter() - started > max_seconds:
+            break
+
+    # 单独再请求一次统计 Python 内存分配峰值，避免 tracemalloc 拖慢计时
+    tracemalloc.start()
+    client.get(url).data
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50 = statistics.median(latencies)
+    return {
+        "requests": len(latencies),
+        "rows": rows,
+        "bytes": len(body),
+        "p50_ms": round(p50 * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "rows_per_s": round(rows / p50) if p50 else 0,
+        "sql_statements": max(statements),
+        "peak_alloc_mb": round(peak / 1e6, 1),
+    }
+
+
+def run_size(rows, instruments, args):
+    app, db = sqlite_app(
+        f"bench_{rows}.sqlite3",
+        rows,
+        instruments,
+        config={"CACHE_BACKEND": "memory" if args.cache else "none"},
+    )
+    client = app.test_client()
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+
+    results = {}
+    for name, url in ROUTES.items():
+        if args.route and name not in args.route:
+            continue
+        results[name] = bench_route(client, counter, url, args.repeat, args.max_seconds)
+        r = results[name]
+        print(
+            f"{name:<26} {r['p50_ms']:>10.2f} {r['p90_ms']:>10.2f} {r['p99_ms']:>10.2f} "
+            f"{r['rows']:>8} {r['rows_per_s']:>12,} {r['sql_statements']:>5} {r['peak_alloc_mb']:>9.1f}"
+        )
+    return results
+
+
+def compare(results, baseline, max_regression) -> list:
+    """返回 p50 超出基线 max_regression 倍的路由"""
+    failures = []
+    for size, routes in results.items():
+        for name, result in routes.items():
+            base = baseline.get(size, {}).get(name)
+            if base and result["p50_ms"] > base["p50_ms"] * max_regression:
+                failures.append(f"{size} {name}: p50 {result['p50_ms']} ms，基线 {base['p50_ms']} ms")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="big-monitor-backend 路由基准测试")
+    parser.add_argument("--rows", type=int, action="append", help="dzml_new 行数，可重复指定，默认 10000")
+    parser.add_argument("--instruments", type=int, default=5000, help="instrument 行数")
+    parser.add_argument("--repeat", type=int, default=20, help="每个路由最多请求次数")
+    parser.add_argument("--max-seconds", type=float, default=10, help="每个路由最长压测时间")
+    parser.add_argument("--route", action="append", help="只测指定路由，可重复指定")
+    parser.add_argument("--cache", action="store_true", help="开启接口结果缓存（默认关闭，测的是冷路径）")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与之前 --output 的结果对比")
+    parser.add_argument("--max-regression", type=float, default=1.2)
+    args = parser.parse_args()
+
+    results = {}
+    for rows in args.rows or [10000]:
+        print(f"\n== dzml_new {rows:,} 行，instrument {args.instruments:,} 行 ==")
+        print(
+            f"{'route':<26} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} "
+            f"{'rows':>8} {'rows/s':>12} {'sql':>5} {'alloc MB':>9}"
+        )
+        results[str(rows)] = run_size(rows, args.instruments, args)
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\n进程 RSS 峰值：{peak_rss:.1f} MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures = compare(results, json.load(f), args.max_regression)
+        if failures:
+            print("\n性能回退：")
+            for failure in failures:
+                print("  " + failure)
+            sys.exit(1)
+        print("\n未发现性能回退")
+
+
+if __name__ == "__main__":
+    main()
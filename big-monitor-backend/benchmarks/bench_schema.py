@@ -0,0 +1,202 @@
+"""
+dzml_new 代理主键迁移前后对比：同一份合成数据分别保存为迁移前（10 列联合主键）
+和迁移后（自增 id + 唯一约束 + 覆盖索引）两个 SQLite 库，
+对热点查询输出 EXPLAIN QUERY PLAN 和耗时，以及各索引占用的空间
+
+运行方式（在 big-monitor-backend 目录下）：
+    python -m benchmarks.bench_schema --rows 100000
+    python -m benchmarks.bench_schema --rows 1000000 --output schema.json
+
+迁移前的库由 app.migrations.downgrade_surrogate_key 从造好的库回退得到，
+再对它执行一次 upgrade_surrogate_key 检查往返迁移后行数不变
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import sqlite
+
+from app.models.dzml_new import province_filter
+from benchmarks.seed import sqlite_app
+
+# 游标分页 / 同步水位中 RiQi、UpgradeTime 之后的排序键
+TIE_BREAKERS = {
+    "legacy": ["year", "month", "day", "hour", "min", "sec", "lon", "lat", "depth", "mc"],
+    "surrogate": ["id"],
+}
+
+SELECT = (
+    "year, month, day, hour, min, sec, lon, lat, depth, mc, JingDu, WeiDu, DiMing, ZhenJiZhi, "
+    "ShenDu, RiQi, years, ZhenJiLeiXing, mag1, DiZhenLeiXing, WeiHao, tag, Notes, OldId, UpgradeTime"
+)
+
+# 按省份过滤的条件取自路由共用的 province_filter，编译为字面量 SQL，与路由实际执行的条件一致
+PROVINCE_CONDITION = str(
+    province_filter("四川").compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+)
+
+# 热点查询：{tie} 为排序键，{cursor} 为 (RiQi, 排序键) 元组比较，{province} 为 PROVINCE_CONDITION；
+# 与各路由生成的 SQL 同形
+QUERIES = {
+    "time.page": "SELECT {select} FROM dzml_new ORDER BY RiQi DESC, {tie_desc} LIMIT 20",
+    "time.cursor": (
+        "SELECT {select} FROM dzml_new WHERE {cursor} ORDER BY RiQi DESC, {tie_desc} LIMIT 20"
+    ),
+    "province.page": (
+        "SELECT {select} FROM dzml_new WHERE {province} "
+        "ORDER BY RiQi DESC, {tie_desc} LIMIT 20"
+    ),
+    "province.cursor": (
+        "SELECT {select} FROM dzml_new WHERE ({province}) AND {cursor} "
+        "ORDER BY RiQi DESC, {tie_desc} LIMIT 20"
+    ),
+    "magnitude.page": (
+        "SELECT {select} FROM dzml_new WHERE mc >= 5 ORDER BY RiQi DESC, {tie_desc} LIMIT 50"
+    ),
+    "stats.window": (
+        "SELECT COUNT(*), MAX(mc), AVG(mc) FROM dzml_new "
+        "WHERE RiQi >= '2024-12-01 00:00:00.000000' AND RiQi < '2025-01-01 00:00:00.000000'"
+    ),
+    "natural_key.lookup": "SELECT {select} FROM dzml_new WHERE {natural_key}",
+    "changes": (
+        "SELECT {select} FROM dzml_new WHERE UpgradeTime > '2024-12-01 00:00:00.000000' "
+        "ORDER BY UpgradeTime, {tie_asc} LIMIT 1000"
+    ),
+}
+
+
+def prepare(rows):
+    """造数并得到迁移前 / 迁移后两个库，返回 {名称: engine}"""
+    from app.migrations import downgrade_surrogate_key, upgrade_surrogate_key
+
+    after_path = f"bench_{rows}.sqlite3"
+    before_path = f"bench_{rows}_legacy.sqlite3"
+    roundtrip_path = f"bench_{rows}_roundtrip.sqlite3"
+    app, db = sqlite_app(after_path, rows)
+    with app.app_context():
+        db.engine.dispose()
+
+    shutil.copyfile(after_path, before_path)
+    before = create_engine("sqlite:///" + os.path.abspath(before_path))
+    elapsed = downgrade_surrogate_key(before)
+    print(f"回退到联合主键：{elapsed:.2f}s")
+
+    # 往返检查：迁移前的库再升级一次，行数应保持不变
+    shutil.copyfile(before_path, roundtrip_path)
+    roundtrip = create_engine("sqlite:///" + os.path.abspath(roundtrip_path))
+    elapsed = upgrade_surrogate_key(roundtrip)
+    counts = [count_rows(e) for e in (before, roundtrip)]
+    print(f"升级到代理主键：{elapsed:.2f}s，行数 {counts[0]:,} -> {counts[1]:,}")
+    if counts[0] != counts[1] or counts[0] != rows:
+        raise RuntimeError(f"迁移前后行数不一致：{counts}")
+    roundtrip.dispose()
+    os.remove(roundtrip_path)
+
+    after = create_engine("sqlite:///" + os.path.abspath(after_path))
+    return {"legacy": before, "surrogate": after}
+
+
+def count_rows(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM dzml_new")).scalar()
+
+
+def render(sql, conn, schema):
+    """按表结构填充排序键，并从库里取一行作为游标 / 自然键查找的参数"""
+    tie = TIE_BREAKERS[schema]
+    # 取第 1000 行作为“翻到后面某页”的游标位置
+    cursor_row = conn.execute(text(
+        f"SELECT RiQi, {', '.join(tie)} FROM dzml_new ORDER BY RiQi DESC, "
+        f"{', '.join(c + ' DESC' for c in tie)} LIMIT 1 OFFSET 1000"
+    )).one()
+    natural = conn.execute(text(
+        f"SELECT {', '.join(TIE_BREAKERS['legacy'])} FROM dzml_new LIMIT 1 OFFSET 1000"
+    )).one()
+
+    params = {f"c{i}": value for i, value in enumerate(cursor_row)}
+    params.update({f"n_{name}": value for name, value in zip(TIE_BREAKERS["legacy"], natural)})
+    statement = sql.format(
+        select=SELECT,
+        province=PROVINCE_CONDITION,
+        tie_desc=", ".join(c + " DESC" for c in tie),
+        tie_asc=", ".join(tie),
+        cursor=f"(RiQi, {', '.join(tie)}) < ({', '.join(':' + k for k in params if k[0] == 'c')})",
+        natural_key=" AND ".join(f"{name} = :n_{name}" for name in TIE_BREAKERS["legacy"]),
+    )
+    return text(statement), params
+
+
+def explain(conn, statement, params) -> list:
+    plan = conn.execute(text("EXPLAIN QUERY PLAN " + statement.text), params).all()
+    return [row[-1] for row in plan]
+
+
+def time_query(conn, statement, params, repeat) -> float:
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(statement, params).all()
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies) * 1000
+
+
+def index_sizes(conn) -> dict:
+    """各表 / 索引占用的字节数，需要编译了 dbstat 的 SQLite，否则只返回文件大小"""
+    try:
+        rows = conn.execute(text(
+            "SELECT name, SUM(pgsize) FROM dbstat WHERE name LIKE '%dzml_new%' GROUP BY name"
+        )).all()
+        return {name: size for name, size in rows}
+    except Exception:
+        path = conn.engine.url.database
+        return {"(file)": os.path.getsize(path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dzml_new 代理主键迁移前后的查询计划和耗时对比")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=50, help="每条查询执行次数，取中位数")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    engines = prepare(args.rows)
+    report = {"rows": args.rows, "queries": {}, "storage": {}}
+
+    for schema, engine in engines.items():
+        with engine.connect() as conn:
+            report["storage"][schema] = index_sizes(conn)
+            for name, sql in QUERIES.items():
+                statement, params = render(sql, conn, schema)
+                entry = report["queries"].setdefault(name, {})
+                entry[schema] = {
+                    "plan": explain(conn, statement, params),
+                    "ms": round(time_query(conn, statement, params, args.repeat), 3),
+                }
+
+    print(f"\n== 查询计划与耗时（{args.rows:,} 行，中位数）==")
+    for name, entry in report["queries"].items():
+        before, after = entry["legacy"], entry["surrogate"]
+        speedup = before["ms"] / after["ms"] if after["ms"] else 0
+        print(f"\n{name}: {before['ms']:.3f} ms -> {after['ms']:.3f} ms（{speedup:.1f}x）")
+        for label, result in (("迁移前", before), ("迁移后", after)):
+            for line in result["plan"]:
+                print(f"    {label}  {line}")
+
+    print("\n== 存储（字节）==")
+    for schema, sizes in report["storage"].items():
+        total = sum(sizes.values())
+        print(f"\n{schema}: 合计 {total:,}")
+        for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+            print(f"    {name:<34} {size:>14,}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
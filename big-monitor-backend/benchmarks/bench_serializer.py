@@ -0,0 +1,54 @@
+"""
+对比列表接口的两种序列化路径（查询 + 序列化 + JSON 编码）：
+    before: ORM 对象 + DzmlNewSchema(many=True).dump
+    after:  列元组查询 + RowEncoder 预编译编码
+
+运行方式（在 big-monitor-backend 目录下）：
+    python -m benchmarks.bench_serializer --rows 1000000
+"""
+import argparse
+import time
+
+from benchmarks.seed import sqlite_app
+
+
+def run(label, func, rows):
+    start = time.perf_counter()
+    body = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<8} {elapsed:8.2f} s  {rows / elapsed:12,.0f} rows/s  {len(body) / 1e6:8.1f} MB")
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dzml_new 序列化基准测试")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--db", default="bench_dzml_new.sqlite3")
+    args = parser.parse_args()
+
+    app, db = sqlite_app(args.db, args.rows)
+
+    from app.models.dzml_new import DzmlNew
+    from app.routes.dzml_new_routes import dzml_new_encoder
+    from app.schemas.dzml_new_schemas import DzmlNewSchema
+
+    schema = DzmlNewSchema(many=True)
+
+    def before():
+        data = schema.dump(DzmlNew.query.all())
+        return app.json.dumps({"data": data, "total": len(data)})
+
+    def after():
+        data = dzml_new_encoder.dump_many(dzml_new_encoder.query().all())
+        return app.json.dumps({"data": data, "total": len(data)})
+
+    with app.app_context():
+        print(f"dzml_new 行数：{args.rows:,}")
+        old = run("before", before, args.rows)
+        db.session.remove()
+        new = run("after", after, args.rows)
+        print("输出是否逐字节一致：", old == new)
+
+
+if __name__ == "__main__":
+    main()
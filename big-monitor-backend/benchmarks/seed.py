@@ -0,0 +1,180 @@
+"""
+生成合成的 dzml_new 地震目录和 instrument 仪器表，写入 SQLite，供基准测试使用
+
+地名按省份取自真实的县市名，震中在省会附近随机扰动，
+震级服从 b=1 的 Gutenberg-Richter 分布，结果可通过随机种子复现
+"""
+import math
+import os
+import random
+from datetime import datetime, timedelta
+
+from app.utils import PROVINCE_CAPITALS, extract_province, grid_cell
+
+# 每个省份的若干县市名，拼成 DiMing，例如“四川阿坝州汶川县”
+PLACES = {
+    "四川": ["阿坝州汶川县", "甘孜州泸定县", "雅安市芦山县", "宜宾市长宁县", "凉山州西昌市"],
+    "云南": ["大理州漾濞县", "昭通市鲁甸县", "玉溪市通海县", "普洱市墨江县", "迪庆州香格里拉市"],
+    "新疆": ["喀什地区伽师县", "克孜勒苏州阿图什市", "阿克苏地区拜城县", "和田地区于田县", "昌吉州呼图壁县"],
+    "西藏": ["日喀则市定日县", "那曲市尼玛县", "林芝市米林县", "阿里地区改则县"],
+    "青海": ["海西州玛多县", "玉树州杂多县", "海北州门源县", "果洛州玛沁县"],
+    "甘肃": ["临夏州积石山县", "陇南市文县", "张掖市肃南县", "酒泉市阿克塞县"],
+    "河北": ["唐山市古冶区", "张家口市张北县", "邢台市隆尧县"],
+    "辽宁": ["大连市瓦房店市", "鞍山市海城市", "朝阳市北票市", "丹东市宽甸县"],
+    "吉林": ["松原市宁江区", "延边州珲春市", "白山市长白县"],
+    "内蒙古": ["阿拉善盟阿拉善左旗", "包头市固阳县", "锡林郭勒盟东乌珠穆沁旗"],
+    "台湾": ["花莲县", "宜兰县", "台东县"],
+}
+OFFSHORE = ["台湾海峡", "东海", "南海", "日本本州东岸近海", "缅甸", "吉尔吉斯斯坦"]
+
+BATCH_SIZE = 10000
+
+
+def generate_earthquakes(rows: int, seed: int = 2025, end: datetime = None):
+    """逐行生成 dzml_new 记录（字典），时间均匀分布在 end 之前的十年内"""
+    rng = random.Random(seed)
+    end = end or datetime(2025, 1, 1)
+    span = int(timedelta(days=3650).total_seconds())
+    provinces = list(PLACES)
+    beta = math.log(10)
+
+    for _ in range(rows):
+        if rng.random() < 0.05:
+            diming = rng.choice(OFFSHORE)
+            lon, lat = rng.uniform(95, 135), rng.uniform(15, 45)
+        else:
+            province = rng.choice(provinces)
+            diming = province + rng.choice(PLACES[province])
+            base_lon, base_lat = PROVINCE_CAPITALS[province]
+            lon, lat = base_lon + rng.uniform(-3, 3), base_lat + rng.uniform(-2, 2)
+
+        riqi = end - timedelta(seconds=rng.randrange(span), microseconds=rng.randrange(1000) * 1000)
+        mc = round(min(0.5 + rng.expovariate(beta), 8.5), 1)
+        depth = rng.randint(1, 40)
+        lon, lat = round(lon, 3), round(lat, 3)
+        yield {
+            "year": riqi.year,
+            "month": riqi.month,
+            "day": riqi.day,
+            "hour": riqi.hour,
+            "min": riqi.minute,
+            "sec": round(riqi.second + riqi.microsecond / 1e6, 3),
+            "lon": lon,
+            "lat": lat,
+            "depth": depth,
+            "mc": mc,
+            "JingDu": f"{lon:.2f}",
+            "WeiDu": f"{lat:.2f}",
+            "DiMing": diming,
+            "ZhenJiZhi": mc,
+            "ShenDu": depth,
+            "RiQi": riqi.replace(microsecond=0),
+            "years": str(riqi.year),
+            "ZhenJiLeiXing": "ML" if mc < 4.5 else "MS",
+            "mag1": f"{mc:.1f}",
+            "DiZhenLeiXing": "天然地震",
+            "WeiHao": None,
+            "tag": 0,
+            "Notes": None,
+            "OldId": None,
+            "UpgradeTime": riqi.replace(microsecond=0) + timedelta(minutes=rng.randint(5, 120)),
+            "province": extract_province(diming),
+            "grid_cell": grid_cell(lon, lat),
+        }
+
+
+DISCIPLINES = ["测震", "强震", "形变", "重力", "地磁", "地电", "流体"]
+INSTRUMENT_TYPES = ["宽频带地震计", "短周期地震计", "强震仪", "GNSS", "倾斜仪", "水位仪", "磁通门磁力仪"]
+DCUNIT_CODES = ["SC", "YN", "XJ", "XZ", "QH", "GS", "HE", "LN", "JL", "NM", "TW"]
+
+
+def generate_instruments(rows: int, seed: int = 2025, end: datetime = None):
+    """逐行生成 instrument 记录（字典），台站分布在各省会附近"""
+    rng = random.Random(seed + 1)
+    end = end or datetime(2025, 1, 1)
+    provinces = list(PLACES)
+
+    for i in range(rows):
+        province = rng.choice(provinces)
+        base_lon, base_lat = PROVINCE_CAPITALS[province]
+        start = end - timedelta(days=rng.randrange(3650))
+        station = f"{provinces.index(province) + 11:02d}{rng.randrange(1000):03d}"
+        yield {
+            "id": i + 1,
+            "stationId": station,
+            "region": province,
+            "pointId": rng.randint(1, 4),
+            "lat": round(base_lat + rng.uniform(-2, 2), 4),
+            "lon": round(base_lon + rng.uniform(-3, 3), 4),
+            "instrId": f"I{i + 1:07d}",
+            "stackNo": rng.randint(1, 3),
+            "instrcode": f"{station}-{rng.randrange(100):02d}",
+            "sampleRate": rng.choice(["1", "20", "50", "100", "200"]),
+            "type": rng.choice(INSTRUMENT_TYPES),
+            "style": rng.choice(["数字", "模拟"]),
+            "discipline": rng.choice(DISCIPLINES),
+            "startDate": start,
+            "endDate": None if rng.random() < 0.8 else start + timedelta(days=rng.randrange(1, 1000)),
+            "instrProject": rng.choice(["十五", "背景场", "中国地震科学台阵"]),
+            "dcunitCode": DCUNIT_CODES[provinces.index(province) % len(DCUNIT_CODES)],
+            "illeagle": None,
+            "registerFlag": rng.randint(0, 1),
+            "status": rng.choice([0, 1, 1, 1]),
+            "created_at": start + timedelta(seconds=rng.randrange(86400)),
+        }
+
+
+def bulk_insert(db, model, records):
+    """按批执行 Core INSERT，绕过 ORM 以加快造数"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= BATCH_SIZE:
+            db.session.execute(model.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(model.__table__.insert(), batch)
+    db.session.commit()
+
+
+def seed_earthquakes(db, rows: int, seed: int = 2025):
+    """批量写入合成地震目录"""
+    from app.models.dzml_new import DzmlNew
+
+    bulk_insert(db, DzmlNew, generate_earthquakes(rows, seed))
+
+
+def seed_instruments(db, rows: int, seed: int = 2025):
+    """批量写入合成仪器表"""
+    from app.models.instrument import Instrument
+
+    bulk_insert(db, Instrument, generate_instruments(rows, seed))
+
+
+def sqlite_app(path: str, rows: int, instruments: int = 0, seed: int = 2025, config: dict = None):
+    """创建指向 SQLite 文件的应用，文件不存在或行数不符时重新造数"""
+    from app import create_app, db
+    from app.migrations import has_surrogate_key, upgrade_surrogate_key
+    from app.models.dzml_new import DzmlNew
+    from app.models.instrument import Instrument
+    from app.rollups import refresh_rollups
+
+    overrides = {"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.abspath(path)}
+    overrides.update(config or {})
+    app = create_app(overrides)
+    with app.app_context():
+        db.create_all()
+        # 早先造的库还是联合主键，先迁移到当前表结构
+        if not has_surrogate_key(db.engine):
+            upgrade_surrogate_key(db.engine)
+        if db.session.query(DzmlNew).count() != rows:
+            db.session.query(DzmlNew).delete()
+            db.session.commit()
+            seed_earthquakes(db, rows, seed)
+        if db.session.query(Instrument).count() != instruments:
+            db.session.query(Instrument).delete()
+            db.session.commit()
+            seed_instruments(db, instruments, seed)
+        # 部署时由 cron / 后台线程刷新预聚合表，这里在造数后直接刷新（已是最新时只做一次水位比较）
+        refresh_rollups()
+    return app, db
@@ -1,4 +1,6 @@
-from app import create_app, db
+import os
+
+from app import create_app, db, place_index
 from sqlalchemy import text  # ✅ 新增
 
 app = create_app()
@@ -10,4 +12,10 @@ if __name__ == "__main__":
             print("✅ 数据库连接成功！")
         except Exception as e:
             print("❌ 数据库连接失败：", e)
+        else:
+            # 启动时预先构建地名检索索引，首个 /dzml_new/search 请求不必等待；
+            # debug 模式的重载器会在子进程中重新执行本文件，只在实际处理请求的子进程中构建，
+            # 避免父进程白白多建一次
+            if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+                print(f"✅ 地名索引构建完成，耗时 {place_index.build():.1f}s")
     app.run(debug=True)
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from app.models.instrument import Instrument
+
+
+@pytest.fixture
+def instruments(app):
+    rows = [
+        {
+            "id": i,
+            "stationId": f"51{i:03d}",
+            "instrcode": f"BBVS-{i}",
+            "region": "四川" if i % 2 else "云南",
+            "discipline": "测震" if i % 3 else "强震",
+            "status": 1,
+            # 每隔几台没有启用日期，覆盖空值组
+            "startDate": None if i % 4 == 0 else datetime(2020, 1, 1) + timedelta(days=i % 5),
+            "created_at": datetime(2024, 1, 1),
+        }
+        for i in range(1, 24)
+    ]
+    with db.engine.begin() as conn:
+        conn.execute(Instrument.__table__.insert(), rows)
+    return rows
+
+
+@pytest.mark.parametrize("size", ["abc", "0", "-3"])
+def test_search_rejects_invalid_size(client, size):
+    assert client.get(f"/instrument/search?size={size}").status_code == 400
+
+
+@pytest.mark.parametrize("sort", ["id", "-id", "startDate", "-startDate"])
+def test_search_cursor_walks_every_match_once(client, instruments, sort):
+    seen, cursor = [], ""
+    while cursor is not None:
+        body = client.get(f"/instrument/search?discipline=测震&sort={sort}&size=4&cursor={cursor}").get_json()
+        seen += [row["stationId"] for row in body["data"]]
+        cursor = body["next_cursor"]
+
+    expected = {row["stationId"] for row in instruments if row["discipline"] == "测震"}
+    assert len(seen) == len(set(seen))
+    assert set(seen) == expected
+    # 分面计数不受自身字段筛选的影响
+    disciplines = [row["discipline"] for row in instruments]
+    assert {item["value"]: item["count"] for item in body["facets"]["discipline"]} == {
+        value: disciplines.count(value) for value in set(disciplines)
+    }
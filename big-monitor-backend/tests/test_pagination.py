@@ -0,0 +1,107 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import event, text
+
+from app import db
+from app.migrations import install_province_triggers
+from app.models.dzml_new import DzmlNew
+from app.utils import decode_cursor, encode_cursor, nullable_keyset_page
+from tests.conftest import insert_earthquakes
+
+
+def walk(client, url):
+    """沿 next_cursor 翻完所有页，返回每页的数据"""
+    pages = []
+    cursor = ""
+    while cursor is not None:
+        response = client.get(f"{url}&cursor={cursor}")
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        pages.append(body["data"])
+        cursor = body["next_cursor"]
+    return pages
+
+
+def test_cursor_round_trip():
+    columns = [DzmlNew.RiQi, DzmlNew.mc, DzmlNew.id]
+    values = [datetime(2024, 5, 12, 14, 28, 4), Decimal("8.0"), 42]
+    assert decode_cursor(encode_cursor(values), columns) == values
+    assert decode_cursor(encode_cursor([None, None, 7]), columns) == [None, None, 7]
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor([1]), encode_cursor(["x", 1])])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, [DzmlNew.RiQi, DzmlNew.id])
+
+
+def test_province_cursor_pages_are_complete_without_duplicates(app, client):
+    install_province_triggers(db.engine)
+    insert_earthquakes(["四川汶川"] * 23 + ["云南大理"] * 5)
+    # 同一发震时刻的多条地震由 id 定序
+    insert_earthquakes(["四川芦山"] * 4, start=datetime(2024, 1, 1, 5), lon=103.0)
+
+    pages = walk(client, "/dzml_new/province/page?name=四川&size=5")
+    ids = [(row["RiQi"], row["DiMing"], row["lon"]) for page in pages for row in page]
+    assert len(pages) == 6
+    assert all(len(page) == 5 for page in pages[:-1])
+    assert len(ids) == len(set(ids)) == 27
+    # 按发震时间倒序
+    assert [i[0] for i in ids] == sorted((i[0] for i in ids), reverse=True)
+
+
+def test_cursor_page_size_is_validated(app, client):
+    response = client.get("/dzml_new/province/page?name=四川&size=0&cursor=")
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_nullable_keyset_page_covers_null_group(app, descending):
+    insert_earthquakes(["四川汶川"] * 12)
+    with db.engine.begin() as conn:
+        # 一部分行的 ShenDu 为空，其余有重复值
+        conn.execute(text("UPDATE dzml_new SET ShenDu = CASE WHEN id % 3 = 0 THEN NULL ELSE id % 4 END"))
+
+    query = db.session.query(DzmlNew.id, DzmlNew.ShenDu)
+    seen, cursor = [], None
+    while True:
+        rows, cursor = nullable_keyset_page(query, DzmlNew.ShenDu, DzmlNew.id, cursor, 5, descending)
+        seen += [(row.ShenDu, row.id) for row in rows]
+        if cursor is None:
+            break
+
+    nulls = sorted((row for row in seen if row[0] is None), key=lambda row: row[1], reverse=descending)
+    values = sorted((row for row in seen if row[0] is not None), reverse=descending)
+    assert len(seen) == len(set(seen)) == 12
+    assert seen == (values + nulls if descending else nulls + values)
+
+
+def test_province_cursor_query_is_an_index_range_scan(app, client):
+    """/province/page 的游标查询只扫描 (province, RiQi) 索引的一段，不在临时 B-tree 中排序"""
+    install_province_triggers(db.engine)
+    insert_earthquakes(["四川汶川"] * 50 + ["云南大理"] * 50)
+    with db.engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "ORDER BY" in statement:
+            statements.append((statement, parameters))
+
+    cursor = client.get("/dzml_new/province/page?name=四川&size=5&cursor=").get_json()["next_cursor"]
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        assert client.get(f"/dzml_new/province/page?name=四川&size=5&cursor={cursor}").status_code == 200
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+    assert len(statements) == 1
+    statement, parameters = statements[0]
+    with db.engine.connect() as conn:
+        plan = " | ".join(row[3] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters))
+    assert "ix_dzml_new_province_riqi" in plan, plan
+    assert "TEMP B-TREE" not in plan, plan
+    assert "MULTI-INDEX OR" not in plan, plan
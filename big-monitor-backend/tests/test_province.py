@@ -0,0 +1,69 @@
+from app import db
+from app.migrations import has_province_triggers, install_province_triggers
+from app.models.dzml_new import DzmlNew, province_filter
+from app.utils import extract_province, match_provinces
+from tests.conftest import insert_earthquakes
+
+# 含多个省份（取字典顺序靠前的）、子串省名、空地名和海域地名
+DIMINGS = [
+    "四川汶川",
+    "四川云南交界",
+    "云南四川交界",
+    "内蒙古阿拉善左旗",
+    "新疆和田地区皮山县",
+    "日本海",
+    "",
+    None,
+]
+
+
+def stored_provinces():
+    return {diming: province for diming, province in db.session.query(DzmlNew.DiMing, DzmlNew.province)}
+
+
+def test_trigger_fills_province_like_extract_province(app):
+    install_province_triggers(db.engine)
+    insert_earthquakes(DIMINGS)
+
+    stored = stored_provinces()
+    assert stored == {diming: extract_province(diming) for diming in DIMINGS}
+
+
+def test_province_filter_matches_extract_province(app):
+    install_province_triggers(db.engine)
+    insert_earthquakes(DIMINGS)
+
+    for name in ("四川", "四川省", "云南", "蒙古", "新疆", "未知"):
+        expected = {d for d in DIMINGS if extract_province(d) in match_provinces(name)}
+        found = {d for (d,) in db.session.query(DzmlNew.DiMing).filter(province_filter(name))}
+        assert found == expected, name
+
+
+def test_trigger_keeps_assigned_province_and_follows_diming(app):
+    install_province_triggers(db.engine)
+    insert_earthquakes(["日本海"], province="辽宁")
+    insert_earthquakes(["日本海"], lon=130.0)
+    table = DzmlNew.__table__
+
+    with db.engine.begin() as conn:
+        # 不改地名的更新（如 assign-regions 补全省份）保留原值
+        conn.execute(table.update().where(table.c.lon == 104.0).values(mc=4.0))
+        conn.execute(table.update().where(table.c.lon == 130.0).values(DiMing="吉林珲春"))
+
+    rows = dict(db.session.query(DzmlNew.lon, DzmlNew.province))
+    assert rows[104.0] == "辽宁"
+    assert rows[130.0] == "吉林"
+
+
+def test_backfill_province_installs_triggers(app):
+    insert_earthquakes(DIMINGS[:4])
+    assert set(stored_provinces().values()) == {None}
+
+    result = app.test_cli_runner().invoke(args=["dzml-new", "backfill-province"])
+    assert result.exit_code == 0, result.output
+    assert has_province_triggers(db.engine)
+    assert stored_provinces() == {diming: extract_province(diming) for diming in DIMINGS[:4]}
+
+    # 之后的库外导入由触发器填写
+    insert_earthquakes(["新疆和田地区皮山县"], lon=80.0)
+    assert db.session.query(DzmlNew.province).filter(DzmlNew.lon == 80.0).scalar() == "新疆"
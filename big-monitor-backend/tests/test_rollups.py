@@ -0,0 +1,38 @@
+from datetime import datetime
+
+import pytest
+
+from app import rollups
+from app.rollups import rebuild_rollups, refresh_rollups
+from tests.conftest import insert_earthquakes
+
+URL = "/dzml_new/rollups?granularity=day&start=2024-01-01T00:00:00&end=2024-01-02T00:00:00"
+
+
+@pytest.fixture(autouse=True)
+def fresh_tables(monkeypatch):
+    # 每个测试一个新库，不能沿用上一个库的“聚合表已建立”标记
+    monkeypatch.setattr(rollups, "tables_ready", False)
+
+
+def test_rollups_follow_refresh(app, client):
+    insert_earthquakes(["四川汶川"] * 3)
+    rebuild_rollups()
+    body = client.get(URL).get_json()
+    assert (body["total"], body["stale"]) == (3, False)
+
+    insert_earthquakes(["四川汶川"] * 2, start=datetime(2024, 1, 1, 5))
+    body = client.get(URL).get_json()
+    assert (body["total"], body["stale"]) == (3, True)
+
+    # 刷新不改变 dzml_new 的版本，缓存键需随聚合表的水位变化
+    refresh_rollups()
+    body = client.get(URL).get_json()
+    assert (body["total"], body["stale"]) == (5, False)
+
+
+def test_rollups_reject_too_many_buckets(app, client):
+    rebuild_rollups()
+    assert client.get("/dzml_new/rollups?granularity=hour&days=36500").status_code == 400
+    assert client.get("/dzml_new/rollups?days=99999999999").status_code == 400
+    assert client.get("/dzml_new/rollups?granularity=month&days=36500").status_code == 200
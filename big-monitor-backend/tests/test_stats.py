@@ -0,0 +1,31 @@
+from datetime import datetime
+
+import pytest
+
+from app.routes.dzml_new_routes import MAX_STATS_BUCKETS, STATS_BUCKETS, count_buckets, iter_buckets
+
+WINDOWS = [
+    (datetime(2024, 1, 31, 23, 30), datetime(2024, 3, 1, 0, 15)),
+    (datetime(2023, 12, 31, 12, 0), datetime(2024, 1, 1, 11, 59)),
+    (datetime(2024, 1, 10, 5, 0), datetime(2024, 1, 10, 5, 0)),
+    # 终点早于起点
+    (datetime(2024, 1, 20, 5, 30), datetime(2024, 1, 20, 3, 0)),
+    (datetime(2024, 3, 1), datetime(2023, 1, 1)),
+]
+
+
+@pytest.mark.parametrize("bucket", list(STATS_BUCKETS))
+@pytest.mark.parametrize("start,end", WINDOWS)
+def test_count_buckets_matches_iter_buckets(bucket, start, end):
+    assert count_buckets(bucket, start, end) == len(list(iter_buckets(bucket, start, end)))
+
+
+def test_stats_rejects_too_many_buckets(app, client):
+    response = client.get("/dzml_new/stats?bucket=hour&days=36500")
+    assert response.status_code == 400
+    assert str(MAX_STATS_BUCKETS) in response.get_json()["error"]
+    assert client.get("/dzml_new/stats?bucket=month&days=36500").status_code == 200
+
+
+def test_stats_rejects_overflowing_days(app, client):
+    assert client.get("/dzml_new/stats?days=99999999999").status_code == 400
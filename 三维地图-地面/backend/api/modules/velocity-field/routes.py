@@ -2,7 +2,7 @@
 速度场可视化 - API路由
 从4D项目迁移而来,提供完整的地下速度场数据集访问接口
 """
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from fastapi.responses import FileResponse
 from pathlib import Path
 import json
@@ -11,6 +11,8 @@ import numpy as np
 from datetime import datetime
 import os
 
+from file_cache import file_cache
+
 # 创建路由器,使用标准的/api前缀
 router = APIRouter(prefix="/api", tags=["velocity-field"])
 
@@ -49,21 +51,34 @@ def get_dataset_path(dataset_name: str) -> Path:
     return dataset_path
 
 
-def load_dataset_config(dataset_name: str) -> dict:
-    """加载数据集配置"""
-    config_path = get_dataset_path(dataset_name) / "dataset_config.json"
-    if not config_path.exists():
-        raise HTTPException(status_code=404, detail=f"配置文件不存在: {dataset_name}")
-    with open(config_path, 'r', encoding='utf-8') as f:
+def read_json(file_path: Path):
+    with open(file_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
 
+def read_success(file_path: Path):
+    """{'success': True, 'data': <文件内容>}，大多数接口的返回格式"""
+    return {
+        'success': True,
+        'data': read_json(file_path)
+    }
+
+
+async def cached_response(request: Request, file_path: Path, build=read_success, *args):
+    """
+    从共享的文件缓存返回 build(file_path, *args) 的 JSON 响应（已序列化、按 Accept-Encoding 预压缩）；
+    文件修改后自动重新加载，并发的同一文件请求只读取、解析一次
+    """
+    entry = await file_cache.get(file_path, build, *args)
+    return file_cache.response(entry, request)
+
+
 # ============================================================================
 # 数据集管理API
 # ============================================================================
 
 @router.get("/datasets")
-async def list_datasets():
+async def list_datasets(request: Request):
     """获取所有数据集列表"""
     try:
         index_path = DATASETS_DIR / "datasets_index.json"
@@ -73,27 +88,21 @@ async def list_datasets():
                 'data': {'datasets': [], 'count': 0}
             }
 
-        with open(index_path, 'r', encoding='utf-8') as f:
-            index = json.load(f)
-
-        return {
-            'success': True,
-            'data': index
-        }
+        return await cached_response(request, index_path)
     except Exception as e:
         log_error(f"获取数据集列表失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/datasets/{dataset_name}/config")
-async def get_dataset_config(dataset_name: str):
+async def get_dataset_config(dataset_name: str, request: Request):
     """获取数据集配置信息"""
     try:
-        config = load_dataset_config(dataset_name)
-        return {
-            'success': True,
-            'data': config
-        }
+        config_path = get_dataset_path(dataset_name) / "dataset_config.json"
+        if not config_path.exists():
+            raise HTTPException(status_code=404, detail=f"配置文件不存在: {dataset_name}")
+
+        return await cached_response(request, config_path)
     except HTTPException:
         raise
     except Exception as e:
@@ -102,7 +111,7 @@ async def get_dataset_config(dataset_name: str):
 
 
 @router.get("/datasets/{dataset_name}/ui-config")
-async def get_ui_config(dataset_name: str):
+async def get_ui_config(dataset_name: str, request: Request):
     """获取数据集的UI配置文件"""
     try:
         dataset_path = get_dataset_path(dataset_name)
@@ -114,10 +123,7 @@ async def get_ui_config(dataset_name: str):
                 detail=f'UI配置文件不存在: {dataset_name}/ui-config.json'
             )
 
-        with open(ui_config_path, 'r', encoding='utf-8') as f:
-            ui_config = json.load(f)
-
-        return ui_config
+        return await cached_response(request, ui_config_path, read_json)
 
     except HTTPException:
         raise
@@ -267,8 +273,38 @@ async def get_velocity_slice(
 # 地震数据API
 # ============================================================================
 
+def build_earthquakes(json_path: Path, min_mag, max_mag, start_time, end_time, limit):
+    """按震级、时间筛选地震目录（筛选结果按查询参数分别缓存）"""
+    data = read_json(json_path)
+
+    earthquakes = data['earthquakes']
+
+    # 筛选
+    filtered = []
+    for eq in earthquakes:
+        if eq['magnitude'] < min_mag or eq['magnitude'] > max_mag:
+            continue
+        if start_time and eq['time'] < start_time:
+            continue
+        if end_time and eq['time'] > end_time:
+            continue
+        filtered.append(eq)
+        if len(filtered) >= limit:
+            break
+
+    return {
+        'success': True,
+        'data': {
+            'metadata': data['metadata'],
+            'earthquakes': filtered,
+            'total_returned': len(filtered)
+        }
+    }
+
+
 @router.get("/datasets/{dataset_name}/earthquakes")
 async def get_earthquakes(
+    request: Request,
     dataset_name: str,
     min_mag: float = Query(default=2.0, description="最小震级"),
     max_mag: float = Query(default=10.0, description="最大震级"),
@@ -284,32 +320,9 @@ async def get_earthquakes(
         if not json_path.exists():
             raise HTTPException(status_code=404, detail="地震数据文件不存在")
 
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        earthquakes = data['earthquakes']
-
-        # 筛选
-        filtered = []
-        for eq in earthquakes:
-            if eq['magnitude'] < min_mag or eq['magnitude'] > max_mag:
-                continue
-            if start_time and eq['time'] < start_time:
-                continue
-            if end_time and eq['time'] > end_time:
-                continue
-            filtered.append(eq)
-            if len(filtered) >= limit:
-                break
-
-        return {
-            'success': True,
-            'data': {
-                'metadata': data['metadata'],
-                'earthquakes': filtered,
-                'total_returned': len(filtered)
-            }
-        }
+        return await cached_response(
+            request, json_path, build_earthquakes, min_mag, max_mag, start_time, end_time, limit
+        )
 
     except HTTPException:
         raise
@@ -323,7 +336,7 @@ async def get_earthquakes(
 # ============================================================================
 
 @router.get("/datasets/{dataset_name}/faults")
-async def get_faults(dataset_name: str):
+async def get_faults(dataset_name: str, request: Request):
     """获取断层数据"""
     try:
         dataset_path = get_dataset_path(dataset_name)
@@ -332,13 +345,7 @@ async def get_faults(dataset_name: str):
         if not json_path.exists():
             raise HTTPException(status_code=404, detail="断层数据文件不存在")
 
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        return {
-            'success': True,
-            'data': data
-        }
+        return await cached_response(request, json_path)
 
     except HTTPException:
         raise
@@ -351,8 +358,28 @@ async def get_faults(dataset_name: str):
 # 震源机制解API
 # ============================================================================
 
+def build_focal_mechanisms(json_path: Path, min_mag, limit):
+    """按震级筛选震源机制解（筛选结果按查询参数分别缓存）"""
+    data = read_json(json_path)
+
+    mechanisms = data['mechanisms']
+
+    # 筛选
+    filtered = [m for m in mechanisms if m['magnitude'] >= min_mag][:limit]
+
+    return {
+        'success': True,
+        'data': {
+            'metadata': data['metadata'],
+            'mechanisms': filtered,
+            'total_returned': len(filtered)
+        }
+    }
+
+
 @router.get("/datasets/{dataset_name}/focal-mechanisms")
 async def get_focal_mechanisms(
+    request: Request,
     dataset_name: str,
     min_mag: float = Query(default=4.0, description="最小震级"),
     limit: int = Query(default=2000, description="返回数量限制")
@@ -365,22 +392,7 @@ async def get_focal_mechanisms(
         if not json_path.exists():
             raise HTTPException(status_code=404, detail="震源机制解文件不存在")
 
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        mechanisms = data['mechanisms']
-
-        # 筛选
-        filtered = [m for m in mechanisms if m['magnitude'] >= min_mag][:limit]
-
-        return {
-            'success': True,
-            'data': {
-                'metadata': data['metadata'],
-                'mechanisms': filtered,
-                'total_returned': len(filtered)
-            }
-        }
+        return await cached_response(request, json_path, build_focal_mechanisms, min_mag, limit)
 
     except HTTPException:
         raise
@@ -394,7 +406,7 @@ async def get_focal_mechanisms(
 # ============================================================================
 
 @router.get("/datasets/{dataset_name}/terrain/config")
-async def get_terrain_config(dataset_name: str):
+async def get_terrain_config(dataset_name: str, request: Request):
     """获取地形配置信息"""
     try:
         dataset_path = get_dataset_path(dataset_name)
@@ -403,13 +415,7 @@ async def get_terrain_config(dataset_name: str):
         if not config_path.exists():
             raise HTTPException(status_code=404, detail="地形配置文件不存在")
 
-        with open(config_path, 'r', encoding='utf-8') as f:
-            config = json.load(f)
-
-        return {
-            'success': True,
-            'data': config
-        }
+        return await cached_response(request, config_path)
 
     except HTTPException:
         raise
@@ -468,8 +474,24 @@ async def get_terrain_texture(dataset_name: str):
 # 地表图层API (城市、台站、断裂线、边界)
 # ============================================================================
 
+def read_layer(layer_file: Path):
+    """读取 GeoJSON 图层（仅在缓存未命中或文件变化时执行）"""
+    layer_data = read_json(layer_file)
+    features = layer_data.get('features', [])
+    log_debug(f"   特征数量: {len(features)}")
+    if features:
+        geom = features[0]['geometry']
+        log_debug(f"   📐 读取后几何类型: {geom['type']}")
+        log_debug(f"   📐 坐标数量: {len(geom['coordinates'])}")
+
+    return {
+        'success': True,
+        'data': layer_data
+    }
+
+
 @router.get("/datasets/{dataset_name}/layers/{layer_name}")
-async def get_surface_layer(dataset_name: str, layer_name: str):
+async def get_surface_layer(dataset_name: str, layer_name: str, request: Request):
     """获取地表图层数据 (GeoJSON格式)
 
     支持的图层:
@@ -515,19 +537,7 @@ async def get_surface_layer(dataset_name: str, layer_name: str):
             )
 
         # 读取并返回GeoJSON数据
-        with open(layer_file, 'r', encoding='utf-8') as f:
-            layer_data = json.load(f)
-            features = layer_data.get('features', [])
-            log_debug(f"   特征数量: {len(features)}")
-            if features:
-                geom = features[0]['geometry']
-                log_debug(f"   📐 读取后几何类型: {geom['type']}")
-                log_debug(f"   📐 坐标数量: {len(geom['coordinates'])}")
-
-        return {
-            'success': True,
-            'data': layer_data
-        }
+        return await cached_response(request, layer_file, read_layer)
 
     except HTTPException:
         raise
@@ -0,0 +1,205 @@
+"""
+数据文件响应缓存 - /api/data/*、速度场 JSON 接口共用，缓存已序列化、已压缩的响应体
+
+    缓存键      (文件路径, 生成函数, 参数)，同一文件的不同生成方式（原样返回、转换为 GeoJSON、按条件筛选）各占一项
+    校验        每次请求 stat 一次文件，(st_mtime_ns, st_size, st_ino) 与缓存时不一致即重新生成；
+                不读取文件内容，也不在持有全局锁时做任何 IO（原 DataCache 每次命中都对整个文件算 MD5）
+    预编码      未命中时在线程池中读取、序列化为 JSON 字节（与 FastAPI 默认的 JSONResponse 输出一致），
+                并预先压缩出 gzip（安装了 brotli 时还有 br）版本，按请求的 Accept-Encoding 选择，命中时零编码开销
+    内存上限    所有版本的字节数合计不超过 DATA_CACHE_MEMORY_MB，按最近使用 LRU 淘汰；超过上限的单项照常返回但不缓存
+    请求合并    同一文件的并发未命中只生成一次（single_flight）
+    条件请求    响应带弱 ETag，客户端带 If-None-Match 且未变化时返回 304
+
+环境变量:
+    DATA_CACHE_MEMORY_MB       缓存容量（默认 128），0 表示不缓存
+    DATA_CACHE_MIN_COMPRESS    小于该字节数的响应不压缩（默认 1024）
+    DATA_CACHE_GZIP_LEVEL      gzip 压缩级别（默认 6）
+    DATA_CACHE_BROTLI_QUALITY  brotli 压缩质量（默认 5）
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from single_flight import SingleFlight
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只提供 gzip
+    brotli = None
+
+# 按优先顺序排列的可用压缩方式
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def dump_json(content):
+    """序列化为 JSON 字节，参数与 FastAPI 默认的 JSONResponse 一致"""
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def accepted_encodings(header):
+    """解析 Accept-Encoding，返回 q > 0 的编码集合（'*' 展开为所有可用编码）"""
+    accepted = set()
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q <= 0:
+            continue
+        if coding == '*':
+            accepted.update(ENCODINGS)
+        else:
+            accepted.add(coding)
+    return accepted
+
+
+class CachedBody:
+    """一个文件版本的响应：原始 JSON 字节及各压缩版本"""
+
+    def __init__(self, validator, etag, variants):
+        self.validator = validator
+        self.etag = etag
+        self.variants = variants  # 编码（identity / gzip / br）-> 字节
+
+    @property
+    def size(self):
+        return sum(len(body) for body in self.variants.values())
+
+
+class FileCache:
+    """按文件 stat 校验的响应缓存，内存 LRU，全局共享一个实例"""
+
+    def __init__(self):
+        self.max_bytes = int(float(os.getenv('DATA_CACHE_MEMORY_MB', 128)) * 1024 * 1024)
+        self.min_compress = int(os.getenv('DATA_CACHE_MIN_COMPRESS', 1024))
+        self.gzip_level = int(os.getenv('DATA_CACHE_GZIP_LEVEL', 6))
+        self.brotli_quality = int(os.getenv('DATA_CACHE_BROTLI_QUALITY', 5))
+
+        self.entries = OrderedDict()  # 缓存键 -> CachedBody，按最近使用排序
+        self.total = 0
+        self.lock = threading.Lock()
+        self.flight = SingleFlight('file-cache')
+        self.counters = {
+            'lookups': 0,
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'evictions': 0,
+            'oversized': 0,
+            'not_modified': 0,
+        }
+        self.served = {encoding: 0 for encoding in ('identity',) + ENCODINGS}
+
+    # ---------- 读取 ----------
+
+    async def get(self, file_path, build, *args):
+        """
+        返回 build(file_path, *args) 序列化后的 CachedBody；文件不存在时抛出 FileNotFoundError
+        build 的返回值须可直接 JSON 序列化，args 参与缓存键，须可哈希
+        """
+        # 单次 stat 系统调用，直接在事件循环中执行
+        stat = os.stat(file_path)
+        validator = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        key = (str(file_path), build.__module__, build.__qualname__, args)
+
+        with self.lock:
+            self.counters['lookups'] += 1
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry.validator == validator:
+                    self.entries.move_to_end(key)
+                    self.counters['hits'] += 1
+                    return entry
+                # 文件已变化，旧版本立即释放
+                del self.entries[key]
+                self.total -= entry.size
+                self.counters['invalidations'] += 1
+            self.counters['misses'] += 1
+
+        return await self.flight.do(
+            (key, validator), lambda: run_in_threadpool(self._load, key, validator, file_path, build, args)
+        )
+
+    def _load(self, key, validator, file_path, build, args):
+        """在线程池中生成并压缩响应体，放入缓存"""
+        body = dump_json(build(file_path, *args))
+        variants = {'identity': body}
+        if len(body) >= self.min_compress:
+            for encoding in ENCODINGS:
+                compressed = self._compress(encoding, body)
+                if len(compressed) < len(body):
+                    variants[encoding] = compressed
+        digest = hashlib.sha1(repr((key, validator)).encode('utf-8')).hexdigest()[:20]
+        entry = CachedBody(validator, f'W/"{digest}"', variants)
+        self._remember(key, entry)
+        return entry
+
+    def _compress(self, encoding, body):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def _remember(self, key, entry):
+        with self.lock:
+            if entry.size > self.max_bytes:
+                self.counters['oversized'] += 1
+                return
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total -= old.size
+            self.entries[key] = entry
+            self.total += entry.size
+            while self.total > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total -= evicted.size
+                self.counters['evictions'] += 1
+
+    # ---------- 响应 ----------
+
+    def response(self, entry, request):
+        """按 If-None-Match 返回 304，否则按 Accept-Encoding 选择预压缩的版本"""
+        headers = {'ETag': entry.etag, 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match and (if_none_match.strip() == '*' or entry.etag in [t.strip() for t in if_none_match.split(',')]):
+            with self.lock:
+                self.counters['not_modified'] += 1
+            return Response(status_code=304, headers=headers)
+
+        accepted = accepted_encodings(request.headers.get('accept-encoding'))
+        encoding = next((e for e in ENCODINGS if e in accepted and e in entry.variants), 'identity')
+        if encoding != 'identity':
+            headers['Content-Encoding'] = encoding
+        with self.lock:
+            self.served[encoding] += 1
+        return Response(content=entry.variants[encoding], media_type='application/json', headers=headers)
+
+    # ---------- 统计 ----------
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters['served'] = dict(self.served)
+            counters['entries'] = len(self.entries)
+            counters['bytes'] = self.total
+        counters['max_bytes'] = self.max_bytes
+        counters['encodings'] = list(ENCODINGS)
+        counters['hit_ratio'] = round(counters['hits'] / counters['lookups'], 4) if counters['lookups'] else None
+        return counters
+
+
+# 全局实例：数据、速度场模块共用同一个容量上限
+file_cache = FileCache()
@@ -0,0 +1,127 @@
+"""
+速率限制 - 按客户端 IP 的令牌桶，每个请求 O(1)，内存只与活跃客户端数有关
+
+    令牌桶      容量为 requests，每秒补充 requests / window 个令牌；每个请求消耗一个，
+                桶空时返回 429 和 Retry-After。每个客户端只保存 (令牌数, 上次更新时间) 两个数
+    分片锁      客户端按哈希分到多个分片，各分片独立加锁，线程之间不争用同一把全局锁
+    空闲淘汰    桶在空闲 window 秒后必然已补满，与新建的桶等价，后台任务定期删除这些客户端，
+                淘汰不会放宽限制
+    按路由限额  RATE_LIMITS 为每个路径前缀配置独立的限额，最长前缀优先，未匹配的路径不限流
+
+环境变量:
+    RATE_LIMITS                  逗号分隔的 "路径前缀=请求数/秒数"，默认 "/sgs-proxy/=100/60"（与原限流范围相同）；
+                                 /api/data/、/api/ 等其他前缀需要时在这里显式加上，
+                                 例如 "/sgs-proxy/=100/60,/api/data/=600/60"
+    RATE_LIMIT_SHARDS            分片数（默认 64）
+    RATE_LIMIT_EVICT_INTERVAL    空闲客户端的清理间隔秒数（默认 60）
+"""
+import asyncio
+import os
+import threading
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+DEFAULT_RATE_LIMITS = "/sgs-proxy/=100/60"
+
+
+class TokenBucketLimiter:
+    """单个限额的令牌桶集合：客户端键 -> [令牌数, 上次更新时间]"""
+
+    def __init__(self, requests, window, shards=64):
+        self.capacity = float(requests)
+        self.rate = requests / window  # 每秒补充的令牌数
+        self.window = window
+        self.shards = [{} for _ in range(shards)]
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self.counts = [[0, 0] for _ in range(shards)]  # 各分片的 [允许数, 拒绝数]，在分片锁内累加
+        self.evicted = 0
+
+    def acquire(self, key, now=None):
+        """消耗一个令牌；返回 (是否允许, 需要等待的秒数)"""
+        now = time.monotonic() if now is None else now
+        index = hash(key) % len(self.shards)
+        with self.locks[index]:
+            bucket = self.shards[index].get(key)
+            if bucket is None:
+                self.shards[index][key] = [self.capacity - 1, now]
+                self.counts[index][0] += 1
+                return True, 0.0
+            tokens = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                self.counts[index][0] += 1
+                return True, 0.0
+            bucket[0] = tokens
+            self.counts[index][1] += 1
+            return False, (1 - tokens) / self.rate
+
+    def is_allowed(self, key):
+        return self.acquire(key)[0]
+
+    def evict_idle(self, now=None):
+        """删除空闲到已补满的桶，逐个分片加锁，返回删除的数量"""
+        now = time.monotonic() if now is None else now
+        idle = self.capacity / self.rate
+        removed = 0
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                stale = [key for key, (_, last) in shard.items() if now - last >= idle]
+                for key in stale:
+                    del shard[key]
+            removed += len(stale)
+        with self.locks[0]:
+            self.evicted += removed
+        return removed
+
+    def clients(self):
+        return sum(len(shard) for shard in self.shards)
+
+
+class RateLimitRules:
+    """按路径前缀匹配的限额，每条规则一个独立的令牌桶集合"""
+
+    def __init__(self, spec=None, shards=None):
+        spec = spec if spec is not None else os.getenv('RATE_LIMITS', DEFAULT_RATE_LIMITS)
+        shards = shards or int(os.getenv('RATE_LIMIT_SHARDS', 64))
+        self.evict_interval = float(os.getenv('RATE_LIMIT_EVICT_INTERVAL', 60))
+        self.rules = []  # (前缀, TokenBucketLimiter)，最长前缀在前
+        for item in spec.split(','):
+            if not item.strip():
+                continue
+            prefix, _, budget = item.strip().partition('=')
+            requests, _, window = budget.partition('/')
+            self.rules.append((prefix.strip(), TokenBucketLimiter(int(requests), float(window), shards)))
+        self.rules.sort(key=lambda rule: len(rule[0]), reverse=True)
+
+    def match(self, path):
+        for prefix, limiter in self.rules:
+            if path.startswith(prefix):
+                return prefix, limiter
+        return None, None
+
+    def evict_idle(self):
+        return sum(limiter.evict_idle() for _, limiter in self.rules)
+
+    async def run_eviction(self):
+        """后台任务：定期清理空闲客户端（在应用生命周期内运行）"""
+        while True:
+            await asyncio.sleep(self.evict_interval)
+            # 在线程池中逐个分片清理，不阻塞事件循环；请求只会短暂等待所在分片的锁
+            removed = await run_in_threadpool(self.evict_idle)
+            if removed:
+                print(f"🧹 速率限制清理空闲客户端: {removed}")
+
+    def stats(self):
+        return {
+            prefix: {
+                'requests': int(limiter.capacity),
+                'window': limiter.window,
+                'clients': limiter.clients(),
+                'allowed': sum(count[0] for count in limiter.counts),
+                'rejected': sum(count[1] for count in limiter.counts),
+                'evicted': limiter.evicted,
+            }
+            for prefix, limiter in self.rules
+        }
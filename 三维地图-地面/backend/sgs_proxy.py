@@ -0,0 +1,347 @@
+"""
+Skyline SGS 代理 - 基于 httpx.AsyncClient 的异步转发
+与 SGS 服务器之间保持长连接池，响应体按块原样流式回传，不阻塞事件循环；
+GET 请求经过瓦片缓存（tile_cache.py，缓存相关的环境变量见该模块）
+
+环境变量:
+    SGS_SERVER_URL          SGS 服务地址（默认 http://124.17.4.220:24088/SG）
+    SGS_PROXY_WHITELIST     额外允许代理的主机，逗号分隔（内置白名单之外，如本地联调的 127.0.0.1）
+    SGS_MAX_CONNECTIONS     到 SGS 的最大并发连接数（默认 100），超出的请求排队等待空闲连接
+    SGS_MAX_KEEPALIVE       连接池中保留的空闲长连接数（默认 20）
+    SGS_KEEPALIVE_EXPIRY    空闲长连接的保留秒数（默认 30）
+    SGS_CONNECT_TIMEOUT     建立连接超时秒数（默认 5）
+    SGS_READ_TIMEOUT        读取响应（两次收到数据之间）的超时秒数（默认 15）
+    SGS_WRITE_TIMEOUT       发送请求体的超时秒数（默认 15）
+    SGS_POOL_TIMEOUT        连接池已满时等待空闲连接的秒数（默认 10），超时返回 503
+"""
+import os
+import threading
+from urllib.parse import urlparse
+
+import httpx
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+
+from single_flight import SingleFlight
+from tile_cache import CONDITIONAL_HEADERS, REFRESH_HEADERS, STALE_IF_ERROR_STATUS, TileCache
+
+DEFAULT_SGS_SERVER = 'http://124.17.4.220:24088/SG'
+
+# 逐跳头只对单个连接有效，不能转发（RFC 7230 6.1）
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailer', 'trailers', 'transfer-encoding', 'upgrade',
+}
+# 请求方向另外去掉 host（由 httpx 按目标地址生成）和 content-length（按实际请求体重新计算）
+REQUEST_SKIP_HEADERS = HOP_BY_HOP_HEADERS | {'host', 'content-length'}
+
+
+def _encode_headers(headers):
+    return [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+def sgs_target_base():
+    """SGS 服务根地址，统一以 /SG 结尾"""
+    sgs_server = os.getenv('SGS_SERVER_URL', DEFAULT_SGS_SERVER).rstrip('/')
+    if sgs_server.lower().endswith('/sg'):
+        return sgs_server
+    return sgs_server + '/SG'
+
+
+class SGSProxy:
+    """SGS 异步代理：共享一个 httpx.AsyncClient，在应用启动时创建、关闭时释放"""
+
+    def __init__(self, whitelist):
+        extra = [h.strip() for h in os.getenv('SGS_PROXY_WHITELIST', '').split(',') if h.strip()]
+        self.whitelist = set(whitelist) | set(extra)
+        self.target_base = sgs_target_base()
+        self.limits = httpx.Limits(
+            max_connections=_env_int('SGS_MAX_CONNECTIONS', 100),
+            max_keepalive_connections=_env_int('SGS_MAX_KEEPALIVE', 20),
+            keepalive_expiry=_env_float('SGS_KEEPALIVE_EXPIRY', 30),
+        )
+        self.timeout = httpx.Timeout(
+            connect=_env_float('SGS_CONNECT_TIMEOUT', 5),
+            read=_env_float('SGS_READ_TIMEOUT', 15),
+            write=_env_float('SGS_WRITE_TIMEOUT', 15),
+            pool=_env_float('SGS_POOL_TIMEOUT', 10),
+        )
+        self.cache = TileCache()
+        self.flights = SingleFlight('sgs-proxy')
+        self.client = None
+        self.lock = threading.Lock()
+        self.counters = {
+            'requests': 0,
+            'active': 0,
+            'max_active': 0,
+            'bytes_streamed': 0,
+            'upstream_errors': 0,
+            'pool_timeouts': 0,
+            'timeouts': 0,
+            'aborted_streams': 0,
+        }
+
+    async def start(self):
+        self.client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, follow_redirects=False)
+        print(f"🔗 SGS 代理连接池: {self.target_base} "
+              f"(最大连接 {self.limits.max_connections}, 长连接 {self.limits.max_keepalive_connections})")
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def target_url(self, path, query_string):
+        target_url = f"{self.target_base}/{path}"
+        if query_string:
+            target_url += f"?{query_string}"
+        return target_url
+
+    def _count(self, key, value=1):
+        with self.lock:
+            self.counters[key] += value
+
+    def _enter(self):
+        with self.lock:
+            self.counters['requests'] += 1
+            self.counters['active'] += 1
+            if self.counters['active'] > self.counters['max_active']:
+                self.counters['max_active'] = self.counters['active']
+
+    async def forward(self, path, request: Request, client_ip=None):
+        """转发 method、headers、body，响应状态、头和原始（未解压的）响应体按块回传；GET 请求经过瓦片缓存"""
+        target_url = self.target_url(path, str(request.url.query))
+        print(f"🔁 代理目标: {target_url} (来自 {client_ip})")
+
+        # 白名单验证
+        target_host = urlparse(target_url).hostname
+        if target_host not in self.whitelist:
+            raise HTTPException(status_code=403, detail=f"不允许代理到主机: {target_host}")
+
+        forward_headers = [
+            (k, v) for k, v in request.headers.items() if k.lower() not in REQUEST_SKIP_HEADERS
+        ]
+        if request.method == 'GET' and self.cache.enabled:
+            return await self._forward_cached(target_url, request, forward_headers)
+
+        body = await request.body()
+        upstream = await self._open(request.method, target_url, forward_headers, body or None)
+        return self._stream(upstream, target_url)
+
+    async def _forward_cached(self, target_url, request, forward_headers):
+        """
+        先查瓦片缓存：新鲜的直接返回；过期的带校验值向 SGS 重新验证；
+        SGS 出错时在 stale-if-error 窗口内返回过期内容；未命中时边转发边写入缓存
+        同一瓦片已有请求在向 SGS 获取时，等它写入缓存后直接读缓存，不重复请求 SGS
+        """
+        key = self.cache.key(target_url, request.headers)
+        entry, tier = await self.cache.get(key)
+        if entry is not None and entry.is_fresh():
+            self.cache.count(f'{tier}_hits')
+            return self._cached_response(entry, request, 'HIT')
+
+        pending = self.flights.join(key)
+        if pending is not None:
+            if await self.flights.wait(key, pending, timeout=self.timeout.read):
+                shared, _ = await self.cache.get(key, count=False)
+                if shared is not None and shared.is_fresh():
+                    self.cache.count('coalesced_hits')
+                    return self._cached_response(shared, request, 'COALESCED')
+            # leader 的响应不可缓存、失败或超时未完成：自行请求
+            response, _ = await self._fetch(key, target_url, request, forward_headers, entry)
+            return response
+
+        deferred = False
+        try:
+            response, deferred = await self._fetch(
+                key, target_url, request, forward_headers, entry, on_stored=lambda: self.flights.release(key),
+            )
+            return response
+        finally:
+            if not deferred:
+                self.flights.release(key)
+
+    async def _fetch(self, key, target_url, request, forward_headers, entry, on_stored=None):
+        """
+        向 SGS 请求（有缓存条目时为重新验证），返回 (响应, 是否边转发边写缓存)
+        边转发边写缓存时，on_stored 在写入缓存后调用
+        """
+        # 客户端自带的条件请求由缓存应答，向 SGS 只发缓存条目的校验值（没有条目时请求完整内容）
+        headers = [(k, v) for k, v in forward_headers if k.lower() not in CONDITIONAL_HEADERS]
+        if entry is not None:
+            headers += list(entry.validators().items())
+        try:
+            upstream = await self._open('GET', target_url, headers)
+        except HTTPException:
+            if entry is not None and entry.usable_if_error():
+                return self._stale_response(entry, request), False
+            raise
+
+        if entry is not None and upstream.status_code == 304:
+            response_headers = self._header_list(upstream)
+            await self._release(upstream, {'released': False})
+            refreshed = self.cache.refresh(entry, response_headers)
+            if refreshed is None:
+                await self.cache.discard(key)
+            else:
+                await self.cache.put(key, refreshed)
+            self.cache.count('revalidated')
+            return self._cached_response(refreshed or entry, request, 'REVALIDATED'), False
+        if entry is not None and upstream.status_code in STALE_IF_ERROR_STATUS and entry.usable_if_error():
+            await self._release(upstream, {'released': False})
+            return self._stale_response(entry, request), False
+
+        self.cache.count('misses')
+        response_headers = self._header_list(upstream)
+        store = None
+        if self.cache.cacheable(upstream.status_code, response_headers, 'authorization' in request.headers):
+            async def store_body(body):
+                await self.cache.store(key, upstream.status_code, response_headers, body)
+            store = store_body
+        response = self._stream(upstream, target_url, store, on_stored if store else None)
+        response.raw_headers.append((b'x-cache', b'MISS'))
+        return response, store is not None
+
+    async def _open(self, method, url, headers, content=None):
+        """向 SGS 发出请求并读取响应头，连接错误转换为对应的 HTTP 状态码"""
+        self._enter()
+        try:
+            upstream_request = self.client.build_request(method, url, headers=headers, content=content)
+            return await self.client.send(upstream_request, stream=True)
+        except httpx.PoolTimeout:
+            self._finish('pool_timeouts')
+            raise HTTPException(status_code=503, detail="代理繁忙: 等待 SGS 连接超时")
+        except httpx.TimeoutException as e:
+            self._finish('timeouts')
+            raise HTTPException(status_code=504, detail=f"代理超时: {e!r}")
+        except httpx.RequestError as e:
+            self._finish('upstream_errors')
+            raise HTTPException(status_code=502, detail=f"代理错误: {e!r}")
+        except BaseException:
+            self._finish()
+            raise
+
+    @staticmethod
+    def _header_list(upstream):
+        """上游响应头（去掉逐跳头），保留重复的头（如多个 Set-Cookie）"""
+        return [
+            (k.decode('latin-1'), v.decode('latin-1')) for k, v in upstream.headers.raw
+            if k.decode('latin-1').lower() not in HOP_BY_HOP_HEADERS
+        ]
+
+    def _stream(self, upstream, target_url, store=None, on_stored=None):
+        state = {'released': False, 'on_stored': on_stored}
+        response = StreamingResponse(
+            self._relay(upstream, target_url, state, store),
+            status_code=upstream.status_code,
+            # 响应体未被读取就结束（如发送响应头时客户端已断开）时兜底释放上游连接
+            background=BackgroundTask(self._cleanup, upstream, state),
+        )
+        # 响应体原样转发，所以 Content-Encoding / Content-Length 一并保留
+        response.raw_headers = _encode_headers(self._header_list(upstream))
+        return response
+
+    def _cached_response(self, entry, request, label):
+        """由缓存条目生成响应；客户端的条件请求与缓存一致时回 304"""
+        self.cache.count('bytes_saved', entry.size)
+        extra = [('Age', str(int(entry.age()))), ('X-Cache', label)]
+        if entry.matches(request.headers):
+            headers = [(k, v) for k, v in entry.headers if k.lower() in REFRESH_HEADERS]
+            response = Response(status_code=304)
+            response.raw_headers = _encode_headers(headers + extra)
+            return response
+        response = Response(content=entry.body, status_code=entry.status)
+        response.raw_headers = _encode_headers(entry.headers + [('Content-Length', str(entry.size))] + extra)
+        return response
+
+    def _stale_response(self, entry, request):
+        self.cache.count('stale_served')
+        print(f"⚠️  SGS 不可用，返回过期缓存 (已过期 {int(entry.age() - entry.fresh_for)}s)")
+        return self._cached_response(entry, request, 'STALE')
+
+    async def _cleanup(self, upstream, state):
+        await self._release(upstream, state)
+        self._stored(state)
+
+    @staticmethod
+    def _stored(state):
+        on_stored = state.pop('on_stored', None)
+        if on_stored is not None:
+            on_stored()
+
+    async def _release(self, upstream, state, error=None):
+        if state['released']:
+            return
+        state['released'] = True
+        await upstream.aclose()
+        self._finish(error)
+
+    def _finish(self, error=None):
+        with self.lock:
+            self.counters['active'] -= 1
+            if error:
+                self.counters[error] += 1
+
+    async def _relay(self, upstream, target_url, state, store=None):
+        """
+        逐块回传上游响应体；客户端断开或上游出错时关闭上游响应，连接归还连接池或丢弃
+        store 不为空时同时收集响应体（超过单条缓存上限则放弃），完整转发后写入缓存
+        """
+        error = None
+        chunks, size = [], 0
+        try:
+            try:
+                async for chunk in upstream.aiter_raw():
+                    self._count('bytes_streamed', len(chunk))
+                    if store is not None:
+                        size += len(chunk)
+                        if size > self.cache.max_entry_bytes:
+                            store, chunks = None, []
+                        else:
+                            chunks.append(chunk)
+                    yield chunk
+            except httpx.HTTPError as e:
+                # 响应头已经发出，无法再改状态码，只能中断响应
+                error = 'aborted_streams'
+                print(f"⚠️  代理响应中断: {target_url} ({e!r})")
+                raise
+            except BaseException:
+                error = 'aborted_streams'
+                raise
+            finally:
+                await self._release(upstream, state, error)
+            # 上游连接已归还，再写缓存
+            if store is not None:
+                await store(b''.join(chunks))
+        finally:
+            # 任何退出路径（完整转发、取消、生成器被关闭、上游出错）都唤醒等待同一瓦片的请求，
+            # 不依赖响应的后台任务（发送响应体出错时 Starlette 不会执行它）
+            self._stored(state)
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        pool = self.limits
+        return {
+            'target': self.target_base,
+            'max_connections': pool.max_connections,
+            'max_keepalive_connections': pool.max_keepalive_connections,
+            'keepalive_expiry': pool.keepalive_expiry,
+            'timeout': {
+                'connect': self.timeout.connect,
+                'read': self.timeout.read,
+                'write': self.timeout.write,
+                'pool': self.timeout.pool,
+            },
+            **counters,
+            'cache': self.cache.stats(),
+        }
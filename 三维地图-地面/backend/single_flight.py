@@ -0,0 +1,114 @@
+"""
+请求合并（single-flight）- 同一个键的并发请求只执行一次计算或上游请求，其余请求等待并共享结果
+
+两种用法:
+    await flight.do(key, fn)        fn 为返回协程的函数；结果（或异常）由同时到达的请求共享
+    flight.join(key) / release()    手动模式，用于边转发边写缓存的流式代理：第一个请求作为 leader
+                                    自行转发，之后的同键请求等待 leader 完成后再查缓存
+
+计算在独立的 Task 中执行，发起请求的客户端断开不会中断它，等待中的其他请求照常拿到结果
+各实例的计数汇总在 /health 的 single_flight 中
+"""
+import asyncio
+import threading
+
+# 名称 -> SingleFlight，供 /health 汇总
+_groups = {}
+
+
+class SingleFlight:
+    """按键合并并发请求，只在请求进行期间合并，不缓存已完成的结果"""
+
+    def __init__(self, name):
+        self.name = name
+        self.inflight = {}  # 键 -> Task（do）或 Future（join）
+        self.lock = threading.Lock()
+        self.counters = {
+            'calls': 0,
+            'executions': 0,
+            'coalesced': 0,
+            'errors': 0,
+            'max_waiters': 0,
+        }
+        self.waiters = {}  # 键 -> 当前等待中的请求数
+        _groups[name] = self
+
+    def _count(self, key, value=1):
+        with self.lock:
+            self.counters[key] += value
+
+    async def do(self, key, fn):
+        """执行 fn() 并返回结果；同键的计算正在进行时直接等待它的结果"""
+        self._count('calls')
+        task = self.inflight.get(key)
+        if task is None:
+            self._count('executions')
+            task = asyncio.ensure_future(fn())
+            self.inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            return await asyncio.shield(task)
+        self._count('coalesced')
+        return await self._wait(key, task)
+
+    def join(self, key):
+        """
+        手动模式：已有同键请求在进行时返回它的 Future（调用 wait 等待）；
+        否则把调用方登记为 leader 并返回 None，leader 结束时必须调用 release(key)
+        """
+        self._count('calls')
+        future = self.inflight.get(key)
+        if future is None:
+            self._count('executions')
+            self.inflight[key] = asyncio.get_running_loop().create_future()
+            return None
+        self._count('coalesced')
+        return future
+
+    async def wait(self, key, future, timeout=None):
+        """等待 leader 完成；超时返回 False，由调用方自行处理"""
+        try:
+            await asyncio.wait_for(self._wait(key, future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def release(self, key):
+        """leader 完成（成功或失败都要调用），唤醒等待中的请求；重复调用无副作用"""
+        future = self.inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    async def _wait(self, key, future):
+        with self.lock:
+            waiting = self.waiters.get(key, 0) + 1
+            self.waiters[key] = waiting
+            if waiting > self.counters['max_waiters']:
+                self.counters['max_waiters'] = waiting
+        try:
+            return await asyncio.shield(future)
+        finally:
+            with self.lock:
+                remaining = self.waiters[key] - 1
+                if remaining:
+                    self.waiters[key] = remaining
+                else:
+                    del self.waiters[key]
+
+    def _done(self, key, task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        # 取出异常，避免所有等待方都已断开时出现 “Task exception was never retrieved”
+        if not task.cancelled() and task.exception() is not None:
+            self._count('errors')
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters['waiting'] = sum(self.waiters.values())
+        counters['inflight'] = len(self.inflight)
+        return counters
+
+
+def stats():
+    """所有请求合并实例的计数"""
+    return {name: group.stats() for name, group in _groups.items()}
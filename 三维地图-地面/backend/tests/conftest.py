@@ -0,0 +1,10 @@
+"""
+后端各模块为顶层脚本（由 server.py 所在目录直接导入），测试时把该目录加入模块搜索路径
+
+运行方式（在 三维地图-地面/backend 目录下）：
+    python -m pytest -q tests
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,85 @@
+import asyncio
+import gzip
+import json
+import os
+
+import pytest
+from starlette.requests import Request
+
+from file_cache import FileCache
+
+calls = []
+
+
+def read_json(file_path):
+    calls.append(file_path)
+    with open(file_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def request(**headers):
+    raw = [(name.replace('_', '-').lower().encode(), value.encode()) for name, value in headers.items()]
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': raw})
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    calls.clear()
+    path = tmp_path / 'stations.json'
+    path.write_text(json.dumps({'stations': ['A'] * 500}), encoding='utf-8')
+    return path
+
+
+def get(cache, path):
+    return asyncio.run(cache.get(path, read_json))
+
+
+def test_hit_reuses_encoded_body(data_file):
+    cache = FileCache()
+    first = get(cache, data_file)
+    assert get(cache, data_file) is first
+    assert len(calls) == 1
+    assert cache.stats()['hits'] == 1
+    # 预压缩的 gzip 版本解压后与原始 JSON 一致
+    assert gzip.decompress(first.variants['gzip']) == first.variants['identity']
+
+
+def test_mtime_change_invalidates(data_file):
+    cache = FileCache()
+    first = get(cache, data_file)
+    stat = os.stat(data_file)
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    second = get(cache, data_file)
+    assert second is not first
+    assert second.etag != first.etag
+    assert len(calls) == 2
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_size_change_invalidates_even_with_same_mtime(data_file):
+    cache = FileCache()
+    first = get(cache, data_file)
+    stat = os.stat(data_file)
+    data_file.write_text(json.dumps({'stations': ['B'] * 600}), encoding='utf-8')
+    # 原地改写后恢复 mtime，只有文件大小不同
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    second = get(cache, data_file)
+    assert json.loads(second.variants['identity']) == {'stations': ['B'] * 600}
+    assert second.etag != first.etag
+    assert cache.stats()['entries'] == 1
+
+
+def test_response_negotiates_encoding_and_etag(data_file):
+    cache = FileCache()
+    entry = get(cache, data_file)
+
+    response = cache.response(entry, request(accept_encoding='gzip, deflate'))
+    assert response.headers['content-encoding'] == 'gzip'
+    assert response.body == entry.variants['gzip']
+
+    response = cache.response(entry, request(accept_encoding='gzip;q=0'))
+    assert 'content-encoding' not in response.headers
+
+    assert cache.response(entry, request(if_none_match=entry.etag)).status_code == 304
@@ -0,0 +1,50 @@
+import pytest
+
+from rate_limit import RateLimitRules, TokenBucketLimiter
+
+
+def test_bucket_allows_burst_then_refills():
+    limiter = TokenBucketLimiter(requests=3, window=30, shards=4)  # 每 10 秒补一个令牌
+    assert [limiter.acquire('a', now=0.0)[0] for _ in range(3)] == [True, True, True]
+
+    allowed, retry_after = limiter.acquire('a', now=0.0)
+    assert not allowed
+    assert retry_after == pytest.approx(10.0)
+
+    # 半个令牌不够，满一个才放行
+    assert not limiter.acquire('a', now=5.0)[0]
+    assert limiter.acquire('a', now=10.0)[0]
+    assert not limiter.acquire('a', now=10.0)[0]
+
+    # 其他客户端互不影响
+    assert limiter.acquire('b', now=10.0)[0]
+
+
+def test_bucket_never_exceeds_capacity():
+    limiter = TokenBucketLimiter(requests=2, window=10, shards=1)
+    limiter.acquire('a', now=0.0)
+    # 空闲很久之后也只补到容量上限
+    assert [limiter.acquire('a', now=1000.0)[0] for _ in range(3)] == [True, True, False]
+
+
+def test_evict_idle_only_removes_full_buckets():
+    limiter = TokenBucketLimiter(requests=4, window=40, shards=8)
+    limiter.acquire('idle', now=0.0)
+    limiter.acquire('busy', now=0.0)
+    limiter.acquire('busy', now=35.0)
+
+    # idle 已空闲满一个窗口（必然补满），busy 还在补充中
+    assert limiter.evict_idle(now=40.0) == 1
+    assert limiter.clients() == 1
+    assert limiter.evicted == 1
+
+    # 淘汰后重新到来的客户端拿到满桶，与未淘汰时一致
+    assert [limiter.acquire('idle', now=40.0)[0] for _ in range(5)] == [True] * 4 + [False]
+
+
+def test_rules_match_longest_prefix():
+    rules = RateLimitRules('/api/=10/60,/api/data/=600/60,/sgs-proxy/=100/60', shards=2)
+    assert rules.match('/api/data/tiles.json')[0] == '/api/data/'
+    assert rules.match('/api/4d/list')[0] == '/api/'
+    assert rules.match('/health') == (None, None)
+    assert rules.stats()['/sgs-proxy/']['requests'] == 100
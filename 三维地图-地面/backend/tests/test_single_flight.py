@@ -0,0 +1,194 @@
+import asyncio
+
+import httpx
+import pytest
+
+from sgs_proxy import SGSProxy
+from single_flight import SingleFlight
+
+
+def test_do_shares_result_between_concurrent_callers():
+    async def main():
+        flight = SingleFlight('test-share')
+        calls = []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'tile'
+
+        results = await asyncio.gather(*(flight.do('k', load) for _ in range(5)))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(main())
+    assert results == ['tile'] * 5
+    assert len(calls) == 1
+    assert flight.inflight == {}
+    assert flight.stats()['coalesced'] == 4
+
+
+def test_do_releases_key_on_error():
+    async def main():
+        flight = SingleFlight('test-error')
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError('upstream down')
+
+        results = await asyncio.gather(flight.do('k', fail), flight.do('k', fail), return_exceptions=True)
+        assert flight.inflight == {}
+
+        async def load():
+            return 'tile'
+
+        # 出错后不残留，下一次请求重新执行
+        return results, await flight.do('k', load), flight.stats()
+
+    results, retried, stats = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert retried == 'tile'
+    assert stats['errors'] == 1
+    assert stats['waiting'] == 0
+
+
+def test_do_survives_cancelled_leader():
+    async def main():
+        flight = SingleFlight('test-cancel')
+
+        async def load():
+            await asyncio.sleep(0.02)
+            return 'tile'
+
+        leader = asyncio.ensure_future(flight.do('k', load))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do('k', load))
+        await asyncio.sleep(0)
+        leader.cancel()
+        result = await follower
+        await asyncio.sleep(0)
+        return flight, leader, result
+
+    flight, leader, result = asyncio.run(main())
+    assert leader.cancelled()
+    assert result == 'tile'
+    assert flight.inflight == {}
+
+
+def test_join_follower_is_woken_by_release():
+    async def main():
+        flight = SingleFlight('test-join')
+        assert flight.join('k') is None
+        pending = flight.join('k')
+        waiter = asyncio.ensure_future(flight.wait('k', pending, timeout=1))
+        await asyncio.sleep(0)
+        flight.release('k')
+        flight.release('k')  # 重复调用无副作用
+        return flight, await waiter
+
+    flight, woken = asyncio.run(main())
+    assert woken is True
+    assert flight.inflight == {}
+
+
+class FakeUpstream:
+    """模拟 httpx 的流式响应：依次给出 chunks，之后按需挂起或抛出异常"""
+
+    def __init__(self, chunks, error=None, hang=False):
+        self.chunks = chunks
+        self.error = error
+        self.hang = hang
+        self.closed = False
+
+    async def aiter_raw(self):
+        for chunk in self.chunks:
+            yield chunk
+        if self.hang:
+            await asyncio.Event().wait()
+        if self.error is not None:
+            raise self.error
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.fixture
+def proxy(monkeypatch):
+    monkeypatch.setenv('SGS_CACHE_DISK_MB', '0')
+    return SGSProxy([])
+
+
+async def relay_with_follower(proxy, upstream, consume):
+    """以 leader 身份转发 upstream，consume 消费响应体；返回跟随者是否在超时前被唤醒"""
+    key = 'tile'
+    assert proxy.flights.join(key) is None
+    pending = proxy.flights.join(key)
+    follower = asyncio.ensure_future(proxy.flights.wait(key, pending, timeout=1))
+
+    stored = []
+
+    async def store(body):
+        stored.append(body)
+
+    proxy._enter()
+    state = {'released': False, 'on_stored': lambda: proxy.flights.release(key)}
+    body = proxy._relay(upstream, 'http://sgs/tile', state, store)
+    try:
+        await consume(body)
+    except (httpx.HTTPError, asyncio.CancelledError):
+        pass
+    return await follower, stored
+
+
+def test_relay_releases_key_after_complete_stream(proxy):
+    async def consume(body):
+        async for _ in body:
+            pass
+
+    upstream = FakeUpstream([b'a', b'b'])
+    woken, stored = asyncio.run(relay_with_follower(proxy, upstream, consume))
+    assert woken and upstream.closed
+    assert stored == [b'ab']
+    assert proxy.flights.inflight == {}
+
+
+def test_relay_releases_key_when_closed_early(proxy):
+    async def consume(body):
+        # 客户端断开：读到第一块后关闭生成器
+        await body.__anext__()
+        await body.aclose()
+
+    upstream = FakeUpstream([b'a', b'b'])
+    woken, stored = asyncio.run(relay_with_follower(proxy, upstream, consume))
+    assert woken and upstream.closed
+    assert stored == []
+    assert proxy.counters['aborted_streams'] == 1
+
+
+def test_relay_releases_key_on_upstream_error(proxy):
+    async def consume(body):
+        async for _ in body:
+            pass
+
+    upstream = FakeUpstream([b'a'], error=httpx.ReadError('reset'))
+    woken, stored = asyncio.run(relay_with_follower(proxy, upstream, consume))
+    assert woken and upstream.closed
+    assert stored == []
+    assert proxy.flights.inflight == {}
+
+
+def test_relay_releases_key_on_cancellation(proxy):
+    async def consume(body):
+        async def read():
+            async for _ in body:
+                pass
+
+        task = asyncio.ensure_future(read())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await task
+
+    upstream = FakeUpstream([b'a'], hang=True)
+    woken, stored = asyncio.run(relay_with_follower(proxy, upstream, consume))
+    assert woken and upstream.closed
+    assert stored == []
+    assert proxy.counters['active'] == 0
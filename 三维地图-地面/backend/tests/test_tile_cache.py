@@ -0,0 +1,24 @@
+import pytest
+
+from tile_cache import TileCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    # 只用内存缓存，测试不写磁盘
+    monkeypatch.setenv('SGS_CACHE_DISK_MB', '0')
+    monkeypatch.setenv('SGS_CACHE_STALE_IF_ERROR', '604800')
+    return TileCache()
+
+
+@pytest.mark.parametrize('cache_control,expected', [
+    ('max-age=60, stale-if-error=0', 0),
+    ('max-age=60, stale-if-error=30', 30),
+    ('max-age=60', 604800),
+])
+def test_stale_if_error_window(cache, cache_control, expected):
+    entry = cache.entry_from_response(200, [('Cache-Control', cache_control)], b'tile', now=1000.0)
+    assert entry.stale_if_error == expected
+    # 新鲜期过后只在 stale-if-error 窗口内可用
+    assert entry.usable_if_error(now=1000.0 + 60) == (expected > 0)
+    assert not entry.usable_if_error(now=1000.0 + 60 + expected)
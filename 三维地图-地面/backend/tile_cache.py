@@ -0,0 +1,399 @@
+"""
+SGS 瓦片缓存 - /sgs-proxy/ GET 响应的两级缓存（内存 LRU + 限定容量的磁盘缓存）
+
+缓存规则（按共享缓存的语义简化）:
+    - 只缓存 200 响应；Cache-Control 含 no-store / private、Vary 含 Accept-Encoding 以外的头、
+      带 Authorization 的请求（响应未声明 public / s-maxage 时）不缓存
+    - 新鲜期取 s-maxage / max-age / Expires，上游未声明时按 SGS_CACHE_DEFAULT_TTL（瓦片基本不变）；
+      no-cache 的响应每次都需要重新验证
+    - 过期后带 If-None-Match / If-Modified-Since 向 SGS 重新验证，304 时沿用缓存内容
+    - SGS 不可达或返回 5xx 时，在 stale-if-error 窗口内返回过期内容
+    - 响应体按上游原样（可能已压缩）保存，缓存键包含 Accept-Encoding
+
+环境变量:
+    SGS_CACHE_MEMORY_MB         内存缓存容量（默认 64），0 表示不使用内存缓存
+    SGS_CACHE_DISK_MB           磁盘缓存容量（默认 1024），0 表示不使用磁盘缓存
+    SGS_CACHE_DIR               磁盘缓存目录（默认 <项目根目录>/.cache/sgs-tiles）
+    SGS_CACHE_MAX_ENTRY_MB      单个响应可缓存的最大字节数（默认 8）
+    SGS_CACHE_DEFAULT_TTL       上游未声明新鲜期时的缓存秒数（默认 86400）
+    SGS_CACHE_STALE_IF_ERROR    上游未声明 stale-if-error 时，出错可返回过期内容的秒数（默认 604800）
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# 缓存内容不保存、每次响应时重新生成的头
+UNSTORED_HEADERS = {'age', 'content-length', 'x-cache'}
+# 304 响应中用于刷新缓存元数据的头（RFC 9111 4.3.4）
+REFRESH_HEADERS = {'cache-control', 'expires', 'date', 'etag', 'last-modified', 'vary'}
+# 客户端自带的条件请求头，命中缓存时由缓存应答，不转发给 SGS
+CONDITIONAL_HEADERS = {'if-none-match', 'if-modified-since', 'if-match', 'if-unmodified-since', 'if-range'}
+STALE_IF_ERROR_STATUS = {500, 502, 503, 504}
+
+
+def parse_cache_control(value):
+    """'max-age=60, no-cache' -> {'max-age': '60', 'no-cache': None}"""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip().strip('"') if arg else None
+    return directives
+
+
+def parse_http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _header_lookup(headers):
+    lookup = {}
+    for name, value in headers:
+        lookup.setdefault(name.lower(), value)
+    return lookup
+
+
+def _seconds(value):
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CacheEntry:
+    """一个缓存的响应：状态码、响应头（不含逐跳头）、原始响应体及新鲜度信息"""
+
+    def __init__(self, status, headers, body, stored_at, fresh_for, stale_if_error, initial_age=0):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.stored_at = stored_at
+        self.fresh_for = fresh_for
+        self.stale_if_error = stale_if_error
+        self.initial_age = initial_age
+
+    @property
+    def size(self):
+        return len(self.body)
+
+    def header(self, name):
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return None
+
+    def age(self, now=None):
+        return self.initial_age + max((now or time.time()) - self.stored_at, 0)
+
+    def is_fresh(self, now=None):
+        return self.age(now) < self.fresh_for
+
+    def usable_if_error(self, now=None):
+        return self.age(now) < self.fresh_for + self.stale_if_error
+
+    def validators(self):
+        """重新验证用的条件请求头"""
+        headers = {}
+        if self.header('etag'):
+            headers['If-None-Match'] = self.header('etag')
+        if self.header('last-modified'):
+            headers['If-Modified-Since'] = self.header('last-modified')
+        return headers
+
+    def matches(self, request_headers):
+        """客户端的条件请求与缓存内容一致时可直接回 304"""
+        etag = self.header('etag')
+        if_none_match = request_headers.get('if-none-match')
+        if if_none_match is not None:
+            if etag is None:
+                return False
+            tags = [t.strip() for t in if_none_match.split(',')]
+            weak = lambda tag: tag[2:] if tag.startswith('W/') else tag
+            return '*' in tags or weak(etag) in [weak(t) for t in tags]
+        since = parse_http_date(request_headers.get('if-modified-since'))
+        modified = parse_http_date(self.header('last-modified'))
+        return since is not None and modified is not None and modified <= since
+
+    def to_bytes(self):
+        meta = {
+            'status': self.status,
+            'headers': self.headers,
+            'stored_at': self.stored_at,
+            'fresh_for': self.fresh_for,
+            'stale_if_error': self.stale_if_error,
+            'initial_age': self.initial_age,
+        }
+        return json.dumps(meta, ensure_ascii=False).encode('utf-8') + b'\n' + self.body
+
+    @classmethod
+    def from_bytes(cls, data):
+        meta, _, body = data.partition(b'\n')
+        meta = json.loads(meta)
+        return cls(
+            meta['status'], [tuple(h) for h in meta['headers']], body, meta['stored_at'],
+            meta['fresh_for'], meta['stale_if_error'], meta.get('initial_age', 0),
+        )
+
+
+class DiskStore:
+    """
+    磁盘缓存：每个响应一个文件（<键摘要前两位>/<键摘要>），按访问顺序 LRU 淘汰，总大小不超过 max_bytes
+    启动时扫描目录按修改时间重建索引；读写都在线程池中执行，不阻塞事件循环
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.index = OrderedDict()  # 摘要 -> 文件大小，按最近访问排序
+        self.total = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self._load_index()
+
+    def _load_index(self):
+        if not self.directory.exists():
+            return
+        files = []
+        for path in self.directory.glob('*/*'):
+            if path.name.endswith('.tmp'):
+                path.unlink(missing_ok=True)  # 上次写入中断留下的临时文件
+                continue
+            stat = path.stat()
+            files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, digest, size in sorted(files):
+            self.index[digest] = size
+            self.total += size
+        self._evict()
+
+    def _path(self, digest):
+        return self.directory / digest[:2] / digest
+
+    def _evict(self):
+        """调用方持有锁或处于初始化阶段"""
+        while self.total > self.max_bytes and self.index:
+            digest, size = self.index.popitem(last=False)
+            self.total -= size
+            self.evictions += 1
+            self._path(digest).unlink(missing_ok=True)
+
+    def get(self, digest):
+        with self.lock:
+            if digest not in self.index:
+                return None
+            self.index.move_to_end(digest)
+        path = self._path(digest)
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # 记录访问顺序，重启后按修改时间恢复 LRU
+        except FileNotFoundError:
+            self.discard(digest)
+            return None
+        return data
+
+    def put(self, digest, data):
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{digest}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self.lock:
+            self.total += len(data) - self.index.pop(digest, 0)
+            self.index[digest] = len(data)
+            self._evict()
+
+    def discard(self, digest):
+        with self.lock:
+            size = self.index.pop(digest, None)
+            if size is not None:
+                self.total -= size
+        self._path(digest).unlink(missing_ok=True)
+
+
+class TileCache:
+    """内存 LRU 在前、磁盘在后的两级缓存；磁盘命中的条目提升到内存"""
+
+    def __init__(self):
+        self.memory_bytes = int(float(os.getenv('SGS_CACHE_MEMORY_MB', 64)) * 1024 * 1024)
+        disk_bytes = int(float(os.getenv('SGS_CACHE_DISK_MB', 1024)) * 1024 * 1024)
+        self.max_entry_bytes = int(float(os.getenv('SGS_CACHE_MAX_ENTRY_MB', 8)) * 1024 * 1024)
+        self.default_ttl = int(os.getenv('SGS_CACHE_DEFAULT_TTL', 86400))
+        self.default_stale_if_error = int(os.getenv('SGS_CACHE_STALE_IF_ERROR', 7 * 86400))
+        directory = os.getenv('SGS_CACHE_DIR', str(BASE_DIR / '.cache' / 'sgs-tiles'))
+        self.disk = DiskStore(directory, disk_bytes) if disk_bytes > 0 else None
+        self.enabled = self.memory_bytes > 0 or self.disk is not None
+
+        self.memory = OrderedDict()  # 缓存键 -> CacheEntry
+        self.memory_total = 0
+        self.lock = threading.Lock()
+        self.counters = {
+            'lookups': 0,
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'coalesced_hits': 0,
+            'revalidated': 0,
+            'stale_served': 0,
+            'misses': 0,
+            'stores': 0,
+            'memory_evictions': 0,
+            'bytes_saved': 0,
+        }
+
+    def count(self, key, value=1):
+        with self.lock:
+            self.counters[key] += value
+
+    @staticmethod
+    def key(url, request_headers):
+        encoding = ','.join(sorted(e.strip() for e in request_headers.get('accept-encoding', '').split(',') if e.strip()))
+        return f"{url}\n{encoding}"
+
+    @staticmethod
+    def digest(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    # ---------- 读写 ----------
+
+    async def get(self, key, count=True):
+        """查找缓存（包括已过期、可用于重新验证的条目），先内存后磁盘"""
+        with self.lock:
+            if count:
+                self.counters['lookups'] += 1
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                return entry, 'memory'
+        if self.disk is None:
+            return None, None
+        data = await run_in_threadpool(self.disk.get, self.digest(key))
+        if data is None:
+            return None, None
+        try:
+            entry = CacheEntry.from_bytes(data)
+        except (ValueError, KeyError):
+            await run_in_threadpool(self.disk.discard, self.digest(key))
+            return None, None
+        self._remember(key, entry)
+        return entry, 'disk'
+
+    async def put(self, key, entry, to_disk=True):
+        self._remember(key, entry)
+        if self.disk is not None and to_disk:
+            await run_in_threadpool(self.disk.put, self.digest(key), entry.to_bytes())
+        self.count('stores')
+
+    def _remember(self, key, entry):
+        if entry.size > self.memory_bytes:
+            return
+        with self.lock:
+            old = self.memory.pop(key, None)
+            if old is not None:
+                self.memory_total -= old.size
+            self.memory[key] = entry
+            self.memory_total += entry.size
+            while self.memory_total > self.memory_bytes:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_total -= evicted.size
+                self.counters['memory_evictions'] += 1
+
+    # ---------- 缓存策略 ----------
+
+    def cacheable(self, status, headers, has_authorization=False):
+        """按状态码和响应头判断是否可缓存；headers 为去掉逐跳头后的 (名称, 值) 列表"""
+        if status != 200:
+            return False
+        lookup = _header_lookup(headers)
+        directives = parse_cache_control(lookup.get('cache-control'))
+        if 'no-store' in directives or 'private' in directives:
+            return False
+        if has_authorization and not ({'public', 's-maxage'} & directives.keys()):
+            return False
+        vary = {v.strip().lower() for v in lookup.get('vary', '').split(',') if v.strip()}
+        return not (vary - {'accept-encoding'})
+
+    def entry_from_response(self, status, headers, body, now=None):
+        """由（已判断可缓存的）上游响应构造缓存条目"""
+        now = now or time.time()
+        lookup = _header_lookup(headers)
+        directives = parse_cache_control(lookup.get('cache-control'))
+        stored = [(k, v) for k, v in headers if k.lower() not in UNSTORED_HEADERS]
+        # 上游明确声明 stale-if-error=0 时不返回过期内容，只有未声明时才用默认值
+        stale_if_error = _seconds(directives.get('stale-if-error'))
+        if stale_if_error is None:
+            stale_if_error = self.default_stale_if_error
+        return CacheEntry(
+            status, stored, body, now,
+            self._freshness(directives, lookup, now),
+            stale_if_error,
+            _seconds(lookup.get('age')) or 0,
+        )
+
+    async def store(self, key, status, headers, body):
+        """保存流式转发完成的响应；写磁盘失败只记录日志，不影响已发出的响应"""
+        if len(body) > self.max_entry_bytes:
+            return
+        try:
+            await self.put(key, self.entry_from_response(status, headers, body))
+        except OSError as e:
+            print(f"⚠️  瓦片缓存写入失败: {e}")
+
+    def _freshness(self, directives, lookup, now):
+        if 'no-cache' in directives:
+            return 0
+        for name in ('s-maxage', 'max-age'):
+            seconds = _seconds(directives.get(name))
+            if seconds is not None:
+                return seconds
+        expires = lookup.get('expires')
+        if expires is not None:
+            expires_at = parse_http_date(expires)
+            date = parse_http_date(lookup.get('date')) or now
+            return max(expires_at - date, 0) if expires_at is not None else 0
+        return self.default_ttl
+
+    def refresh(self, entry, headers, now=None):
+        """304 重新验证成功：用新响应头中的缓存元数据更新条目，响应体不变；更新后不可缓存时返回 None"""
+        fresh = {name.lower() for name, _ in headers if name.lower() in REFRESH_HEADERS}
+        merged = [(k, v) for k, v in entry.headers if k.lower() not in fresh]
+        merged += [(k, v) for k, v in headers if k.lower() in fresh]
+        if not self.cacheable(entry.status, merged):
+            return None
+        return self.entry_from_response(entry.status, merged, entry.body, now=now)
+
+    async def discard(self, key):
+        with self.lock:
+            entry = self.memory.pop(key, None)
+            if entry is not None:
+                self.memory_total -= entry.size
+        if self.disk is not None:
+            await run_in_threadpool(self.disk.discard, self.digest(key))
+
+    # ---------- 统计 ----------
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            memory = {'entries': len(self.memory), 'bytes': self.memory_total, 'max_bytes': self.memory_bytes}
+        hits = sum(counters[k] for k in ('memory_hits', 'disk_hits', 'coalesced_hits', 'revalidated', 'stale_served'))
+        counters['hit_ratio'] = round(hits / counters['lookups'], 4) if counters['lookups'] else None
+        result = {'enabled': self.enabled, 'memory': memory, **counters}
+        if self.disk is not None:
+            with self.disk.lock:
+                result['disk'] = {
+                    'directory': str(self.disk.directory),
+                    'entries': len(self.disk.index),
+                    'bytes': self.disk.total,
+                    'max_bytes': self.disk.max_bytes,
+                    'evictions': self.disk.evictions,
+                }
+        return result
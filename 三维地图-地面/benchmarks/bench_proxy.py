@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SGS 代理压测：本地启动一个模拟 SGS 服务器，后端（backend/server.py）以子进程方式启动并指向它，
+用并发客户端经 /sgs-proxy/ 请求瓦片，检查：
+
+    - 响应体完整（按路径生成确定内容，逐个比对），gzip 编码的响应原样透传
+    - 到 SGS 的连接复用（模拟服务器统计建立的 TCP 连接数）
+    - 流式转发（慢速分块接口的首字节时间应明显早于完整响应时间）
+    - 代理期间事件循环不被阻塞（压测同时轮询 /health 的延迟）
+    - 瓦片缓存：同一组瓦片请求多轮（--passes），后几轮应由缓存返回，SGS 请求数不再增加
+
+缓存目录使用临时目录，--no-cache 关闭瓦片缓存以对比
+
+运行方式（在 三维地图-地面 目录下）:
+    python3 benchmarks/bench_proxy.py --concurrency 64 --requests 5000 --latency 0.02
+
+模拟服务器不做限流，压测请求带随机 X-Forwarded-For，避免被后端按 IP 的速率限制拦截
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def tile_body(path, size):
+    """按路径生成确定的瓦片内容，客户端据此校验响应完整性"""
+    seed = hashlib.sha256(path.encode()).digest()
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+class FakeSGS:
+    """
+    模拟 SGS 服务器（HTTP/1.1，支持 keep-alive）
+        /SG/tiles/...   固定延迟后返回确定内容，奇数瓦片用 chunked 分块发送
+        /SG/gzip/...    返回 gzip 编码的内容
+        /SG/slow        先发一个块，间隔 slow 秒后再发剩余内容
+    """
+
+    def __init__(self, latency, size, slow):
+        self.latency = latency
+        self.size = size
+        self.slow = slow
+        self.connections = 0
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                if "content-length" in headers:
+                    await reader.readexactly(int(headers["content-length"]))
+
+                self.requests += 1
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                try:
+                    await self.respond(method, target.split("?")[0], writer)
+                finally:
+                    self.active -= 1
+                if headers.get("connection", "").lower() == "close":
+                    break
+        finally:
+            writer.close()
+
+    async def respond(self, method, path, writer):
+        await asyncio.sleep(self.latency)
+        body = tile_body(path, self.size)
+        if path.startswith("/SG/gzip/"):
+            body = gzip.compress(body, mtime=0)
+            writer.write(self.head(200, len(body), "Content-Encoding: gzip\r\n"))
+            writer.write(body)
+        elif path == "/SG/slow":
+            writer.write(self.head(200, None))
+            half = len(body) // 2
+            writer.write(self.chunk(body[:half]))
+            await writer.drain()
+            await asyncio.sleep(self.slow)
+            writer.write(self.chunk(body[half:]) + self.chunk(b""))
+        elif path.startswith("/SG/tiles/"):
+            if int(path.rsplit("/", 1)[-1].split(".")[0]) % 2:
+                writer.write(self.head(200, None))
+                for start in range(0, len(body), 4096):
+                    writer.write(self.chunk(body[start:start + 4096]))
+                writer.write(self.chunk(b""))
+            else:
+                writer.write(self.head(200, len(body)))
+                writer.write(body)
+        else:
+            writer.write(self.head(404, 0))
+        await writer.drain()
+
+    @staticmethod
+    def head(status, length, extra=""):
+        reason = {200: "OK", 404: "Not Found"}[status]
+        framing = f"Content-Length: {length}\r\n" if length is not None else "Transfer-Encoding: chunked\r\n"
+        return (
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/octet-stream\r\n{framing}{extra}"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode()
+
+    @staticmethod
+    def chunk(data):
+        return f"{len(data):x}\r\n".encode() + data + b"\r\n"
+
+
+def start_backend(port, sgs_port, args, cache_dir):
+    env = dict(
+        os.environ,
+        SERVER_HOST="127.0.0.1",
+        SERVER_PORT=str(port),
+        SGS_SERVER_URL=f"http://127.0.0.1:{sgs_port}/SG",
+        SGS_PROXY_WHITELIST="127.0.0.1",
+        SGS_MAX_CONNECTIONS=str(args.max_connections),
+        SGS_MAX_KEEPALIVE=str(args.max_connections),
+        SGS_CACHE_DIR=cache_dir,
+    )
+    if args.no_cache:
+        env.update(SGS_CACHE_MEMORY_MB="0", SGS_CACHE_DISK_MB="0")
+    return subprocess.Popen(
+        [sys.executable, str(BASE_DIR / "backend" / "server.py")],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(client, url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"后端在 {timeout}s 内未就绪: {url}")
+
+
+def random_ip():
+    return ".".join(str(random.randint(1, 254)) for _ in range(4))
+
+
+async def load(client, base, args):
+    """并发请求瓦片，返回延迟列表和错误列表"""
+    latencies, errors = [], []
+    queue = iter(range(args.requests))
+
+    async def worker():
+        for i in queue:
+            tile = i % args.tiles
+            kind = "gzip" if tile % 10 == 0 else "tiles"
+            path = f"/SG/{kind}/{tile % 997}/{tile}.png"
+            started = time.perf_counter()
+            try:
+                resp = await client.get(f"{base}/sgs-proxy{path[3:]}", headers={"X-Forwarded-For": random_ip()})
+            except httpx.HTTPError as e:
+                errors.append(repr(e))
+                continue
+            latencies.append(time.perf_counter() - started)
+            expected = tile_body(path, args.size)
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+            elif kind == "gzip" and resp.headers.get("content-encoding") != "gzip":
+                errors.append("content-encoding 未透传")
+            elif resp.content != expected:  # httpx 按 content-encoding 自动解压
+                errors.append("响应体不一致")
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return latencies, errors
+
+
+async def probe_health(client, base, stop):
+    """压测期间持续请求 /health，衡量事件循环是否被代理请求阻塞"""
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get(f"{base}/health")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.05)
+    return latencies
+
+
+async def measure_streaming(client, base, args):
+    """慢速分块接口：首字节时间 vs 完整响应时间"""
+    started = time.perf_counter()
+    first = None
+    async with client.stream("GET", f"{base}/sgs-proxy/slow") as resp:
+        async for _ in resp.aiter_raw():
+            if first is None:
+                first = time.perf_counter() - started
+    return first, time.perf_counter() - started
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return round(values[min(int(len(values) * q), len(values) - 1)] * 1000, 2) if values else None
+
+
+async def main_async(args):
+    sgs = FakeSGS(args.latency, args.size, args.slow)
+    sgs_server = await asyncio.start_server(sgs.handle, "127.0.0.1", 0)
+    sgs_port = sgs_server.sockets[0].getsockname()[1]
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    cache_dir = tempfile.mkdtemp(prefix="sgs-cache-")
+    backend = start_backend(port, sgs_port, args, cache_dir)
+    limits = httpx.Limits(max_connections=args.concurrency + 2, max_keepalive_connections=args.concurrency + 2)
+    try:
+        async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+            await wait_ready(client, f"{base}/health")
+
+            first_byte, total = await measure_streaming(client, base, args)
+
+            passes = []
+            for number in range(1, args.passes + 1):
+                sgs_before = sgs.requests
+                stop = asyncio.Event()
+                probe = asyncio.create_task(probe_health(client, base, stop))
+                started = time.perf_counter()
+                latencies, errors = await load(client, base, args)
+                elapsed = time.perf_counter() - started
+                stop.set()
+                health_latencies = await probe
+                passes.append({
+                    "pass": number,
+                    "requests": len(latencies),
+                    "rps": round(len(latencies) / elapsed, 1),
+                    "p50_ms": percentile(latencies, 0.5),
+                    "p95_ms": percentile(latencies, 0.95),
+                    "p99_ms": percentile(latencies, 0.99),
+                    "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+                    "errors": len(errors),
+                    "error_samples": [str(e) for e in errors[:5]],
+                    "sgs_requests": sgs.requests - sgs_before,
+                    "health_p50_ms": percentile(health_latencies, 0.5),
+                    "health_max_ms": percentile(health_latencies, 1.0),
+                })
+
+            proxy_stats = (await client.get(f"{base}/health")).json()["proxy"]
+    finally:
+        backend.terminate()
+        backend.wait()
+        sgs_server.close()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return {
+        "concurrency": args.concurrency,
+        "tiles": args.tiles,
+        "cache": not args.no_cache,
+        "passes": passes,
+        "errors": sum(p["errors"] for p in passes),
+        "sgs_connections": sgs.connections,
+        "sgs_max_concurrent": sgs.max_active,
+        "slow_first_byte_ms": round(first_byte * 1000, 1),
+        "slow_total_ms": round(total * 1000, 1),
+        "proxy": proxy_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SGS 代理并发压测（模拟 SGS 服务器）")
+    parser.add_argument("--concurrency", type=int, default=64, help="并发客户端数")
+    parser.add_argument("--requests", type=int, default=5000, help="每轮请求数")
+    parser.add_argument("--tiles", type=int, help="不同瓦片的数量，默认与每轮请求数相同")
+    parser.add_argument("--passes", type=int, default=2, help="对同一组瓦片压测的轮数")
+    parser.add_argument("--no-cache", action="store_true", help="关闭瓦片缓存")
+    parser.add_argument("--latency", type=float, default=0.02, help="模拟 SGS 每个请求的处理延迟（秒）")
+    parser.add_argument("--size", type=int, default=32768, help="瓦片字节数")
+    parser.add_argument("--slow", type=float, default=1.0, help="慢速接口两个分块之间的间隔（秒）")
+    parser.add_argument("--max-connections", type=int, default=32, help="后端到 SGS 的最大连接数（SGS_MAX_CONNECTIONS）")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+    args.tiles = args.tiles or args.requests
+
+    result = asyncio.run(main_async(args))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if result["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
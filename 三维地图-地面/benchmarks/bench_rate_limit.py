@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+速率限制压测：对比原来的滑动窗口日志（每个 IP 一个时间戳列表、全局锁）与令牌桶（分片锁、空闲淘汰）
+
+    - 吞吐：--clients 个不同客户端随机发起 --calls 次调用，单线程和 --threads 个线程各测一次
+    - 热点客户端：少量客户端持续超限时，滑动窗口每次调用都要重建接近上限长度的列表
+    - 内存：调用结束后限流器持有的内存（tracemalloc）和跟踪的客户端数；
+      令牌桶在客户端空闲满一个窗口后清理，滑动窗口的 defaultdict 永不删除客户端
+
+运行方式（在 三维地图-地面 目录下）:
+    python3 benchmarks/bench_rate_limit.py --clients 100000 --calls 1000000 --threads 4
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from rate_limit import TokenBucketLimiter  # noqa: E402
+
+
+class SlidingWindowLog:
+    """原 server.py 中的 RateLimiter，作为对比基线"""
+
+    def __init__(self, max_requests=100, time_window=60):
+        self.max_requests = max_requests
+        self.time_window = timedelta(seconds=time_window)
+        self.requests = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def is_allowed(self, ip_address):
+        with self.lock:
+            now = datetime.now()
+            cutoff_time = now - self.time_window
+            self.requests[ip_address] = [
+                timestamp for timestamp in self.requests[ip_address]
+                if timestamp > cutoff_time
+            ]
+            if len(self.requests[ip_address]) >= self.max_requests:
+                return False
+            self.requests[ip_address].append(now)
+            return True
+
+    def clients(self):
+        return len(self.requests)
+
+
+def make_limiter(kind, args):
+    if kind == "sliding-window":
+        return SlidingWindowLog(args.requests, args.window)
+    return TokenBucketLimiter(args.requests, args.window, args.shards)
+
+
+def run(limiter, keys, threads):
+    """threads 个线程平分 keys 调用 is_allowed，返回 (每秒调用数, 允许的次数)"""
+    parts = [keys[i::threads] for i in range(threads)]
+    allowed = [0] * threads
+
+    def worker(index):
+        check = limiter.is_allowed
+        count = 0
+        for key in parts[index]:
+            if check(key):
+                count += 1
+        allowed[index] = count
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    return round(len(keys) / elapsed), sum(allowed)
+
+
+def traced_memory(kind, keys, args):
+    """单独跑一遍统计限流器持有的内存，tracemalloc 会拖慢调用，不与吞吐一起测"""
+    tracemalloc.start()
+    limiter = make_limiter(kind, args)
+    run(limiter, keys, 1)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return memory
+
+
+def measure(kind, keys, args, threads, memory):
+    limiter = make_limiter(kind, args)
+    rate, allowed = run(limiter, keys, threads)
+    result = {
+        "limiter": kind,
+        "threads": threads,
+        "calls_per_second": rate,
+        "allowed": allowed,
+        "clients": limiter.clients(),
+        "memory_mb": round(memory / 1024 / 1024, 1),
+    }
+    if isinstance(limiter, TokenBucketLimiter):
+        # 模拟时间推进一个窗口后的空闲清理
+        started = time.perf_counter()
+        removed = limiter.evict_idle(now=time.monotonic() + args.window)
+        result["evicted_after_window"] = removed
+        result["evict_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        result["clients_after_evict"] = limiter.clients()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="速率限制器吞吐与内存压测")
+    parser.add_argument("--clients", type=int, default=100000, help="不同客户端（IP）数")
+    parser.add_argument("--calls", type=int, default=1000000, help="调用次数")
+    parser.add_argument("--threads", type=int, default=4, help="多线程测试的线程数")
+    parser.add_argument("--hot-clients", type=int, default=100, help="热点场景的客户端数")
+    parser.add_argument("--requests", type=int, default=100, help="每个窗口允许的请求数")
+    parser.add_argument("--window", type=float, default=60, help="窗口秒数")
+    parser.add_argument("--shards", type=int, default=64, help="令牌桶分片数")
+    parser.add_argument("--output", help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    clients = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(args.clients)]
+    scenarios = {
+        "distinct": [rng.choice(clients) for _ in range(args.calls)],
+        "hot": [clients[rng.randrange(args.hot_clients)] for _ in range(args.calls)],
+    }
+
+    results = []
+    print(f"{'scenario':<10}{'limiter':<16}{'threads':>8}{'calls/s':>12}{'clients':>10}{'memory MB':>11}{'evicted':>9}")
+    for scenario, keys in scenarios.items():
+        for kind in ("sliding-window", "token-bucket"):
+            memory = traced_memory(kind, keys, args)
+            for threads in sorted({1, args.threads}):
+                result = dict(measure(kind, keys, args, threads, memory), scenario=scenario)
+                results.append(result)
+                print(
+                    f"{scenario:<10}{kind:<16}{threads:>8}{result['calls_per_second']:>12}"
+                    f"{result['clients']:>10}{result['memory_mb']:>11}{result.get('evicted_after_window', '-'):>9}"
+                )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()